@@ -0,0 +1,505 @@
+# ==========================================
+# NEXUS TOOLS BENCHMARK
+# ==========================================
+# Drives every endpoint with a deterministic local corpus and records
+# p50/p95 latency, throughput under concurrency and peak RSS.
+#
+#   python benchmark.py                               # in-process, quick corpus
+#   python benchmark.py --url http://127.0.0.1:8000   # against a running uvicorn
+#   python benchmark.py --scale full --concurrency 1,4 --only rotate-pdf,extract-text
+#   python benchmark.py --compare bench-results/<earlier run>.json
+#
+# The corpus is generated on first use into --corpus and reused afterwards.
+# Results are written to --out as one JSON file per run.
+
+import argparse
+import asyncio
+import csv
+import functools
+import http.server
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+import logging
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+         "incididunt ut labore et dolore magna aliqua invoice total amount due page").split()
+
+# ==========================================
+# CORPUS
+# ==========================================
+
+def _sentence(rng, n=12):
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+def _text_pdf(path, pages, seed=0):
+    from reportlab.pdfgen import canvas
+    rng = random.Random(seed)
+    can = canvas.Canvas(path, invariant=1)
+    for page in range(1, pages + 1):
+        can.setFont("Helvetica-Bold", 14)
+        can.drawString(72, 740, f"Section {page}")
+        can.setFont("Helvetica", 10)
+        for line in range(45):
+            can.drawString(72, 715 - line * 14, _sentence(rng))
+        can.showPage()
+    can.save()
+
+def _scan_pdf(path, pages):
+    import img2pdf
+    from PIL import Image, ImageDraw, ImageFilter
+    rng = random.Random(pages)
+    images = []
+    for page in range(pages):
+        # Letter page at 200 DPI: text-like strokes, blur and grain like a scanner
+        img = Image.new("L", (1700, 2200), 245)
+        draw = ImageDraw.Draw(img)
+        for line in range(60):
+            draw.text((150, 150 + line * 32), _sentence(rng, 14), fill=20)
+        img = img.filter(ImageFilter.GaussianBlur(0.8))
+        img = Image.eval(img, lambda v: max(0, min(255, v + rng.randint(-6, 6))))
+        buf = io.BytesIO()
+        img.save(buf, "JPEG", quality=90, dpi=(200, 200))
+        images.append(buf.getvalue())
+    with open(path, "wb") as f:
+        img2pdf.convert(images, outputstream=f)
+
+def _locked_pdf(path):
+    from pypdf import PdfReader, PdfWriter
+    writer = PdfWriter(clone_from=PdfReader(corpus_path("doc-1.pdf")))
+    writer.encrypt("bench")
+    writer.write(path)
+
+def _photo(path, seed, fmt):
+    from PIL import Image
+    rng = random.Random(seed)
+    img = Image.radial_gradient("L").resize((1600, 1200)).convert("RGB")
+    img = Image.merge("RGB", [band.point(lambda v, k=rng.randint(1, 4): (v * k) % 256) for band in img.split()])
+    exif = Image.Exif()
+    exif[0x010F] = "Nexus Bench Camera"
+    exif[0x0132] = "2024:01:01 12:00:00"
+    img.save(path, fmt, **({"quality": 90, "exif": exif} if fmt == "JPEG" else {}))
+
+def _camera(path):
+    # 24 MP, stored landscape with an EXIF rotation like most phone photos
+    from PIL import Image
+    img = Image.effect_mandelbrot((6000, 4000), (-2.2, -1.2, 1.0, 1.2), 60)
+    img = Image.merge("RGB", [img, img.point(lambda v: 255 - v), Image.linear_gradient("L").resize(img.size)])
+    exif = Image.Exif()
+    exif[0x010F] = "Nexus Bench Camera"
+    exif[0x0112] = 6
+    img.save(path, "JPEG", quality=90, exif=exif)
+
+def _rows(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield [i, rng.choice(WORDS).title(), round(rng.uniform(1, 5000), 2), f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}"]
+
+def _csv(path, n):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "name", "amount", "date"])
+        writer.writerows(_rows(n))
+
+def _xlsx(path, n):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Data")
+    ws.append(["id", "name", "amount", "date"])
+    for row in _rows(n):
+        ws.append(row)
+    wb.save(path)
+
+def _docx(path):
+    from docx import Document
+    rng = random.Random(1)
+    doc = Document()
+    doc.add_heading("Quarterly report", 0)
+    for section in range(10):
+        doc.add_heading(f"Section {section + 1}", 1)
+        for _ in range(4):
+            doc.add_paragraph(" ".join(_sentence(rng) for _ in range(5)))
+    table = doc.add_table(rows=1, cols=4)
+    for cell, title in zip(table.rows[0].cells, ["id", "name", "amount", "date"]):
+        cell.text = title
+    for row in _rows(50):
+        for cell, value in zip(table.add_row().cells, row):
+            cell.text = str(value)
+    doc.save(path)
+
+def _pptx(path):
+    from pptx import Presentation
+    rng = random.Random(2)
+    prs = Presentation()
+    for slide_num in range(10):
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = f"Slide {slide_num + 1}"
+        slide.placeholders[1].text = "\n".join(_sentence(rng, 8) for _ in range(5))
+    prs.save(path)
+
+def _markdown(path):
+    rng = random.Random(3)
+    parts = ["# Notes\n"]
+    for section in range(20):
+        parts.append(f"## Part {section + 1}\n\n{' '.join(_sentence(rng) for _ in range(6))}\n")
+        parts.append("\n".join(f"- {_sentence(rng, 6)}" for _ in range(5)) + "\n")
+        parts.append("```python\ndef total(rows):\n    return sum(r.amount for r in rows)\n```\n")
+    with open(path, "w") as f:
+        f.write("\n".join(parts))
+
+def _source(path):
+    lines = ['"""Generated module for code-to-pdf benchmarks."""', "import math", ""]
+    for i in range(150):
+        lines += [f"def step_{i}(values, factor={i}):", f'    """Scale values by {i} and drop negatives."""',
+                  "    return [math.sqrt(v) * factor for v in values if v >= 0]", ""]
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+
+def _source_tree(path, files=100):
+    import zipfile
+    module = os.path.join(os.path.dirname(path), "partial-module.py")
+    _source(module)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as z:
+        for i in range(files):
+            z.write(module, f"project/pkg{i // 10}/module_{i}.py")
+    os.remove(module)
+
+def _epub(path):
+    from ebooklib import epub
+    rng = random.Random(4)
+    book = epub.EpubBook()
+    book.set_identifier("nexus-bench")
+    book.set_title("Benchmark Book")
+    book.set_language("en")
+    chapters = []
+    for num in range(10):
+        chapter = epub.EpubHtml(title=f"Chapter {num + 1}", file_name=f"chap_{num + 1}.xhtml", lang="en")
+        chapter.content = f"<h1>Chapter {num + 1}</h1>" + "".join(f"<p>{_sentence(rng, 40)}</p>" for _ in range(40))
+        book.add_item(chapter)
+        chapters.append(chapter)
+    book.toc = chapters
+    book.spine = ["nav", *chapters]
+    book.add_item(epub.EpubNcx())
+    book.add_item(epub.EpubNav())
+    epub.write_epub(path, book)
+
+def _ffmpeg():
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return "ffmpeg"
+
+def _video(path, seconds=5):
+    subprocess.run([_ffmpeg(), "-y", "-loglevel", "error",
+                    "-f", "lavfi", "-i", f"testsrc=duration={seconds}:size=640x360:rate=25",
+                    "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+                    "-shortest", "-pix_fmt", "yuv420p", "-c:v", "mpeg4", "-q:v", "5", "-c:a", "aac", path], check=True)
+
+def _html(path):
+    rng = random.Random(5)
+    body = "".join(f"<h2>Part {i + 1}</h2><p>{_sentence(rng, 60)}</p>" for i in range(30))
+    with open(path, "w") as f:
+        f.write(f"<html><head><title>Bench</title></head><body><h1>Benchmark page</h1>{body}</body></html>")
+
+# corpus item -> generator(path)
+CORPUS = {
+    "doc-1.pdf": functools.partial(_text_pdf, pages=1),
+    "doc-100.pdf": functools.partial(_text_pdf, pages=100),
+    "doc-100b.pdf": functools.partial(_text_pdf, pages=100, seed=1),
+    "doc-2000.pdf": functools.partial(_text_pdf, pages=2000),
+    "scan-1.pdf": functools.partial(_scan_pdf, pages=1),
+    "scan-10.pdf": functools.partial(_scan_pdf, pages=10),
+    "locked.pdf": _locked_pdf,
+    "rows-1k.xlsx": functools.partial(_xlsx, n=1_000),
+    "rows-10k.csv": functools.partial(_csv, n=10_000),
+    "rows-10k.xlsx": functools.partial(_xlsx, n=10_000),
+    "rows-100k.xlsx": functools.partial(_xlsx, n=100_000),
+    "rows-1m.csv": functools.partial(_csv, n=1_000_000),
+    "rows-1m.xlsx": functools.partial(_xlsx, n=1_000_000),
+    "document.docx": _docx,
+    "slides.pptx": _pptx,
+    "notes.md": _markdown,
+    "module.py": _source,
+    "project.zip": _source_tree,
+    "book.epub": _epub,
+    "clip.mp4": _video,
+    "page.html": _html,
+    "camera.jpg": _camera,
+}
+for i in range(5):
+    CORPUS[f"photo-{i}.jpg"] = functools.partial(_photo, seed=i, fmt="JPEG")
+    CORPUS[f"photo-{i}.png"] = functools.partial(_photo, seed=i, fmt="PNG")
+
+CORPUS_DIR = os.path.join(HERE, "bench-corpus")
+
+def corpus_path(name):
+    """Path of a corpus item, generating it the first time"""
+    path = os.path.join(CORPUS_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(CORPUS_DIR, exist_ok=True)
+        start = time.perf_counter()
+        partial = os.path.join(CORPUS_DIR, f"partial-{name}")
+        CORPUS[name](partial)
+        os.replace(partial, path)
+        print(f"  corpus {name}: {os.path.getsize(path) / 1e6:.1f} MB in {time.perf_counter() - start:.1f}s", flush=True)
+    return path
+
+# ==========================================
+# CASES
+# ==========================================
+
+PIPELINE_OPS = json.dumps([{"op": "rotate", "rotation": 90}, {"op": "crop", "margin": 20},
+                           {"op": "watermark", "text": "draft"}, {"op": "page-numbers"}])
+
+# (case, endpoint, [(form field, corpus item)] or None for a JSON body, form fields or JSON body, scale)
+CASES = [
+    ("img-to-pdf", "/api/img-to-pdf", [("files", f"photo-{i}.jpg") for i in range(5)], {}, "quick"),
+    ("img-to-pdf-mixed", "/api/img-to-pdf", [("files", f"photo-{i}.{ext}") for i in range(5) for ext in ("jpg", "png")], {}, "quick"),
+    ("img-to-pdf-a4", "/api/img-to-pdf", [("files", "camera.jpg")] + [("files", f"photo-{i}.jpg") for i in range(5)],
+     {"page_size": "a4", "dpi": "150"}, "quick"),
+    ("img-to-pdf-camera-100", "/api/img-to-pdf", [("files", "camera.jpg")] * 100, {}, "full"),
+    ("merge-pdfs", "/api/merge-pdfs", [("files", "doc-100.pdf"), ("files", "doc-100b.pdf")], {}, "quick"),
+    ("split-pdf", "/api/split-pdf", [("file", "doc-100.pdf")], {"start_page": "1", "end_page": "10"}, "quick"),
+    ("rotate-pdf", "/api/rotate-pdf", [("file", "doc-100.pdf")], {"rotation": "90"}, "quick"),
+    ("rotate-pdf-2000", "/api/rotate-pdf", [("file", "doc-2000.pdf")], {"rotation": "90"}, "full"),
+    ("compress-pdf", "/api/compress-pdf", [("file", "scan-10.pdf")], {"quality": "medium"}, "quick"),
+    ("organize-pdf", "/api/organize-pdf", [("file", "doc-100.pdf")], {"page_order": "3,2,1"}, "quick"),
+    ("pdf-to-word", "/api/pdf-to-word", [("file", "doc-1.pdf")], {}, "quick"),
+    ("pdf-to-ppt", "/api/pdf-to-ppt", [("file", "doc-1.pdf")], {}, "quick"),
+    ("pdf-to-excel", "/api/pdf-to-excel", [("file", "doc-1.pdf")], {}, "quick"),
+    ("pdf-to-jpg", "/api/pdf-to-jpg", [("file", "doc-1.pdf")], {}, "quick"),
+    ("pdf-to-pdfa", "/api/pdf-to-pdfa", [("file", "doc-100.pdf")], {}, "quick"),
+    ("word-to-pdf", "/api/word-to-pdf", [("file", "document.docx")], {}, "quick"),
+    ("ppt-to-pdf", "/api/ppt-to-pdf", [("file", "slides.pptx")], {}, "quick"),
+    ("excel-to-pdf", "/api/excel-to-pdf", [("file", "rows-1k.xlsx")], {}, "quick"),
+    ("excel-to-pdf-10k", "/api/excel-to-pdf", [("file", "rows-10k.xlsx")], {}, "full"),
+    ("excel-to-pdf-100k", "/api/excel-to-pdf", [("file", "rows-100k.xlsx")], {}, "full"),
+    ("html-to-pdf", "/api/html-to-pdf", None, {"url": "{html_url}"}, "quick"),
+    ("html-to-pdf-xhtml2pdf", "/api/html-to-pdf", None, {"url": "{html_url}", "backend": "xhtml2pdf"}, "quick"),
+    ("lock-pdf", "/api/lock-pdf", [("file", "doc-100.pdf")], {"password": "bench"}, "quick"),
+    ("unlock-pdf", "/api/unlock-pdf", [("file", "locked.pdf")], {"password": "bench"}, "quick"),
+    ("watermark-pdf", "/api/watermark-pdf", [("file", "doc-100.pdf")], {"text": "draft"}, "quick"),
+    ("watermark-pdf-2000", "/api/watermark-pdf", [("file", "doc-2000.pdf")], {"text": "draft"}, "full"),
+    ("redact-pdf", "/api/redact-pdf", [("file", "doc-100.pdf")], {"text_to_redact": "invoice"}, "quick"),
+    ("add-page-numbers", "/api/add-page-numbers", [("file", "doc-100.pdf")], {"position": "bottom-center"}, "quick"),
+    ("add-page-numbers-2000", "/api/add-page-numbers", [("file", "doc-2000.pdf")], {"position": "bottom-center"}, "full"),
+    ("ocr-pdf", "/api/ocr-pdf", [("file", "scan-1.pdf")], {}, "quick"),
+    ("compare-pdf", "/api/compare-pdf", [("file1", "doc-100.pdf"), ("file2", "doc-100b.pdf")], {}, "quick"),
+    ("crop-pdf", "/api/crop-pdf", [("file", "doc-100.pdf")], {"margin": "20"}, "quick"),
+    ("repair-pdf", "/api/repair-pdf", [("file", "doc-100.pdf")], {}, "quick"),
+    ("extract-text", "/api/extract-text", [("file", "doc-100.pdf")], {}, "quick"),
+    ("extract-text-2000", "/api/extract-text", [("file", "doc-2000.pdf")], {}, "full"),
+    ("edit-pdf-metadata", "/api/edit-pdf-metadata", [("file", "doc-100.pdf")], {"title": "Bench", "author": "Bench"}, "quick"),
+    ("convert-format", "/api/convert-format", [("file", "photo-0.png")], {"target_format": "JPEG"}, "quick"),
+    ("resize-image", "/api/resize-image", [("file", "photo-0.jpg")], {"width": "640", "height": "480"}, "quick"),
+    ("resize-camera-fit", "/api/resize-image", [("file", "camera.jpg")], {"width": "1600", "height": "1600", "mode": "fit"}, "quick"),
+    ("resize-camera-thumb", "/api/resize-image", [("file", "camera.jpg")], {"width": "320", "height": "320", "mode": "thumbnail"}, "quick"),
+    ("resize-camera-set", "/api/resize-image", [("file", "camera.jpg")], {"sizes": "2048,1024,512,256", "mode": "fit"}, "quick"),
+    ("clean-metadata", "/api/clean-metadata", [("file", "photo-0.jpg")], {}, "quick"),
+    ("extract-audio", "/api/extract-audio", [("file", "clip.mp4")], {}, "quick"),
+    ("video-to-gif", "/api/video-to-gif", [("file", "clip.mp4")], {"start_time": "0", "end_time": "2"}, "quick"),
+    ("docx-to-pdf", "/api/docx-to-pdf", [("file", "document.docx")], {}, "quick"),
+    ("docx-to-pdf-xhtml2pdf", "/api/docx-to-pdf", [("file", "document.docx")], {"backend": "xhtml2pdf"}, "quick"),
+    ("md-to-pdf", "/api/md-to-pdf", [("file", "notes.md")], {}, "quick"),
+    ("md-to-pdf-xhtml2pdf", "/api/md-to-pdf", [("file", "notes.md")], {"backend": "xhtml2pdf"}, "quick"),
+    ("csv-to-excel", "/api/csv-to-excel", [("file", "rows-10k.csv")], {}, "quick"),
+    ("csv-to-excel-1m", "/api/csv-to-excel", [("file", "rows-1m.csv")], {}, "full"),
+    ("excel-to-csv", "/api/excel-to-csv", [("file", "rows-10k.xlsx")], {}, "quick"),
+    ("excel-to-csv-1m", "/api/excel-to-csv", [("file", "rows-1m.xlsx")], {}, "full"),
+    ("excel-to-csv-all", "/api/excel-to-csv", [("file", "rows-10k.xlsx")], {"sheet": "*"}, "quick"),
+    ("create-zip", "/api/create-zip", [("files", f"photo-{i}.png") for i in range(5)], {}, "quick"),
+    ("epub-to-text", "/api/epub-to-text", [("file", "book.epub")], {}, "quick"),
+    ("code-to-pdf", "/api/code-to-pdf", [("file", "module.py")], {}, "quick"),
+    ("code-to-pdf-xhtml2pdf", "/api/code-to-pdf", [("file", "module.py")], {"backend": "xhtml2pdf"}, "quick"),
+    ("code-to-pdf-project", "/api/code-to-pdf", [("files", "project.zip")], {}, "full"),
+    ("file-hash", "/api/file-hash", [("file", "scan-10.pdf")], {}, "quick"),
+    ("pipeline", "/api/pipeline", [("file", "doc-100.pdf")], {"operations": PIPELINE_OPS}, "quick"),
+    ("batch-rotate", "/api/batch/rotate-pdf", [("files", "doc-1.pdf")] * 20, {"rotation": "90"}, "quick"),
+]
+
+# ==========================================
+# MEASUREMENT
+# ==========================================
+
+def _rss(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+def tree_rss(pid):
+    """Resident bytes of a process and its children (the pool workers). Linux only."""
+    return _rss(pid) + sum(tree_rss(child) for child in _children(pid))
+
+async def _sample_rss(pid, peak):
+    while True:
+        peak[0] = max(peak[0], tree_rss(pid))
+        await asyncio.sleep(0.05)
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def _request(case, html_url):
+    _, endpoint, files, data, _ = case
+    if files is None:
+        return endpoint, {"json": {k: v.replace("{html_url}", html_url) for k, v in data.items()}}
+    payload = []
+    for field, item in files:
+        with open(corpus_path(item), "rb") as f:
+            payload.append((field, (item, f.read())))
+    return endpoint, {"files": payload, "data": data}
+
+async def run_case(client, case, requests, concurrency, pid, html_url, headers):
+    endpoint, kwargs = _request(case, html_url)
+    latencies, errors, received = [], [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal received
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post(endpoint, headers=headers, **kwargs)
+                if response.status_code >= 400:
+                    errors.append(f"{response.status_code}: {response.text[:200]}")
+                    return
+                received += len(response.content)
+                latencies.append(time.perf_counter() - start)
+            except httpx.HTTPError as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    # One untimed request first so imports and pool start-up are not measured
+    await one()
+    latencies.clear()
+    received = 0
+    peak = [0]
+    sampler = asyncio.create_task(_sample_rss(pid, peak)) if pid else None
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    wall = time.perf_counter() - start
+    if sampler:
+        sampler.cancel()
+
+    result = {"case": case[0], "endpoint": endpoint, "concurrency": concurrency, "requests": requests,
+              "ok": len(latencies), "errors": len(errors), "error": errors[0] if errors else None}
+    if latencies:
+        result.update(p50_ms=round(percentile(latencies, 50) * 1000, 1), p95_ms=round(percentile(latencies, 95) * 1000, 1),
+                      mean_ms=round(sum(latencies) / len(latencies) * 1000, 1),
+                      throughput_rps=round(len(latencies) / wall, 2), bytes_out=received // len(latencies))
+    result["peak_rss_mb"] = round(peak[0] / 1e6, 1) if peak[0] else None
+    return result
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+def _serve_corpus():
+    """Serve the corpus over HTTP for html-to-pdf; returns the page URL"""
+    handler = functools.partial(_QuietHandler, directory=CORPUS_DIR)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    corpus_path("page.html")
+    return f"http://127.0.0.1:{server.server_address[1]}/page.html"
+
+def _environment(args):
+    try:
+        commit = subprocess.run(["git", "-C", HERE, "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {"started": datetime.now(timezone.utc).isoformat(timespec="seconds"), "git": commit,
+            "target": args.url or "in-process", "scale": args.scale, "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "cache": args.cache}
+
+def compare(previous, results):
+    old = {(r["case"], r["concurrency"]): r for r in previous["results"]}
+    print(f"\nvs {previous['started']} ({previous.get('git')})")
+    for r in results:
+        before = old.get((r["case"], r["concurrency"]))
+        if before and before.get("p50_ms") and r.get("p50_ms"):
+            print(f"  {r['case']:<24} c={r['concurrency']:<3} p50 {before['p50_ms']:>9.1f} -> {r['p50_ms']:>9.1f} ms  ({r['p50_ms'] / before['p50_ms']:.2f}x)")
+
+async def main(args):
+    cases = [c for c in CASES if (args.scale == "full" or c[4] == "quick") and (not args.only or c[0] in args.only)]
+    print("preparing corpus...", flush=True)
+    for case in cases:
+        for _, item in case[2] or []:
+            corpus_path(item)
+    html_url = _serve_corpus()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    headers = {} if args.cache else {"X-Nexus-Cache": "bypass"}
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=None)
+        pid = args.server_pid
+    else:
+        sys.path.insert(0, HERE)
+        import main as app_module
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app_module.app, raise_app_exceptions=False), base_url="http://bench", timeout=None)
+        pid = os.getpid() if os.path.exists("/proc") else None
+
+    results = []
+    async with client:
+        for case in cases:
+            for concurrency in args.concurrency:
+                result = await run_case(client, case, args.requests, concurrency, pid, html_url, headers)
+                results.append(result)
+                if result["ok"]:
+                    print(f"{result['case']:<24} c={concurrency:<3} p50 {result['p50_ms']:>9.1f} ms  p95 {result['p95_ms']:>9.1f} ms  "
+                          f"{result['throughput_rps']:>7.2f} req/s  rss {result['peak_rss_mb'] or '-'} MB", flush=True)
+                else:
+                    print(f"{result['case']:<24} c={concurrency:<3} FAILED {result['error']}", flush=True)
+
+    if not args.url and not pid:
+        # Without /proc, fall back to the high-water mark of this process
+        for result in results:
+            result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    report = {**_environment(args), "results": results}
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"bench-{report['started'].replace(':', '')}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {path}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Nexus Tools endpoints")
+    parser.add_argument("--url", help="base URL of a running server; default drives the app in-process")
+    parser.add_argument("--server-pid", type=int, help="pid of that server, to record its peak RSS")
+    parser.add_argument("--scale", choices=["quick", "full"], default="quick", help="full adds 2,000-page PDFs and 1M-row sheets")
+    parser.add_argument("--requests", type=int, default=5, help="timed requests per case and concurrency level")
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1], help="e.g. 1,4,16")
+    parser.add_argument("--only", type=lambda s: set(s.split(",")), help="comma-separated case names")
+    parser.add_argument("--cache", action="store_true", help="allow result cache hits (bypassed by default)")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help="corpus directory")
+    parser.add_argument("--out", default=os.path.join(HERE, "bench-results"), help="results directory")
+    parser.add_argument("--compare", help="earlier results JSON to compare p50 against")
+    args = parser.parse_args()
+    CORPUS_DIR = args.corpus
+    asyncio.run(main(args))
@@ -5,7 +5,7 @@ import sys
 import io
 import html
 from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+from reportlab.lib.pagesizes import A3, A4, A5, legal, letter
 from reportlab.lib.colors import Color
 
 # PATCH 1: Restore the deleted 'cgi' module for Python 3.13+
@@ -38,120 +38,3560 @@ if not hasattr(reportlab.lib.utils, 'getStringIO'):
 # ==========================================
 # MAIN APPLICATION CODE
 # ==========================================
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
+from fastapi.exceptions import RequestValidationError
+from fastapi.exception_handlers import http_exception_handler, request_validation_exception_handler
 from pydantic import BaseModel
-import img2pdf
 from pypdf import PdfWriter, PdfReader
+from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject, NameObject
 from PIL import Image
 import os
 import tempfile
-import mammoth
-from xhtml2pdf import pisa
-import markdown
 from typing import List
-from moviepy import VideoFileClip
-import ebooklib
-from ebooklib import epub
-from bs4 import BeautifulSoup
-from pygments import highlight
-from pygments.lexers import get_lexer_for_filename, PythonLexer
-from pygments.formatters import HtmlFormatter
-import pandas as pd
 import zipfile
+import zlib
+import csv
+import datetime
+import posixpath
 import hashlib
+import asyncio
+import json
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+import functools
+import importlib
+import itertools
+import logging
+import math
+import bisect
+import re
+import difflib
+import cProfile
+import hmac
+import marshal
+import pstats
+import random
+import tracemalloc
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager, closing, contextmanager
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from starlette.formparsers import MultiPartParser
+from starlette.background import BackgroundTask
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from starlette.routing import Match
 
-app = FastAPI()
+# ==========================================
+# EXECUTION LAYER
+# ==========================================
+
+CPU_COUNT = os.cpu_count() or 2
+PROCESS_WORKERS = int(os.environ.get("NEXUS_PROCESS_WORKERS", CPU_COUNT))
+THREAD_WORKERS = int(os.environ.get("NEXUS_THREAD_WORKERS", CPU_COUNT * 2))
+# Parallelism comes from running one tesseract per pool worker; keep each
+# single-threaded. Set before any pool starts, so every worker inherits it.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+# Pool for each tool. "process" is for GIL-bound pure Python work (pypdf,
+# reportlab, pandas, xhtml2pdf); "thread" is for tools that spend their time
+# in subprocesses or C code that releases the GIL (tesseract, poppler,
+# ffmpeg, Pillow, zlib, hashlib). Unlisted tools run on the thread pool.
+TOOL_POOLS = {
+    "img-to-pdf": "thread",
+    "merge-pdfs": "process",
+    "split-pdf": "process",
+    "rotate-pdf": "process",
+    "compress-pdf": "thread",
+    "organize-pdf": "process",
+    "pdf-to-word": "process",
+    "pdf-to-ppt": "thread",
+    "pdf-to-excel": "thread",
+    "pdf-to-jpg": "thread",
+    "pdf-to-pdfa": "thread",
+    "ppt-to-pdf": "process",
+    "excel-to-pdf": "process",
+    "html-to-pdf": "process",
+    "lock-pdf": "process",
+    "unlock-pdf": "process",
+    "watermark-pdf": "process",
+    "redact-pdf": "process",
+    "add-page-numbers": "process",
+    "ocr-pdf": "thread",
+    "compare-pdf": "process",
+    "crop-pdf": "process",
+    "repair-pdf": "process",
+    "extract-text": "process",
+    "edit-pdf-metadata": "process",
+    "convert-format": "thread",
+    "resize-image": "thread",
+    "clean-metadata": "thread",
+    "extract-audio": "thread",
+    "video-to-gif": "thread",
+    "docx-to-pdf": "process",
+    "md-to-pdf": "process",
+    "csv-to-excel": "process",
+    "excel-to-csv": "process",
+    "create-zip": "thread",
+    "epub-to-text": "process",
+    "code-to-pdf": "process",
+    "file-hash": "thread",
+    "pipeline": "process",
+}
+
+# Per-deployment overrides, e.g. NEXUS_TOOL_POOLS="ocr-pdf=process,merge-pdfs=thread"
+for entry in os.environ.get("NEXUS_TOOL_POOLS", "").split(","):
+    if "=" in entry:
+        name, kind = entry.split("=", 1)
+        TOOL_POOLS[name.strip()] = kind.strip()
+
+_pools = {}
+
+def get_pool(kind):
+    """Return the shared executor for a pool kind, creating it on first use"""
+    if kind not in _pools:
+        if kind == "process":
+            # Workers preload the warm groups so the first request on each doesn't pay for it
+            _pools[kind] = ProcessPoolExecutor(max_workers=PROCESS_WORKERS, initializer=load_groups, initargs=(WARM_GROUPS,))
+        else:
+            _pools[kind] = ThreadPoolExecutor(max_workers=THREAD_WORKERS, thread_name_prefix="nexus-tool")
+    return _pools[kind]
+
+async def run_tool(tool, fn, *args, **kwargs):
+    """Run the blocking body of a tool in its assigned pool without blocking the event loop"""
+    kind = TOOL_POOLS.get(tool, "thread")
+    loop = asyncio.get_running_loop()
+    profile = _profile.get()
+    METRICS.add("nexus_pool_tasks", (("pool", kind),), 1)
+    try:
+        if profile is None:
+            result, pages = await loop.run_in_executor(get_pool(kind), functools.partial(_call_counting_pages, TOOL_GROUP.get(tool), fn, *args, **kwargs))
+        else:
+            result, pages, report = await loop.run_in_executor(get_pool(kind), functools.partial(_call_profiled, time.time(), TOOL_GROUP.get(tool), fn, *args, **kwargs))
+            profile.add_tool_run(tool, report)
+    except Exception as e:
+        METRICS.inc("nexus_tool_errors_total", (("tool", tool), ("exception", type(e).__name__)))
+        if isinstance(e, BrokenProcessPool):
+            # A worker died (OOM kill, segfault in a C extension); start a fresh pool for the next request
+            _pools.pop(kind, None)
+        raise
+    finally:
+        METRICS.add("nexus_pool_tasks", (("pool", kind),), -1)
+    if pages:
+        METRICS.inc("nexus_tool_pages_total", (("tool", tool),), pages)
+    return result
+
+async def stream_in_pool(chunks):
+    """Drive a blocking generator on the thread pool and return an async iterator
+    over its chunks. The first chunk is produced before returning, so errors
+    opening the input still turn into a normal error response."""
+    loop = asyncio.get_running_loop()
+    pool = get_pool("thread")
+    done = object()
+    first = await loop.run_in_executor(pool, next, chunks, done)
+
+    async def rest():
+        chunk = first
+        try:
+            while chunk is not done:
+                yield chunk
+                chunk = await loop.run_in_executor(pool, next, chunks, done)
+        finally:
+            chunks.close()
+    return rest()
+
+def shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
+
+# ==========================================
+# TOOL REGISTRY
+# ==========================================
+
+log = logging.getLogger("uvicorn.error")
+
+# Heavy dependencies of each tool group, imported the first time one of the
+# group's tools runs. pdf-core is always loaded at startup; pypdf and
+# reportlab come in with the module itself, since the compatibility patches
+# need reportlab anyway and nearly every PDF tool uses pypdf.
+TOOL_GROUPS = {
+    "pdf-core": {
+        "modules": ["pypdf", "pikepdf", "pymupdf", "reportlab.pdfgen.canvas", "PIL.Image"],
+        "tools": ["merge-pdfs", "split-pdf", "rotate-pdf", "compress-pdf", "organize-pdf", "lock-pdf",
+                  "unlock-pdf", "watermark-pdf", "redact-pdf", "add-page-numbers", "compare-pdf",
+                  "crop-pdf", "repair-pdf", "extract-text", "edit-pdf-metadata", "pipeline"],
+    },
+    "conversion": {
+        "modules": ["xhtml2pdf.pisa", "mammoth", "markdown", "pygments.lexers", "pygments.formatters",
+                    "pdf2docx", "pptx", "pdf2image", "pytesseract", "pymupdf", "pikepdf", "requests"],
+        "tools": ["img-to-pdf", "pdf-to-word", "pdf-to-ppt", "pdf-to-jpg", "pdf-to-pdfa", "html-to-pdf",
+                  "ocr-pdf", "docx-to-pdf", "md-to-pdf", "code-to-pdf"],
+    },
+    "media": {
+        "modules": ["PIL.Image", "imageio_ffmpeg"],
+        "tools": ["convert-format", "resize-image", "clean-metadata", "extract-audio", "video-to-gif"],
+    },
+    "office": {
+        "modules": ["pandas", "openpyxl", "tabula", "pptx"],
+        "tools": ["pdf-to-excel", "ppt-to-pdf", "excel-to-pdf", "csv-to-excel", "excel-to-csv"],
+    },
+    "utilities": {
+        "modules": ["ebooklib.epub", "bs4"],
+        "tools": ["create-zip", "epub-to-text", "file-hash"],
+    },
+}
+TOOL_GROUP = {tool: group for group, spec in TOOL_GROUPS.items() for tool in spec["tools"]}
+
+# Groups to import at startup, e.g. NEXUS_WARM_GROUPS="conversion,office"
+WARM_GROUPS = [g.strip() for g in os.environ.get("NEXUS_WARM_GROUPS", "").split(",") if g.strip()]
+
+# group -> {"seconds": import time in this process, "missing": modules that failed
+# to import, "preloaded": already imported by the time the group was loaded}
+_loaded_groups = {}
+_group_lock = threading.Lock()
+
+def load_group(group):
+    """Import a group's dependencies once per process and record what it cost"""
+    if group is None or group in _loaded_groups:
+        return
+    with _group_lock:
+        if group in _loaded_groups:
+            return
+        modules = TOOL_GROUPS[group]["modules"]
+        preloaded = all(module in sys.modules for module in modules)
+        start = time.perf_counter()
+        missing = []
+        for module in modules:
+            try:
+                importlib.import_module(module)
+            except ImportError:
+                # Optional dependency; the tool's own import reports it when it runs
+                missing.append(module)
+        _loaded_groups[group] = {"seconds": round(time.perf_counter() - start, 3), "missing": missing, "preloaded": preloaded}
+
+def load_groups(groups):
+    for group in groups:
+        load_group(group)
+
+def _call_in_group(group, fn, *args, **kwargs):
+    load_group(group)
+    return fn(*args, **kwargs)
+
+def group_report():
+    return {group: _loaded_groups.get(group, {"seconds": None, "missing": [], "preloaded": False}) | {"loaded": group in _loaded_groups}
+            for group in TOOL_GROUPS}
+
+def warm_groups():
+    """Import pdf-core and the configured warm groups, and log what each group cost"""
+    load_groups(["pdf-core"] + WARM_GROUPS)
+    for group, info in group_report().items():
+        if not info["loaded"]:
+            log.info("tool group %s: deferred until first use", group)
+        elif info["preloaded"]:
+            log.info("tool group %s: imported with the application", group)
+        else:
+            missing = f" (missing: {', '.join(info['missing'])})" if info["missing"] else ""
+            log.info("tool group %s: imported in %.0f ms%s", group, info["seconds"] * 1000, missing)
+
+# ==========================================
+# UPLOAD LAYER
+# ==========================================
+
+MB = 1024 * 1024
+UPLOAD_SPOOL_BYTES = int(os.environ.get("NEXUS_UPLOAD_SPOOL_BYTES", 1 * MB))
+MAX_FILE_BYTES = int(os.environ.get("NEXUS_MAX_FILE_BYTES", 200 * MB))
+MAX_REQUEST_BYTES = int(os.environ.get("NEXUS_MAX_REQUEST_BYTES", 500 * MB))
+UPLOAD_DIR = os.environ.get("NEXUS_UPLOAD_DIR") or tempfile.gettempdir()
+UPLOAD_CHUNK = 1 * MB
+
+# Multipart file parts stay in memory up to this size, then roll over to disk
+MultiPartParser.spool_max_size = UPLOAD_SPOOL_BYTES
+
+def _spool_upload(src, path, budget):
+    """Copy an upload body to path chunk by chunk, enforcing the size caps.
+    The SHA-256 is taken on the way through for the result cache."""
+    size = 0
+    digest = hashlib.sha256()
+    src.seek(0)
+    with open(path, "wb") as out:
+        while chunk := src.read(UPLOAD_CHUNK):
+            size += len(chunk)
+            if size > MAX_FILE_BYTES:
+                raise HTTPException(413, f"File exceeds the {MAX_FILE_BYTES // MB} MB per-file limit")
+            if size > budget:
+                raise HTTPException(413, f"Upload exceeds the {MAX_REQUEST_BYTES // MB} MB per-request limit")
+            digest.update(chunk)
+            out.write(chunk)
+    return size, digest.hexdigest()
+
+class RequestFiles:
+    """Temp files owned by one request. Tools get paths instead of bytes, and
+    everything is removed when the `async with` block exits. Files of one batch
+    entry take a parent, whose per-request byte budget they share."""
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.paths = []
+        self.digests = {}
+        self.total = 0
+        self.sending = False
+        self.cache_key = None
+        self.cache_status = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        # A streamed response still needs its files; it cleans up once sent
+        if not self.sending:
+            self.cleanup()
+
+    def new_path(self, suffix=""):
+        fd, path = tempfile.mkstemp(prefix="nexus-", suffix=suffix, dir=UPLOAD_DIR)
+        os.close(fd)
+        self.paths.append(path)
+        return path
+
+    async def save(self, upload, suffix=None):
+        """Spool an UploadFile to its own temp file and return the path"""
+        if suffix is None:
+            suffix = os.path.splitext(upload.filename or "")[1]
+        path = self.new_path(suffix)
+        start = time.perf_counter()
+        owner = self.parent or self
+        size, self.digests[path] = await asyncio.to_thread(_spool_upload, upload.file, path, MAX_REQUEST_BYTES - owner.total)
+        owner.total += size
+        await upload.close()
+        profile = _profile.get()
+        if profile is not None:
+            profile.record("upload", time.perf_counter() - start)
+        return path
+
+    def headers(self, filename):
+        headers = attachment(filename)
+        if self.cache_status:
+            headers[CACHE_HEADER] = self.cache_status
+        return headers
+
+    def send_file(self, path, media_type, filename):
+        """Stream a finished artifact from disk, removing the temp files afterwards"""
+        self.sending = True
+        return FileResponse(path, media_type=media_type, headers=self.headers(filename), background=BackgroundTask(self.cleanup))
+
+    def send_stream(self, chunks, media_type, filename):
+        """Stream chunks to the client as they are produced, removing the temp files afterwards"""
+        self.sending = True
+        return StreamingResponse(self._stream(chunks), media_type=media_type, headers=self.headers(filename))
+
+    async def _stream(self, chunks):
+        try:
+            async for chunk in chunks:
+                if chunk:
+                    yield chunk
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        for path in self.paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.paths.clear()
+
+def form_bool(value):
+    """Checkbox-style form value: true, 1, yes or on"""
+    return str(value).strip().lower() in ("true", "1", "yes", "on")
+
+def form_params(form, fields):
+    """Read [(field, type, default)] from a submitted form. Fields without a default are required."""
+    params = {}
+    for name, cast, default in fields:
+        value = form.get(name, default)
+        if value is None:
+            raise HTTPException(400, f"Missing parameter: {name}")
+        try:
+            params[name] = cast(value)
+        except ValueError:
+            raise HTTPException(400, f"Invalid parameter: {name}")
+    return params
+
+# ==========================================
+# STREAMING RESPONSES
+# ==========================================
+
+def attachment(filename):
+    return {"Content-Disposition": f"attachment; filename={filename}"}
+
+class _ZipSink:
+    """Write-only, non-seekable buffer for zipfile. Without seek() zipfile
+    writes data descriptors, so entries can be sent before the archive is done."""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+def _zip_entry(zf, sink, arcname, data):
+    """Add one entry to zf, yielding the archive bytes as they are produced.
+    Paths are copied in chunks so no entry is held in memory."""
+    if isinstance(data, bytes):
+        zf.writestr(arcname, data)
+    else:
+        large = os.path.getsize(data) > zipfile.ZIP64_LIMIT
+        with open(data, "rb") as src, zf.open(arcname, "w", force_zip64=large) as dst:
+            while chunk := src.read(UPLOAD_CHUNK):
+                dst.write(chunk)
+                yield sink.drain()
+    yield sink.drain()
+
+def zip_stream(entries, compression=zipfile.ZIP_DEFLATED):
+    """Yield a ZIP archive piece by piece. entries yields (arcname, bytes) or (arcname, path)."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression) as zf:
+        for arcname, data in entries:
+            yield from _zip_entry(zf, sink, arcname, data)
+    yield sink.drain()
+
+async def zip_stream_async(entries, compression=zipfile.ZIP_DEFLATED):
+    """zip_stream over an async iterable of entries, for archives whose entries
+    are still being produced. Compression runs on the thread pool."""
+    sink = _ZipSink()
+    zf = zipfile.ZipFile(sink, "w", compression)
+    async for arcname, data in entries:
+        async for chunk in await stream_in_pool(_zip_entry(zf, sink, arcname, data)):
+            yield chunk
+    zf.close()
+    yield sink.drain()
+
+# ==========================================
+# RESULT CACHE
+# ==========================================
+
+CACHE_DIR = os.environ.get("NEXUS_CACHE_DIR") or os.path.join(UPLOAD_DIR, "nexus-cache")
+CACHE_MAX_BYTES = int(os.environ.get("NEXUS_CACHE_MAX_BYTES", 2048 * MB))
+CACHE_TTL = int(os.environ.get("NEXUS_CACHE_TTL", 24 * 3600))
+# Seconds between rescans of the directory for what other worker processes stored and
+# evicted. Together they can only overshoot the limit by what they store in one interval.
+CACHE_SCAN_INTERVAL = float(os.environ.get("NEXUS_CACHE_SCAN_INTERVAL", 5))
+# Eviction frees space down to this share of the limit, so full caches do not rescan on every store
+CACHE_LOW_WATER = 0.9
+# Partial files older than this were left by a crashed process
+CACHE_PART_MAX_AGE = 3600
+
+# Request header "X-Nexus-Cache: bypass" skips the cache; responses report HIT, MISS or BYPASS
+CACHE_HEADER = "X-Nexus-Cache"
+
+# Outputs that depend on more than the upload, or that should never be kept on disk
+UNCACHED_TOOLS = {"html-to-pdf", "lock-pdf", "unlock-pdf", "file-hash"}
+
+cache_bypass = ContextVar("cache_bypass", default=False)
+
+def _link_or_copy(src, dest):
+    # Hard links are instant and survive eviction of the cache entry while a response streams
+    partial = dest + ".part"
+    try:
+        os.link(src, partial)
+    except OSError:
+        shutil.copyfile(src, partial)
+    os.replace(partial, dest)
+
+class ResultCache:
+    """Content-addressed tool outputs on local disk. Entries expire after the
+    TTL and the least recently used ones are evicted past the size limit.
+    The directory is shared by every worker process and is the source of truth:
+    each process's index is rebuilt from it every CACHE_SCAN_INTERVAL seconds and
+    before evicting, and a key missing from the index is looked up on disk."""
+
+    def __init__(self, directory, max_bytes, ttl):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = None  # key -> (size, stored_at), least recently used first
+        self.total = 0
+        self.scanned = 0
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def _scan(self):
+        # atime records last use, mtime the store time
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+                if name.endswith(".part"):
+                    # Another process may still be writing it; only leftovers of a crash go
+                    if time.time() - st.st_mtime > CACHE_PART_MAX_AGE:
+                        os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue  # evicted by another process meanwhile
+            found.append((st.st_atime, name, st.st_size, st.st_mtime))
+        self.entries = OrderedDict((name, (size, stored_at)) for _, name, size, stored_at in sorted(found))
+        self.total = sum(size for size, _ in self.entries.values())
+        self.scanned = time.monotonic()
+
+    def _index(self):
+        if self.entries is None or time.monotonic() - self.scanned > CACHE_SCAN_INTERVAL:
+            self._scan()
+        return self.entries
+
+    def _adopt(self, key):
+        """Index an entry another process stored since the last scan"""
+        try:
+            st = os.stat(os.path.join(self.directory, key))
+        except FileNotFoundError:
+            return None
+        self.entries[key] = (st.st_size, st.st_mtime)
+        self.total += st.st_size
+        return self.entries[key]
+
+    def key(self, tool, parts):
+        return hashlib.sha256(json.dumps([tool, parts], sort_keys=True, default=str).encode()).hexdigest()
+
+    def fetch(self, key, dest):
+        """Link a cached artifact to dest; False on a miss"""
+        entries = self._index()
+        entry = entries.get(key) or self._adopt(key)
+        if entry and time.time() - entry[1] <= self.ttl:
+            path = os.path.join(self.directory, key)
+            try:
+                _link_or_copy(path, dest)
+                os.utime(path, (time.time(), entry[1]))
+                entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return True
+            except FileNotFoundError:
+                pass  # removed by another worker process
+        if entry:
+            self._evict(key)
+        self.stats["misses"] += 1
+        return False
+
+    def store(self, key, src, move=False):
+        entries = self._index()
+        path = os.path.join(self.directory, key)
+        if move:
+            os.replace(src, path)
+        else:
+            _link_or_copy(src, path)
+        if key in entries:
+            self.total -= entries.pop(key)[0]
+        now = time.time()
+        # Other processes read last use and store time back from the file
+        os.utime(path, (now, now))
+        size = os.path.getsize(path)
+        entries[key] = (size, now)
+        self.total += size
+        self.stats["stores"] += 1
+        if self.total > self.max_bytes:
+            # Count what every process has stored, then free down to the low-water mark
+            self._scan()
+            while self.total > self.max_bytes * CACHE_LOW_WATER and self.entries:
+                self._evict(next(iter(self.entries)))
+
+    def _evict(self, key):
+        size, _ = self.entries.pop(key)
+        self.total -= size
+        self.stats["evictions"] += 1
+        try:
+            os.remove(os.path.join(self.directory, key))
+        except OSError:
+            pass
+
+RESULT_CACHE = ResultCache(CACHE_DIR, CACHE_MAX_BYTES, CACHE_TTL)
+
+def _cache_part(tmp, arg):
+    # Uploads are keyed by content, output paths by suffix, everything else by value
+    if isinstance(arg, (list, tuple)):
+        return [_cache_part(tmp, a) for a in arg]
+    if isinstance(arg, str) and arg in tmp.digests:
+        return "sha256:" + tmp.digests[arg]
+    if isinstance(arg, str) and arg in tmp.paths:
+        return "out" + os.path.splitext(arg)[1]
+    return arg
+
+def cache_fetch(tmp, tool, args, out):
+    """Fill out from the result cache. On a miss the key is kept on tmp so the
+    result can be stored once it is produced."""
+    if tool in UNCACHED_TOOLS:
+        return False
+    if cache_bypass.get():
+        tmp.cache_status = "BYPASS"
+        return False
+    tmp.cache_key = RESULT_CACHE.key(tool, _cache_part(tmp, args))
+    hit = RESULT_CACHE.fetch(tmp.cache_key, out)
+    tmp.cache_status = "HIT" if hit else "MISS"
+    return hit
+
+def cache_store(tmp, out):
+    if tmp.cache_key and os.path.exists(out):
+        RESULT_CACHE.store(tmp.cache_key, out)
+
+async def run_cached(tmp, tool, fn, *args, **kwargs):
+    """run_tool behind the result cache. The output is the argument that is
+    one of tmp's own paths but not an upload. Keyword arguments (progress
+    callbacks) go to the tool but are not part of the key. Returns what the
+    tool returned, or None when the output came from the cache."""
+    out = next(a for a in args if isinstance(a, str) and a in tmp.paths and a not in tmp.digests)
+    if cache_fetch(tmp, tool, args, out):
+        return None
+    result = await run_tool(tool, fn, *args, **kwargs)
+    cache_store(tmp, out)
+    return result
+
+async def cache_tee(tmp, chunks):
+    """Pass a streamed output through while copying it into the cache. It is
+    only stored if the stream completes."""
+    if not tmp.cache_key:
+        async for chunk in chunks:
+            yield chunk
+        return
+    fd, partial = tempfile.mkstemp(suffix=".part", dir=RESULT_CACHE.directory)
+    complete = False
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in chunks:
+                f.write(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+                yield chunk
+        complete = True
+    finally:
+        if complete:
+            RESULT_CACHE.store(tmp.cache_key, partial, move=True)
+        elif os.path.exists(partial):
+            os.remove(partial)
+
+@asynccontextmanager
+async def lifespan(app):
+    warm_groups()
+    start_job_workers()
+    yield
+    await stop_job_workers()
+    shutdown_pools()
+
+app = FastAPI(lifespan=lifespan)
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+@app.middleware("http")
+async def reject_oversized_uploads(request, call_next):
+    """Refuse bodies over the per-request cap before they are parsed and spooled"""
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_REQUEST_BYTES:
+        return JSONResponse({"detail": f"Upload exceeds the {MAX_REQUEST_BYTES // MB} MB per-request limit"}, status_code=413)
+    return await call_next(request)
+
+@app.middleware("http")
+async def read_cache_opt_out(request, call_next):
+    cache_bypass.set(request.headers.get(CACHE_HEADER, "").lower() == "bypass")
+    return await call_next(request)
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Result cache counters and current size"""
+    RESULT_CACHE._index()
+    return {**RESULT_CACHE.stats, "entries": len(RESULT_CACHE.entries), "bytes": RESULT_CACHE.total, "max_bytes": RESULT_CACHE.max_bytes}
+
+@app.get("/api/tool-groups")
+async def tool_groups():
+    """Which tool groups this process has imported and what each one cost"""
+    return group_report()
+
+# ==========================================
+# METRICS
+# ==========================================
+
+# Prometheus text format at /metrics. Values are per process; with several
+# uvicorn workers each reports its own and the scraper sums them.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRIC_TYPES = {
+    "nexus_http_requests_total": ("counter", "Requests by route, method and status"),
+    "nexus_http_request_duration_seconds": ("histogram", "Time from request start to last response byte"),
+    "nexus_http_requests_in_flight": ("gauge", "Requests currently being handled"),
+    "nexus_http_request_bytes_total": ("counter", "Request body bytes received"),
+    "nexus_http_response_bytes_total": ("counter", "Response body bytes sent"),
+    "nexus_http_errors_total": ("counter", "Error responses by route and underlying exception type"),
+    "nexus_tool_errors_total": ("counter", "Tool runs that raised, by exception type"),
+    "nexus_tool_pages_total": ("counter", "PDF pages processed by tool runs"),
+    "nexus_pool_tasks": ("gauge", "Tool runs submitted to a pool and not yet finished"),
+    "nexus_pool_queue_depth": ("gauge", "Tool runs waiting for a free pool worker"),
+    "nexus_pool_workers": ("gauge", "Workers per pool"),
+    "nexus_jobs": ("gauge", "Background jobs by status"),
+    "nexus_cache_events_total": ("counter", "Result cache hits, misses, stores and evictions"),
+}
+
+class Metrics:
+    """Counters, gauges and histograms keyed by (name, label pairs). Only the
+    event loop thread touches them, so plain dicts are enough."""
+
+    def __init__(self):
+        self.values = defaultdict(float)
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        self.values[name, labels] += value
+
+    add = inc
+
+    def observe(self, name, labels, value):
+        counts = self.histograms.get((name, labels))
+        if counts is None:
+            # One slot per bucket, then +Inf, then the running sum
+            counts = self.histograms[name, labels] = [0] * (len(LATENCY_BUCKETS) + 2)
+        counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        counts[-1] += value
+
+    def render(self, extra=()):
+        series = defaultdict(list)
+        for (name, labels), value in [*self.values.items(), *extra]:
+            series[name].append(f"{name}{_labels(labels)} {value:g}")
+        for (name, labels), counts in self.histograms.items():
+            total = 0
+            for bound, count in zip((*LATENCY_BUCKETS, "+Inf"), counts):
+                total += count
+                series[name].append(f"{name}_bucket{_labels((*labels, ('le', str(bound))))} {total}")
+            series[name].append(f"{name}_sum{_labels(labels)} {counts[-1]:g}")
+            series[name].append(f"{name}_count{_labels(labels)} {total}")
+        lines = []
+        for name, (kind, help_text) in METRIC_TYPES.items():
+            if name in series:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", *series[name]]
+        return "\n".join(lines) + "\n"
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+METRICS = Metrics()
+
+# Tool bodies whose PDF inputs are not pages processed: byte-level tools, and
+# slices of a document another call has already counted
+PAGES_NOT_COUNTED = set()
+
+def _pdf_inputs(args):
+    for arg in args:
+        for path in arg if isinstance(arg, list) else [arg]:
+            if isinstance(path, str) and path.endswith(".pdf") and os.path.isfile(path) and os.path.getsize(path):
+                yield path
+
+def _call_counting_pages(group, fn, *args, **kwargs):
+    """Run a tool in its worker and also return how many pages its PDF inputs had"""
+    # Output paths exist but are empty until the tool writes them
+    inputs = [] if fn in PAGES_NOT_COUNTED else list(_pdf_inputs(args))
+    result = _call_in_group(group, fn, *args, **kwargs)
+    pages = 0
+    for path in inputs:
+        try:
+            # /Count straight from the page tree root; walking reader.pages costs far more
+            pages += int(PdfReader(path).trailer["/Root"]["/Pages"]["/Count"])
+        except Exception:
+            pass
+    return result, pages
+
+_route_labels = {}
+
+def _route_label(scope):
+    """Route template for a request path, so /api/jobs/<id> is one series rather than thousands"""
+    path = scope["path"]
+    label = _route_labels.get(path)
+    if label is None:
+        label = "unmatched"
+        for route in app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                label = route.path
+                break
+            if match == Match.PARTIAL and label == "unmatched":
+                # Right path, wrong method
+                label = route.path
+        if label != "unmatched" and "{" not in label:
+            _route_labels[path] = label
+    return label
+
+class MetricsMiddleware:
+    """Plain ASGI middleware: one wrapped receive/send per request and no extra task,
+    unlike @app.middleware("http")"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = (("route", _route_label(scope)),)
+        status, received, sent = 500, 0, 0
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            elif message["type"] == "http.response.pathsend":
+                sent += os.path.getsize(message["path"])
+            await send(message)
+
+        METRICS.add("nexus_http_requests_in_flight", route, 1)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        except Exception as e:
+            scope["nexus.exception"] = type(e).__name__
+            status = 500
+            raise
+        finally:
+            METRICS.add("nexus_http_requests_in_flight", route, -1)
+            METRICS.observe("nexus_http_request_duration_seconds", route, time.perf_counter() - start)
+            METRICS.inc("nexus_http_requests_total", (*route, ("method", scope["method"]), ("status", status)))
+            METRICS.inc("nexus_http_request_bytes_total", route, received)
+            METRICS.inc("nexus_http_response_bytes_total", route, sent)
+            if status >= 400:
+                METRICS.inc("nexus_http_errors_total", (*route, ("exception", scope.get("nexus.exception", "HTTPException"))))
+
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(StarletteHTTPException)
+async def record_http_exception(request, exc):
+    # Handlers wrap failures as HTTPException(500, str(e)); label the error with what was actually raised
+    cause = exc.__cause__ or exc.__context__
+    request.scope["nexus.exception"] = type(cause if cause is not None else exc).__name__
+    return await http_exception_handler(request, exc)
+
+@app.exception_handler(RequestValidationError)
+async def record_validation_error(request, exc):
+    request.scope["nexus.exception"] = "RequestValidationError"
+    return await request_validation_exception_handler(request, exc)
+
+def _job_counts():
+    try:
+        with closing(_jobs_db()) as db:
+            return db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    except sqlite3.Error:
+        return []
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics for this process"""
+    extra = []
+    for kind, workers in (("process", PROCESS_WORKERS), ("thread", THREAD_WORKERS)):
+        tasks = METRICS.values.get(("nexus_pool_tasks", (("pool", kind),)), 0)
+        extra.append((("nexus_pool_workers", (("pool", kind),)), workers))
+        extra.append((("nexus_pool_queue_depth", (("pool", kind),)), max(0, tasks - workers)))
+    for status, count in await asyncio.to_thread(_job_counts):
+        extra.append((("nexus_jobs", (("status", status),)), count))
+    for event, count in RESULT_CACHE.stats.items():
+        extra.append((("nexus_cache_events_total", (("event", event),)), count))
+    return PlainTextResponse(METRICS.render(extra), media_type="text/plain; version=0.0.4")
+
+# ==========================================
+# PROFILING
+# ==========================================
+
+# A request carrying "X-Nexus-Profile: <NEXUS_PROFILE_TOKEN>", or a sampled
+# fraction of tool requests, runs under cProfile and tracemalloc in the event
+# loop and in whichever pool worker runs the tool. Profiles are kept on disk
+# and read back through /api/admin/profiles with "X-Nexus-Admin-Token". With
+# neither setting, the middleware is not installed at all.
+PROFILE_TOKEN = os.environ.get("NEXUS_PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.environ.get("NEXUS_PROFILE_SAMPLE_RATE", 0))
+if PROFILE_SAMPLE_RATE > 0 and not PROFILE_TOKEN:
+    # Sampled profiles could be collected but never read back
+    raise RuntimeError("NEXUS_PROFILE_SAMPLE_RATE needs NEXUS_PROFILE_TOKEN, the token the admin profile endpoints check")
+PROFILE_DIR = os.environ.get("NEXUS_PROFILE_DIR") or os.path.join(UPLOAD_DIR, "nexus-profiles")
+PROFILE_KEEP = int(os.environ.get("NEXUS_PROFILE_KEEP", 50))
+PROFILE_TOP = 30
+
+_profile = ContextVar("profile", default=None)
+_stage_log = ContextVar("stage_log", default=None)
+
+class StageLog:
+    """Stage timings for one profiled tool run, plus a tracemalloc snapshot from
+    the stage boundary with the most memory in use"""
+
+    def __init__(self):
+        self.stages = []
+        self.snapshot = None
+        self.snapshot_bytes = -1
+
+    def record(self, name, seconds):
+        self.stages.append({"stage": name, "ms": round(seconds * 1000, 2)})
+        self.checkpoint()
+
+    def checkpoint(self):
+        if tracemalloc.is_tracing():
+            current = tracemalloc.get_traced_memory()[0]
+            if current > self.snapshot_bytes:
+                self.snapshot_bytes, self.snapshot = current, tracemalloc.take_snapshot()
+
+@contextmanager
+def stage(name):
+    """Time a step of a tool body (parse, transform, serialize) for request profiles"""
+    log = _stage_log.get()
+    if log is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        log.record(name, time.perf_counter() - start)
+
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0:
+            # One frame per allocation is enough to group by line and far cheaper than full tracebacks
+            tracemalloc.start(1)
+        _tracing_users += 1
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0:
+            tracemalloc.stop()
+
+def _top_allocations(snapshot):
+    if snapshot is None:
+        return []
+    snapshot = snapshot.filter_traces([tracemalloc.Filter(False, path) for path in (tracemalloc.__file__, cProfile.__file__, "<frozen *>")])
+    return [{"site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}", "bytes": stat.size, "count": stat.count}
+            for stat in snapshot.statistics("lineno")[:PROFILE_TOP]]
+
+def _call_profiled(submitted, group, fn, *args, **kwargs):
+    """_call_counting_pages under cProfile and tracemalloc; also returns the report for the request profile"""
+    log = StageLog()
+    report = {"queued_ms": round(max(0.0, time.time() - submitted) * 1000, 2)}
+    token = _stage_log.set(log)
+    _start_tracing()
+    baseline = tracemalloc.get_traced_memory()[0]
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another run in this process holds the profiler; keep the timings and allocations
+        profiler = None
+    start = time.perf_counter()
+    try:
+        result, pages = _call_counting_pages(group, fn, *args, **kwargs)
+    finally:
+        report["ms"] = round((time.perf_counter() - start) * 1000, 2)
+        if profiler:
+            profiler.disable()
+            profiler.create_stats()
+            report["stats"] = marshal.dumps(profiler.stats)
+        log.checkpoint()
+        report["peak_bytes"] = max(0, tracemalloc.get_traced_memory()[1] - baseline)
+        report["stages"] = log.stages
+        report["allocations"] = _top_allocations(log.snapshot)
+        _stop_tracing()
+        _stage_log.reset(token)
+    return result, pages, report
+
+class RequestProfile:
+    """What one profiled request collects before it is written to PROFILE_DIR"""
+
+    def __init__(self, scope):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.started = time.time()
+        self.stages = []
+        self.tools = []
+
+    def record(self, name, seconds):
+        self.stages.append({"stage": name, "ms": round(seconds * 1000, 2)})
+
+    def add_tool_run(self, tool, report):
+        self.tools.append({"tool": tool, **report})
+
+def _wants_profile(scope):
+    if PROFILE_TOKEN:
+        for key, value in scope["headers"]:
+            if key == b"x-nexus-profile":
+                return hmac.compare_digest(value.decode("latin-1"), PROFILE_TOKEN)
+    return (PROFILE_SAMPLE_RATE > 0 and scope["method"] == "POST" and scope["path"].startswith("/api/")
+            and random.random() < PROFILE_SAMPLE_RATE)
+
+# cProfile hooks the whole event loop thread, so only one request at a time gets a loop-side profile
+_loop_profiler_busy = False
+
+class ProfileMiddleware:
+    """Plain ASGI, installed only when profiling is configured"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _loop_profiler_busy
+        if scope["type"] != "http" or not _wants_profile(scope):
+            return await self.app(scope, receive, send)
+        profile = RequestProfile(scope)
+        status, responded = 500, None
+
+        async def profiled_send(message):
+            nonlocal status, responded
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                responded = time.perf_counter()
+                message["headers"] = [*message.get("headers", []), (b"x-nexus-profile-id", profile.id.encode())]
+            await send(message)
+            if message["type"] == "http.response.pathsend" or (message["type"] == "http.response.body" and not message.get("more_body")):
+                profile.record("respond", time.perf_counter() - responded)
+
+        token = _profile.set(profile)
+        profiler = None
+        if not _loop_profiler_busy:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                _loop_profiler_busy = True
+            except ValueError:
+                profiler = None
+        _start_tracing()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler:
+                profiler.disable()
+                _loop_profiler_busy = False
+            loop_peak = tracemalloc.get_traced_memory()[1]
+            _stop_tracing()
+            _profile.reset(token)
+            await asyncio.to_thread(_save_profile, profile, profiler, seconds, status, loop_peak)
+
+def _save_profile(profile, profiler, seconds, status, loop_peak):
+    """Write profile.json and one merged profile.prof for the loop and every tool run"""
+    directory = os.path.join(PROFILE_DIR, profile.id)
+    os.makedirs(directory, exist_ok=True)
+    parts = []
+    if profiler:
+        parts.append(os.path.join(directory, "loop.prof"))
+        profiler.dump_stats(parts[-1])
+    for num, run in enumerate(profile.tools):
+        if "stats" in run:
+            parts.append(os.path.join(directory, f"tool-{num}.prof"))
+            with open(parts[-1], "wb") as f:
+                f.write(run.pop("stats"))
+    functions = ""
+    if parts:
+        stream = io.StringIO()
+        stats = pstats.Stats(*parts, stream=stream)
+        stats.dump_stats(os.path.join(directory, "profile.prof"))
+        # The loop's idle time in the selector would otherwise top the listing
+        for func in [f for f in stats.stats if f[0].endswith("selectors.py") or "of 'select." in f[2]]:
+            del stats.stats[func]
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+        functions = stream.getvalue()
+        for part in parts:
+            os.remove(part)
+    report = {
+        "id": profile.id, "method": profile.method, "path": profile.path, "status": status,
+        "started": profile.started, "ms": round(seconds * 1000, 2), "loop_profiled": profiler is not None,
+        "loop_peak_bytes": loop_peak, "stages": profile.stages, "tools": profile.tools, "functions": functions,
+    }
+    with open(os.path.join(directory, "profile.json"), "w") as f:
+        json.dump(report, f, indent=1)
+    _prune_profiles()
+
+def _prune_profiles():
+    entries = sorted(os.scandir(PROFILE_DIR), key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in entries[PROFILE_KEEP:]:
+        shutil.rmtree(entry.path, ignore_errors=True)
+
+if PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0:
+    app.add_middleware(ProfileMiddleware)
+
+def _require_admin(request):
+    supplied = request.headers.get("X-Nexus-Admin-Token", "")
+    if not PROFILE_TOKEN:
+        raise HTTPException(403, "Profiling is off: set NEXUS_PROFILE_TOKEN on the server")
+    if not hmac.compare_digest(supplied, PROFILE_TOKEN):
+        raise HTTPException(403, "Admin token required in X-Nexus-Admin-Token")
+
+def _profile_path(profile_id, name):
+    if not profile_id.isalnum():
+        raise HTTPException(404, "Profile not found")
+    path = os.path.join(PROFILE_DIR, profile_id, name)
+    if not os.path.exists(path):
+        raise HTTPException(404, "Profile not found")
+    return path
+
+def _load_profile_summaries():
+    summaries = []
+    for entry in os.scandir(PROFILE_DIR) if os.path.isdir(PROFILE_DIR) else []:
+        try:
+            with open(os.path.join(entry.path, "profile.json")) as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summaries.append({key: report[key] for key in ("id", "method", "path", "status", "started", "ms")})
+    return sorted(summaries, key=lambda s: s["started"], reverse=True)
+
+@app.get("/api/admin/profiles")
+async def list_profiles(request: Request):
+    """Stored request profiles, newest first"""
+    _require_admin(request)
+    return await asyncio.to_thread(_load_profile_summaries)
+
+@app.get("/api/admin/profiles/{profile_id}")
+async def get_profile(request: Request, profile_id: str):
+    """Stage timings, top functions and top allocation sites of one profiled request"""
+    _require_admin(request)
+    with open(_profile_path(profile_id, "profile.json")) as f:
+        return json.load(f)
+
+@app.get("/api/admin/profiles/{profile_id}/pstats")
+async def get_profile_pstats(request: Request, profile_id: str):
+    """The merged cProfile output, for pstats or snakeviz"""
+    _require_admin(request)
+    return FileResponse(_profile_path(profile_id, "profile.prof"), media_type="application/octet-stream",
+                        headers=attachment(f"{profile_id}.prof"))
+
+
+# ==========================================
+# OVERLAY ENGINE
+# ==========================================
+
+OVERLAY_CACHE_SIZE = int(os.environ.get("NEXUS_OVERLAY_CACHE_SIZE", 32))
+
+# An overlay spec is (kind, text, font, size, width, height, position), with
+# width and height of the page as displayed. "text" overlays (page numbers)
+# are written straight into each page's content stream; anything else is
+# drawn once by reportlab and shared between pages as a Form XObject.
+def _text_origin(text, font, size, width, height, position):
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    if "bottom" in position:
+        y = 30
+    elif "top" in position:
+        y = height - 42
+    else:
+        y = height / 2
+
+    if "left" in position:
+        x = 50
+    elif "right" in position:
+        x = width - 50 - stringWidth(text, font, size)
+    else:
+        x = (width - stringWidth(text, font, size)) / 2
+    return x, y
+
+def _draw_overlay(can, spec):
+    kind, text, font, size, width, height, position = spec
+    can.setPageSize((width, height))
+    can.setFont(font, size)
+    if kind == "watermark":
+        can.setFillColor(Color(0.5, 0.5, 0.5, 0.3))
+        can.translate(width / 2, height / 2)
+        can.rotate(45)
+        can.drawCentredString(0, 0, text)
+    else:
+        can.drawString(*_text_origin(text, font, size, width, height, position), text)
+    can.showPage()
+
+@functools.lru_cache(maxsize=OVERLAY_CACHE_SIZE)
+def _render_overlays(specs):
+    """Draw every overlay in specs as one page of a single reportlab document"""
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet)
+    for spec in specs:
+        _draw_overlay(can, spec)
+    can.save()
+    return packet.getvalue()
+
+def _overlay_form(writer, overlay_page):
+    """Copy a rendered overlay page into writer as a Form XObject"""
+    form = DecodedStreamObject()
+    form.set_data(overlay_page.get_contents().get_data())
+    form[NameObject("/Type")] = NameObject("/XObject")
+    form[NameObject("/Subtype")] = NameObject("/Form")
+    form[NameObject("/BBox")] = overlay_page.mediabox
+    form[NameObject("/Resources")] = overlay_page["/Resources"].clone(writer)
+    return writer._add_object(form)
+
+def _standard_font(writer, font):
+    return writer._add_object(DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/" + font),
+        NameObject("/Encoding"): NameObject("/WinAnsiEncoding"),
+    }))
+
+def _content_stream(writer, data):
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+def _pdf_string(text):
+    return b"(" + text.encode("cp1252", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+def _inherited(page, key):
+    node = page
+    while node is not None:
+        if key in node:
+            return node[key].get_object()
+        node = node.get("/Parent")
+        node = node.get_object() if node is not None else None
+    return None
+
+def _add_resource(page, category, name, ref):
+    """Add ref to the page's own copy of its resources; resource dictionaries
+    are often shared between pages, so they are never modified in place"""
+    resources = _inherited(page, "/Resources")
+    resources = DictionaryObject(resources) if resources is not None else DictionaryObject()
+    entries = resources.get(category)
+    entries = DictionaryObject(entries.get_object()) if entries is not None else DictionaryObject()
+    entries[NameObject(name)] = ref
+    resources[NameObject(category)] = entries
+    page[NameObject("/Resources")] = resources
+
+def _upright_matrix(box, rotation):
+    """Map upright (as displayed) coordinates onto the page's unrotated user space"""
+    x0, y0, x1, y1 = (float(v) for v in (box.left, box.bottom, box.right, box.top))
+    return {
+        0: (1, 0, 0, 1, x0, y0),
+        90: (0, 1, -1, 0, x1, y0),
+        180: (-1, 0, 0, -1, x1, y1),
+        270: (0, -1, 1, 0, x0, y1),
+    }[rotation % 360]
+
+def apply_overlays(writer, spec_for_page):
+    """Stamp each page of writer with the overlay returned by
+    spec_for_page(page_number, width, height), in a single pass over the pages"""
+    start = time.perf_counter()
+    layout = []
+    for page_num, page in enumerate(writer.pages, start=1):
+        box, rotation = page.cropbox, page.rotation
+        width, height = round(float(box.width), 2), round(float(box.height), 2)
+        if rotation % 180:
+            width, height = height, width
+        layout.append((spec_for_page(page_num, width, height), _upright_matrix(box, rotation)))
+
+    shared = list(dict.fromkeys(spec for spec, _ in layout if spec[0] != "text"))
+    forms = {}
+    if shared:
+        overlay_pages = PdfReader(io.BytesIO(_render_overlays(tuple(shared)))).pages
+        forms = {spec: _overlay_form(writer, overlay_pages[i]) for i, spec in enumerate(shared)}
+    fonts = {}
+
+    for page, (spec, matrix) in zip(writer.pages, layout):
+        cm = " ".join(f"{v:g}" for v in matrix).encode()
+        kind, text, font, size, width, height, position = spec
+        if kind == "text":
+            if font not in fonts:
+                fonts[font] = _standard_font(writer, font)
+            _add_resource(page, "/Font", "/NexusFont", fonts[font])
+            x, y = _text_origin(text, font, size, width, height, position)
+            placement = b"Q q %s cm BT /NexusFont %g Tf %g %g Td %s Tj ET Q\n" % (cm, size, x, y, _pdf_string(text))
+        else:
+            _add_resource(page, "/XObject", "/NexusOverlay", forms[spec])
+            placement = b"Q q %s cm /NexusOverlay Do Q\n" % cm
+
+        # Original content is wrapped in q/Q so graphics state it leaves behind can't
+        # leak into the overlay. The wrapper streams are per page: pypdf gives each
+        # page its own copy of shared content streams when it clones a document.
+        # Every element of the new array must be a reference: page["/Contents"]
+        # resolves the stream, and a stream inline in an array is not valid PDF
+        raw = page.raw_get("/Contents") if "/Contents" in page else ArrayObject()
+        contents = raw.get_object()
+        if not isinstance(contents, ArrayObject):
+            contents = [raw if isinstance(raw, IndirectObject) else writer._add_object(raw)]
+        page[NameObject("/Contents")] = ArrayObject([_content_stream(writer, b"q\n"), *contents, _content_stream(writer, placement)])
+
+    elapsed = time.perf_counter() - start
+    log.debug("overlay: %d pages, %d shared overlays, %.0f pages/s", len(layout), len(shared), len(layout) / max(elapsed, 1e-6))
+
+# ==========================================
+# COMPRESSION ENGINE
+# ==========================================
+
+# Per quality tier: target image resolution and JPEG quality. "low" is the
+# smallest file, "high" the least lossy.
+COMPRESS_TIERS = {
+    "low": {"dpi": 72, "jpeg_quality": 40, "recompress_flate": True},
+    "medium": {"dpi": 150, "jpeg_quality": 65, "recompress_flate": False},
+    "high": {"dpi": 300, "jpeg_quality": 85, "recompress_flate": False},
+}
+# Images in flight per compression run; bounds memory on very large scans
+COMPRESS_WINDOW = int(os.environ.get("NEXUS_COMPRESS_WINDOW", PROCESS_WORKERS * 2))
+
+def _recompress_image(data, mode, size, stored_size, max_side, quality):
+    """Downsample and JPEG-encode one image. data is a JPEG when mode is None,
+    otherwise raw pixels. Returns (jpeg, width, height), or None when the
+    result would not be smaller than the stream as currently stored. A JPEG
+    stored under further filters may come back as it is, unwrapped."""
+    img = Image.open(io.BytesIO(data)) if mode is None else Image.frombytes(mode, size, data)
+    if img.mode not in ("L", "RGB"):
+        return None
+    if max(img.size) > max_side:
+        # thumbnail() lets JPEG sources decode straight at a reduced scale
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality, optimize=True)
+    best = (buf.getvalue(), img.width, img.height)
+    if mode is None and len(data) < len(best[0]):
+        best = (data, *size)
+    if len(best[0]) >= stored_size:
+        return None
+    return best
+
+def _image_source(pdf, image):
+    """What _recompress_image needs to decode an image stream, or None for
+    images that are left alone (masks, CMYK, indexed, JPEG 2000, CCITT, JBIG2...)"""
+    import pikepdf
+
+    if image.get("/ImageMask", False) or image.get("/BitsPerComponent") != 8 or "/Decode" in image:
+        return None
+    colorspace = image.get("/ColorSpace")
+    if isinstance(colorspace, pikepdf.Array) and len(colorspace) == 2 and colorspace[0] == pikepdf.Name.ICCBased:
+        mode = {1: "L", 3: "RGB"}.get(int(colorspace[1].get("/N", 0)))
+    else:
+        mode = {pikepdf.Name.DeviceGray: "L", pikepdf.Name.DeviceRGB: "RGB"}.get(colorspace)
+    if mode is None:
+        return None
+
+    filters = image.get("/Filter")
+    filters = list(filters) if isinstance(filters, pikepdf.Array) else [filters] if filters is not None else []
+    if filters == [pikepdf.Name.DCTDecode]:
+        return image.read_raw_bytes(), None
+    try:
+        if filters and filters[-1] == pikepdf.Name.DCTDecode:
+            # qpdf will not stop decoding short of DCTDecode, so the filters ahead
+            # of it (reportlab writes ASCII85Decode) are undone on a copy that
+            # lists only them, leaving the JPEG itself
+            prefix = pikepdf.Stream(pdf, image.read_raw_bytes())
+            prefix.Filter = pikepdf.Array(filters[:-1])
+            parms = image.get("/DecodeParms")
+            if isinstance(parms, pikepdf.Array):
+                prefix.DecodeParms = pikepdf.Array(list(parms)[:-1])
+            return prefix.read_bytes(), None
+        data = image.read_bytes()
+    except pikepdf.PdfError:
+        return None
+    size = (int(image.Width), int(image.Height))
+    if len(data) != size[0] * size[1] * len(mode):
+        return None
+    return data, mode
+
+def _stream_sizes(pdf, file_size):
+    """Stored bytes per category: images, fonts, content (page and form streams) and everything else"""
+    import pikepdf
+
+    font_files = set()
+    for obj in pdf.objects:
+        if isinstance(obj, pikepdf.Dictionary) and obj.get("/Type") == pikepdf.Name.FontDescriptor:
+            for key in ("/FontFile", "/FontFile2", "/FontFile3"):
+                if key in obj:
+                    font_files.add(obj[key].objgen)
+    sizes = {"images": 0, "fonts": 0, "content": 0}
+    for obj in pdf.objects:
+        # Object and xref streams are structure, counted under "other"
+        if isinstance(obj, pikepdf.Stream) and obj.get("/Type") not in (pikepdf.Name.ObjStm, pikepdf.Name.XRef):
+            length = int(obj.stream_dict.get("/Length", 0))
+            if obj.get("/Subtype") == pikepdf.Name.Image:
+                sizes["images"] += length
+            elif obj.objgen in font_files:
+                sizes["fonts"] += length
+            else:
+                sizes["content"] += length
+    sizes["other"] = max(file_size - sum(sizes.values()), 0)
+    sizes["total"] = file_size
+    return sizes
+
+def _dedupe_streams(pdf):
+    """Point every reference to a duplicate image or embedded font stream at one
+    copy; the duplicates become unreferenced and are not written out"""
+    import pikepdf
+
+    canonical, replace = {}, {}
+    for obj in pdf.objects:
+        if not isinstance(obj, pikepdf.Stream):
+            continue
+        font_file = "/Length1" in obj or obj.get("/Subtype") in (pikepdf.Name.Type1C, pikepdf.Name.CIDFontType0C, pikepdf.Name.OpenType)
+        if obj.get("/Subtype") != pikepdf.Name.Image and not font_file:
+            continue
+        header = pikepdf.Dictionary(obj.stream_dict)
+        del header["/Length"]
+        key = hashlib.sha256(header.unparse() + obj.read_raw_bytes()).digest()
+        if key in canonical:
+            replace[obj.objgen] = canonical[key]
+        else:
+            canonical[key] = obj
+    if not replace:
+        return 0
+
+    def relink(container):
+        items = container.items() if isinstance(container, (pikepdf.Dictionary, pikepdf.Stream)) else enumerate(container)
+        for key, value in list(items):
+            if not isinstance(value, (pikepdf.Dictionary, pikepdf.Array, pikepdf.Stream)):
+                continue
+            if value.is_indirect:
+                if value.objgen in replace:
+                    container[key] = replace[value.objgen]
+            else:
+                relink(value)
+
+    for obj in pdf.objects:
+        if isinstance(obj, (pikepdf.Dictionary, pikepdf.Array, pikepdf.Stream)):
+            relink(obj)
+    return len(replace)
+
+def _compress_pdf(src, out, quality):
+    """Downsample and re-encode images, dedupe image and font streams, drop
+    unused objects and write with object streams. Returns the size report."""
+    import multiprocessing
+    import pikepdf
+
+    tier = COMPRESS_TIERS[quality]
+    with pikepdf.open(src) as pdf:
+        report = {"before": _stream_sizes(pdf, os.path.getsize(src))}
+        report["duplicates_removed"] = _dedupe_streams(pdf)
+
+        # Largest side each image may keep: its page's longer side at the tier's DPI.
+        # Images are assumed to be drawn no larger than the page they are on.
+        max_sides = {}
+        images = {}
+        for page in pdf.pages:
+            box = page.mediabox
+            page_side = max(abs(float(box[2]) - float(box[0])), abs(float(box[3]) - float(box[1]))) / 72 * tier["dpi"]
+            for image in page.images.values():
+                images[image.objgen] = image
+                max_sides[image.objgen] = max(max_sides.get(image.objgen, 0), int(page_side))
+
+        def apply(image, result):
+            if result is None:
+                return
+            data, width, height = result
+            image.write(data, filter=pikepdf.Name.DCTDecode)
+            image.Width, image.Height = width, height
+            if "/DecodeParms" in image:
+                del image["/DecodeParms"]
+
+        # Decoding to raw pixels stays here (qpdf); scaling and JPEG encoding run in
+        # the process pool. Inside a pool worker already, run inline instead.
+        pool = get_pool("process") if multiprocessing.parent_process() is None else None
+        pending = []
+        for objgen, image in images.items():
+            source = _image_source(pdf, image)
+            if source is None:
+                continue
+            data, mode = source
+            stored_size = len(image.get_raw_stream_buffer())
+            args = (data, mode, (int(image.Width), int(image.Height)), stored_size, max_sides[objgen], tier["jpeg_quality"])
+            if pool is None:
+                apply(image, _recompress_image(*args))
+                continue
+            pending.append((image, pool.submit(_recompress_image, *args)))
+            if len(pending) >= COMPRESS_WINDOW:
+                image, future = pending.pop(0)
+                apply(image, future.result())
+        for image, future in pending:
+            apply(image, future.result())
+
+        pdf.remove_unreferenced_resources()
+        pdf.save(out, compress_streams=True, object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                 recompress_flate=tier["recompress_flate"])
+
+    with pikepdf.open(out) as pdf:
+        report["after"] = _stream_sizes(pdf, os.path.getsize(out))
+    return report
+
+# ==========================================
+# TEXT EXTRACTION ENGINE
+# ==========================================
+
+TEXT_BATCH_PAGES = int(os.environ.get("NEXUS_TEXT_BATCH_PAGES", 25))
+# Batches extracting at once per request; pages still go out in order
+TEXT_WINDOW = int(os.environ.get("NEXUS_TEXT_WINDOW", PROCESS_WORKERS + 1))
+
+# format -> (media type, file suffix)
+TEXT_FORMATS = {"text": ("text/plain", ".txt"), "ndjson": ("application/x-ndjson", ".ndjson")}
+
+def _pymupdf_text(src, pages):
+    import pymupdf
+    with pymupdf.open(src) as doc:
+        return [doc[i].get_text() for i in pages]
+
+def _pypdf_text(src, pages):
+    with open(src, "rb") as f:
+        reader = PdfReader(f)
+        return [reader.pages[i].extract_text() for i in pages]
+
+def _pdfplumber_text(src, pages):
+    import pdfplumber
+    with pdfplumber.open(src) as pdf:
+        # layout=True keeps columns and indentation roughly where they sit on the page
+        return [pdf.pages[i].extract_text(layout=True) or "" for i in pages]
+
+# PyMuPDF is the default: an order of magnitude faster than pypdf, and pdfplumber is for layout
+TEXT_BACKENDS = {"pymupdf": _pymupdf_text, "pypdf": _pypdf_text, "pdfplumber": _pdfplumber_text}
+
+def _pdf_page_count(src):
+    import pymupdf
+    with pymupdf.open(src) as doc:
+        return doc.page_count
+
+def _extract_text(src, backend, pages):
+    """Text of the given 0-based pages, one string per page"""
+    return TEXT_BACKENDS[backend](src, pages)
+
+def _parse_page_ranges(spec):
+    """Parse "1-10,15,20-" into [(first, last or None)], 1-based. Empty means every page."""
+    ranges = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        first, dash, last = part.partition("-")
+        try:
+            first = int(first) if first else 1
+            last = (int(last) if last else None) if dash else first
+        except ValueError:
+            raise HTTPException(400, f"Invalid page range: {part}")
+        if first < 1 or (last is not None and last < first):
+            raise HTTPException(400, f"Invalid page range: {part}")
+        ranges.append((first, last))
+    return ranges or [(1, None)]
+
+def _select_pages(ranges, total):
+    """0-based page indices for parsed ranges, in the order given"""
+    pages = []
+    for first, last in ranges:
+        pages.extend(range(first - 1, min(last or total, total)))
+    if not pages:
+        raise HTTPException(400, f"No pages in range; the document has {total}")
+    return pages
+
+async def _text_pages(src, backend, pages):
+    """Yield (page, text) in order while up to TEXT_WINDOW batches extract in parallel"""
+    batches = iter([pages[i:i + TEXT_BATCH_PAGES] for i in range(0, len(pages), TEXT_BATCH_PAGES)])
+    pending = deque()
+
+    def schedule(batch):
+        task = asyncio.ensure_future(run_tool("extract-text", _extract_text, src, backend, batch))
+        # Batches abandoned by a disconnected client must not log "exception never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        pending.append((batch, task))
+
+    for batch in itertools.islice(batches, TEXT_WINDOW):
+        schedule(batch)
+    try:
+        while pending:
+            batch, task = pending.popleft()
+            texts = await task
+            following = next(batches, None)
+            if following:
+                schedule(following)
+            for page, text in zip(batch, texts):
+                yield page, text
+    finally:
+        for _, task in pending:
+            task.cancel()
+
+async def _text_chunks(src, backend, pages, format):
+    first = True
+    async for page, text in _text_pages(src, backend, pages):
+        if format == "ndjson":
+            yield json.dumps({"page": page + 1, "text": text}, ensure_ascii=False) + "\n"
+        else:
+            yield text if first else "\n" + text
+        first = False
+
+async def _primed(chunks):
+    """Produce the first chunk before returning, so a failure on the first batch is still an error response"""
+    first = await chunks.__anext__()
+
+    async def rest():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+    return rest()
+
+def _extract_text_file(src, out, backend="pymupdf"):
+    # Same text as the streamed endpoint, written to a file for batches
+    total = _pdf_page_count(src)
+    with open(out, "w", encoding="utf-8") as dst:
+        for start in range(0, total, TEXT_BATCH_PAGES):
+            texts = _extract_text(src, backend, range(start, min(start + TEXT_BATCH_PAGES, total)))
+            dst.write(("\n" if start else "") + "\n".join(texts))
+
+# The endpoint counts the pages it selects; these see the whole document
+PAGES_NOT_COUNTED.update([_pdf_page_count, _extract_text])
+
+# ==========================================
+# COMPARISON ENGINE
+# ==========================================
+
+# Pages per worker call when pulling words or diffing changed pages
+COMPARE_BATCH_PAGES = 25
+
+# format -> (media type, file suffix)
+COMPARE_FORMATS = {"pdf": ("application/pdf", ".pdf"), "json": ("application/json", ".json"), "zip": ("application/zip", ".zip")}
+
+def _page_fingerprints(src):
+    """Per page, a hash of its content streams, box, rotation and the raw bytes of its images"""
+    import pymupdf
+    image_hashes = {}
+    fingerprints = []
+    with pymupdf.open(src) as doc:
+        for page in doc:
+            digest = hashlib.sha256(page.read_contents())
+            digest.update(f"{tuple(page.mediabox)}/{page.rotation}".encode())
+            for image in page.get_images(full=True):
+                xref = image[0]
+                if xref not in image_hashes:
+                    image_hashes[xref] = hashlib.sha256(doc.xref_stream_raw(xref) or b"").hexdigest()
+                digest.update(image_hashes[xref].encode())
+            fingerprints.append(digest.hexdigest())
+    return fingerprints
+
+def _page_words(src, pages):
+    """Per page, its words in reading order as (text, rect, line number)"""
+    import pymupdf
+    result = []
+    with pymupdf.open(src) as doc:
+        for i in pages:
+            lines = {}
+            result.append([(text, (x0, y0, x1, y1), lines.setdefault((block, line), len(lines) + 1))
+                           for x0, y0, x1, y1, text, block, line, _ in doc[i].get_text("words")])
+    return result
+
+def _text_key(words):
+    return "t:" + hashlib.sha256(" ".join(w[0] for w in words).encode("utf-8")).hexdigest()
+
+def _group_lines(words):
+    """[(line text, first word index, end word index)]"""
+    lines = []
+    for index, (text, _, line) in enumerate(words):
+        if lines and lines[-1][3] == line:
+            lines[-1][0].append(text)
+            lines[-1][2] = index + 1
+        else:
+            lines.append([[text], index, index + 1, line])
+    return [(" ".join(texts), start, end) for texts, start, end, _ in lines]
+
+def _diff_page(old, new):
+    """Line diff, then a word diff inside each changed run of lines. Returns the
+    changes and the word index spans to highlight on each side."""
+    old_lines, new_lines = _group_lines(old), _group_lines(new)
+    changes, old_spans, new_spans = [], [], []
+    matcher = difflib.SequenceMatcher(None, [l[0] for l in old_lines], [l[0] for l in new_lines], autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        if i1 == i2 or j1 == j2:
+            # Whole lines added or removed: one change per line, no word diff
+            for line in range(i1, i2):
+                text, start, end = old_lines[line]
+                changes.append({"op": "delete", "line1": old[start][2], "old": text})
+                old_spans.append((start, end))
+            for line in range(j1, j2):
+                text, start, end = new_lines[line]
+                changes.append({"op": "insert", "line2": new[start][2], "new": text})
+                new_spans.append((start, end))
+            continue
+        a = old_lines[i1][1] if i2 > i1 else 0
+        b = new_lines[j1][1] if j2 > j1 else 0
+        old_words = old[a:old_lines[i2 - 1][2]] if i2 > i1 else []
+        new_words = new[b:new_lines[j2 - 1][2]] if j2 > j1 else []
+        words = difflib.SequenceMatcher(None, [w[0] for w in old_words], [w[0] for w in new_words], autojunk=False)
+        for word_op, w1, w2, v1, v2 in words.get_opcodes():
+            if word_op == "equal":
+                continue
+            change = {"op": word_op}
+            if w2 > w1:
+                change.update(line1=old_words[w1][2], old=" ".join(w[0] for w in old_words[w1:w2]))
+                old_spans.append((a + w1, a + w2))
+            if v2 > v1:
+                change.update(line2=new_words[v1][2], new=" ".join(w[0] for w in new_words[v1:v2]))
+                new_spans.append((b + v1, b + v2))
+            changes.append(change)
+    return changes, old_spans, new_spans
+
+def _diff_pages(pairs):
+    return [_diff_page(old, new) for old, new in pairs]
+
+async def _fetch_words(src, pages, into):
+    batches = [pages[i:i + COMPARE_BATCH_PAGES] for i in range(0, len(pages), COMPARE_BATCH_PAGES)]
+    results = await asyncio.gather(*(run_tool("compare-pdf", _page_words, src, batch) for batch in batches))
+    for batch, words in zip(batches, results):
+        into.update(zip(batch, words))
+
+async def _compare(src1, src2, name1, name2):
+    """Align the pages of two PDFs and diff the changed ones. Returns the JSON
+    diff and, per page entry, the word rectangles to highlight in the report."""
+    hashes1, hashes2 = await asyncio.gather(run_tool("compare-pdf", _page_fingerprints, src1),
+                                            run_tool("compare-pdf", _page_fingerprints, src2))
+    # Pages whose exact content also appears in the other file need no text at all
+    words1, words2 = {}, {}
+    seen1, seen2 = set(hashes1), set(hashes2)
+    await asyncio.gather(_fetch_words(src1, [i for i, h in enumerate(hashes1) if h not in seen2], words1),
+                         _fetch_words(src2, [i for i, h in enumerate(hashes2) if h not in seen1], words2))
+    # Pages without text (scans, drawings) can only be told apart by content
+    keys1 = [_text_key(words1[i]) if words1.get(i) else "c:" + h for i, h in enumerate(hashes1)]
+    keys2 = [_text_key(words2[i]) if words2.get(i) else "c:" + h for i, h in enumerate(hashes2)]
+
+    # Sequence alignment over page keys, so an inserted page shifts the rest instead of changing it.
+    # Pages aligned on text alone still differ in layout or images, so they count as changed.
+    entries = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, keys1, keys2, autojunk=False).get_opcodes():
+        if op == "equal":
+            entries += [{"status": "identical" if hashes1[i] == hashes2[j] else "changed", "page1": i + 1, "page2": j + 1}
+                        for i, j in zip(range(i1, i2), range(j1, j2))]
+            continue
+        paired = min(i2 - i1, j2 - j1) if op == "replace" else 0
+        entries += [{"status": "changed", "page1": i1 + k + 1, "page2": j1 + k + 1} for k in range(paired)]
+        entries += [{"status": "deleted", "page1": i + 1} for i in range(i1 + paired, i2)]
+        entries += [{"status": "inserted", "page2": j + 1} for j in range(j1 + paired, j2)]
+
+    changed = [e for e in entries if e["status"] == "changed"]
+    # A changed page can still be a content match for some other, unaligned page
+    await asyncio.gather(_fetch_words(src1, [e["page1"] - 1 for e in changed if e["page1"] - 1 not in words1], words1),
+                         _fetch_words(src2, [e["page2"] - 1 for e in changed if e["page2"] - 1 not in words2], words2))
+    pairs = [(words1[e["page1"] - 1], words2[e["page2"] - 1]) for e in changed]
+    batches = [pairs[i:i + COMPARE_BATCH_PAGES] for i in range(0, len(pairs), COMPARE_BATCH_PAGES)]
+    diffs = [d for batch in await asyncio.gather(*(run_tool("compare-pdf", _diff_pages, b) for b in batches)) for d in batch]
+
+    highlights = {}
+    for entry, (changes, old_spans, new_spans) in zip(changed, diffs):
+        entry["changes"] = changes
+        old, new = words1[entry["page1"] - 1], words2[entry["page2"] - 1]
+        highlights[entry["page1"], entry["page2"]] = ([old[k][1] for a, b in old_spans for k in range(a, b)],
+                                                      [new[k][1] for a, b in new_spans for k in range(a, b)])
+    summary = {status: sum(e["status"] == status for e in entries) for status in ("identical", "changed", "deleted", "inserted")}
+    diff = {"file1": {"name": name1, "pages": len(hashes1)}, "file2": {"name": name2, "pages": len(hashes2)},
+            "summary": summary, "pages": entries}
+    return diff, highlights
+
+def _summary_lines(diff):
+    lines = [f"File 1: {diff['file1']['name']} - {diff['file1']['pages']} pages",
+             f"File 2: {diff['file2']['name']} - {diff['file2']['pages']} pages",
+             ", ".join(f"{count} {status}" for status, count in diff["summary"].items()), ""]
+    run = None
+    for entry in diff["pages"] + [None]:
+        # Runs of identical pages collapse to one line
+        if entry and entry["status"] == "identical" and run and entry["page1"] == run[1] + 1 and entry["page2"] == run[3] + 1:
+            run[1], run[3] = entry["page1"], entry["page2"]
+            continue
+        if run:
+            lines.append(f"Pages {run[0]}-{run[1]} = {run[2]}-{run[3]}: identical" if run[1] > run[0] else f"Page {run[0]} = {run[2]}: identical")
+            run = None
+        if entry is None:
+            break
+        if entry["status"] == "identical":
+            run = [entry["page1"], entry["page1"], entry["page2"], entry["page2"]]
+        elif entry["status"] == "changed":
+            edits = f"{len(entry['changes'])} edits" if entry["changes"] else "layout or images only"
+            lines.append(f"Page {entry['page1']} -> {entry['page2']}: changed ({edits})")
+        elif entry["status"] == "deleted":
+            lines.append(f"Page {entry['page1']}: deleted")
+        else:
+            lines.append(f"Page {entry['page2']}: inserted")
+    return lines
+
+COMPARE_COLORS = {"old": (1, 0.55, 0.55), "new": (0.55, 0.9, 0.55)}
+
+def _report_page(report, doc, index, label, side, rects=None):
+    import pymupdf
+    report.insert_pdf(doc, from_page=index, to_page=index)
+    page = report[-1]
+    color = COMPARE_COLORS[side]
+    if rects is None:
+        # Whole page deleted or inserted: frame it rather than highlight everything
+        page.draw_rect(page.rect * page.derotation_matrix, color=color, width=8)
+    elif rects:
+        annot = page.add_highlight_annot([pymupdf.Rect(r) for r in rects])
+        annot.set_colors(stroke=color)
+        annot.update()
+    page.insert_text(pymupdf.Point(12, 14) * page.derotation_matrix, label, fontsize=9, rotate=page.rotation,
+                     color=tuple(c * 0.6 for c in color))
+
+def _compare_report(src1, src2, out, diff, highlights):
+    """Summary pages, then each changed page from both files with changed words highlighted"""
+    import pymupdf
+    with pymupdf.open(src1) as doc1, pymupdf.open(src2) as doc2, pymupdf.open() as report:
+        lines = _summary_lines(diff)
+        for start in range(0, len(lines), 50):
+            page = report.new_page(width=612, height=792)
+            y = 50
+            if start == 0:
+                page.insert_text((50, y), "PDF Comparison Report", fontname="helv", fontsize=16)
+                y += 30
+            for line in lines[start:start + 50]:
+                page.insert_text((50, y), line, fontname="helv", fontsize=10)
+                y += 14
+        for entry in diff["pages"]:
+            if entry["status"] == "changed":
+                old_rects, new_rects = highlights[entry["page1"], entry["page2"]]
+                _report_page(report, doc1, entry["page1"] - 1, f"{diff['file1']['name']} page {entry['page1']} (before)", "old", old_rects)
+                _report_page(report, doc2, entry["page2"] - 1, f"{diff['file2']['name']} page {entry['page2']} (after)", "new", new_rects)
+            elif entry["status"] == "deleted":
+                _report_page(report, doc1, entry["page1"] - 1, f"{diff['file1']['name']} page {entry['page1']} (deleted)", "old")
+            elif entry["status"] == "inserted":
+                _report_page(report, doc2, entry["page2"] - 1, f"{diff['file2']['name']} page {entry['page2']} (inserted)", "new")
+        report.save(out, garbage=3, deflate=True)
+
+def _write_json(out, data):
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+def _write_compare_zip(out, report, diff):
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.write(report, "comparison.pdf")
+        zf.writestr("comparison.json", json.dumps(diff, indent=1))
+
+# Only the fingerprint pass counts as pages processed
+PAGES_NOT_COUNTED.update([_page_words, _compare_report])
+
+# ==========================================
+# REDACTION ENGINE
+# ==========================================
+
+# Pages per worker call; each batch is searched and redacted in one pass
+REDACT_BATCH_PAGES = int(os.environ.get("NEXUS_REDACT_BATCH_PAGES", 25))
+
+# format -> (media type, file suffix)
+REDACT_FORMATS = {"pdf": ("application/pdf", ".pdf"), "json": ("application/json", ".json"), "zip": ("application/zip", ".zip")}
+
+def _parse_redact_list(value, field):
+    """A JSON list of strings, or a single string"""
+    if not value.strip():
+        return []
+    if not value.lstrip().startswith("["):
+        return [value]
+    try:
+        items = json.loads(value)
+    except ValueError:
+        raise HTTPException(400, f"{field} must be a string or a JSON list of non-empty strings")
+    if not all(isinstance(i, str) and i for i in items):
+        raise HTTPException(400, f"{field} must be a string or a JSON list of non-empty strings")
+    return items
+
+def _redact_matcher(terms, patterns, case_sensitive):
+    """One regex for every term and pattern, so each page is scanned once. The
+    alternatives are named r0, r1, ... in the order terms then patterns."""
+    sources = []
+    for term in terms:
+        # Whitespace in a term matches any run of whitespace, including a line break
+        sources.append(r"\s+".join(re.escape(word) for word in term.split()))
+    for pattern in patterns:
+        try:
+            compiled = re.compile(pattern)
+        except re.error as e:
+            raise HTTPException(400, f"Invalid pattern {pattern!r}: {e}")
+        # An empty match covers no characters yet still sends every page down the slow path
+        if compiled.fullmatch(""):
+            raise HTTPException(400, f"Pattern {pattern!r} matches empty text")
+        sources.append(pattern)
+    combined = "|".join(f"(?P<r{i}>{source})" for i, source in enumerate(sources))
+    try:
+        return re.compile(combined, 0 if case_sensitive else re.IGNORECASE)
+    except re.error as e:
+        raise HTTPException(400, f"Invalid pattern: {e}")
+
+def _page_chars(textpage):
+    """Page text with one box per character; line ends are a newline with no box.
+    The text is the same as textpage.extractText()."""
+    text, boxes = [], []
+    for block in textpage.extractRAWDICT()["blocks"]:
+        for line in block.get("lines", ()):
+            for span in line["spans"]:
+                for char in span["chars"]:
+                    text.append(char["c"])
+                    boxes.append(char["bbox"])
+            text.append("\n")
+            boxes.append(None)
+    return "".join(text), boxes
+
+def _match_rects(boxes, start, end):
+    """One rectangle per line the match covers"""
+    import pymupdf
+    rects, rect = [], None
+    for box in boxes[start:end]:
+        if box is None:
+            if rect:
+                rects.append(rect)
+            rect = None
+        elif not rect:
+            rect = pymupdf.Rect(box)
+        else:
+            rect |= box
+    return rects + [rect] if rect else rects
+
+def _redact_batch(src, pages, matcher, part):
+    """Search and redact the given 0-based pages. Pages with hits are written,
+    in order, to part. Returns {page: {alternative: hits}}."""
+    import pymupdf
+    hits = {}
+    with pymupdf.open(src) as doc:
+        for index in pages:
+            page = doc[index]
+            textpage = page.get_textpage(flags=pymupdf.TEXTFLAGS_SEARCH)
+            # Plain text is several times cheaper than character boxes, and most pages have no hits
+            if not matcher.search(textpage.extractText()):
+                continue
+            text, boxes = _page_chars(textpage)
+            counts = defaultdict(int)
+            for match in matcher.finditer(text):
+                rects = _match_rects(boxes, *match.span())
+                if not rects:
+                    continue
+                counts[match.lastgroup] += 1
+                for rect in rects:
+                    page.add_redact_annot(rect, fill=(0, 0, 0))
+            if counts:
+                page.apply_redactions()
+                hits[index] = dict(counts)
+        if hits:
+            doc.select(sorted(hits))
+            doc.save(part, garbage=3, deflate=True)
+    return hits
+
+def _redact_merge(src, out, parts):
+    """Swap the redacted pages from each (part, pages) into the original. Saving
+    with garbage collection drops the replaced pages' content from the file."""
+    import pymupdf
+    replaced = {index for _, pages in parts for index in pages}
+    with pymupdf.open(src) as doc:
+        if replaced:
+            # Deleting pages drops bookmarks and links that point at them; keep both to restore
+            toc = doc.get_toc(simple=False)
+            links = {}
+            for page in doc:
+                gotos = [link for link in page.get_links() if link["kind"] == pymupdf.LINK_GOTO]
+                if gotos and (page.number in replaced or any(link["page"] in replaced for link in gotos)):
+                    links[page.number] = gotos
+            # One delete for every page: deleting them one by one rescans the document each time
+            doc.delete_pages(sorted(replaced))
+            for part, pages in parts:
+                with pymupdf.open(part) as redacted:
+                    # Ascending order, so every earlier page is already in place
+                    for offset, index in enumerate(pages):
+                        doc.insert_pdf(redacted, from_page=offset, to_page=offset, start_at=index)
+            doc.set_toc(toc)
+            # Internal links copied with a part point into the part; put the originals back
+            for number, gotos in links.items():
+                page = doc[number]
+                for link in page.get_links():
+                    if link["kind"] == pymupdf.LINK_GOTO:
+                        page.delete_link(link)
+                for link in gotos:
+                    page.insert_link(link)
+        doc.save(out, garbage=3, deflate=True)
+
+async def _redact(tmp, src, out, matcher, labels):
+    """Redact src into out with batches on the process pool; returns the report"""
+    total = await run_tool("redact-pdf", _pdf_page_count, src)
+    batches = [list(range(i, min(i + REDACT_BATCH_PAGES, total))) for i in range(0, total, REDACT_BATCH_PAGES)]
+    partials = [tmp.new_path(".pdf") for _ in batches]
+    results = await asyncio.gather(*(run_tool("redact-pdf", _redact_batch, src, batch, matcher, part)
+                                     for batch, part in zip(batches, partials)))
+    parts = [(part, sorted(hits)) for part, hits in zip(partials, results) if hits]
+    await run_tool("redact-pdf", _redact_merge, src, out, parts)
+
+    pages, by_term = [], defaultdict(int)
+    for hits in results:
+        for index, counts in sorted(hits.items()):
+            named = {labels[int(name[1:])]: n for name, n in counts.items()}
+            for label, n in named.items():
+                by_term[label] += n
+            pages.append({"page": index + 1, "hits": sum(named.values()), "terms": named})
+    return {"page_count": total, "pages_redacted": len(pages), "hits": sum(p["hits"] for p in pages),
+            "terms": {label: by_term.get(label, 0) for label in labels}, "pages": pages}
+
+def _write_redact_zip(out, pdf, report):
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.write(pdf, "redacted.pdf")
+        zf.writestr("redactions.json", json.dumps(report, indent=1))
+
+# Batches open the whole document; the merge counts each page once
+PAGES_NOT_COUNTED.add(_redact_batch)
+
+# ==========================================
+# MEDIA ENGINE
+# ==========================================
+
+# format -> (ffmpeg muxer, file suffix, media type, encoder arguments). Every muxer
+# here can write to a pipe, so output streams back while ffmpeg is still running.
+AUDIO_FORMATS = {
+    "mp3": ("mp3", ".mp3", "audio/mpeg", ["-c:a", "libmp3lame", "-q:a", "2"]),
+    "aac": ("adts", ".aac", "audio/aac", ["-c:a", "aac", "-b:a", "192k"]),
+    "ogg": ("ogg", ".ogg", "audio/ogg", ["-c:a", "libvorbis", "-q:a", "5"]),
+    "opus": ("opus", ".opus", "audio/ogg", ["-c:a", "libopus", "-b:a", "128k"]),
+    "flac": ("flac", ".flac", "audio/flac", ["-c:a", "flac"]),
+    "wav": ("wav", ".wav", "audio/wav", ["-c:a", "pcm_s16le"]),
+}
+
+# Source audio codec -> the format that can hold it without re-encoding
+AUDIO_COPY = {"mp3": "mp3", "aac": "aac", "vorbis": "ogg", "opus": "opus", "flac": "flac", "pcm_s16le": "wav"}
+
+GIF_MAX_FPS = 50
+
+@functools.lru_cache(maxsize=None)
+def _ffmpeg_exe():
+    """NEXUS_FFMPEG, else ffmpeg on PATH, else the binary bundled with imageio-ffmpeg"""
+    path = os.environ.get("NEXUS_FFMPEG") or shutil.which("ffmpeg")
+    if path:
+        return path
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+def _ffmpeg_command(args, out):
+    return [_ffmpeg_exe(), "-hide_banner", "-loglevel", "error", "-nostdin", "-y", *args, out]
+
+def _ffmpeg_error(stderr):
+    lines = stderr.decode("utf-8", "replace").strip().splitlines()
+    return "ffmpeg: " + (lines[-1] if lines else "failed")
+
+def _ffmpeg(args, out):
+    result = subprocess.run(_ffmpeg_command(args, out), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        raise RuntimeError(_ffmpeg_error(result.stderr))
+
+def _ffmpeg_stream(args):
+    """Run ffmpeg with its output on stdout, yielding it as it is produced. The
+    process is killed if the consumer stops early (client disconnect)."""
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(_ffmpeg_command(args, "pipe:1"), stdout=subprocess.PIPE, stderr=errors)
+        try:
+            while chunk := process.stdout.read1(UPLOAD_CHUNK):
+                yield chunk
+            if process.wait() != 0:
+                errors.seek(0)
+                raise RuntimeError(_ffmpeg_error(errors.read()))
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+def _probe_media(src):
+    """Duration and the first audio and video codec, from ffmpeg's summary of the input"""
+    result = subprocess.run([_ffmpeg_exe(), "-hide_banner", "-nostdin", "-i", src], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    summary = result.stderr.decode("utf-8", "replace")
+    info = {"duration": None, "audio": None, "video": None}
+    duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", summary)
+    if duration:
+        hours, minutes, seconds = duration.groups()
+        info["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    for kind, codec in re.findall(r"Stream #\S+: (Audio|Video): (\w+)", summary):
+        info[kind.lower()] = info[kind.lower()] or codec
+    if not (info["audio"] or info["video"]):
+        raise ValueError("Not a media file ffmpeg can read")
+    return info
+
+def _audio_target(codec, format):
+    """(output format, whether the source stream goes in as is). auto picks the
+    format the source codec already fits."""
+    if format == "auto":
+        format = AUDIO_COPY.get(codec, "mp3")
+    return format, AUDIO_COPY.get(codec) == format
+
+def _audio_args(src, format, copy):
+    muxer, _, _, encode = AUDIO_FORMATS[format]
+    return ["-i", src, "-map", "0:a:0", "-vn", *(["-c:a", "copy"] if copy else encode), "-f", muxer]
+
+def _gif_args(src, start_time, end_time, fps, width):
+    scale = f",scale={width}:-1:flags=lanczos" if width else ""
+    # -ss before -i seeks the input instead of decoding up to the start. split feeds
+    # the same frames to palettegen and, once it has seen them all, to paletteuse:
+    # a two-pass palette GIF from one decode.
+    graph = (f"fps={fps}{scale},split[a][b];[a]palettegen=stats_mode=diff[p];"
+             "[b][p]paletteuse=dither=bayer:bayer_scale=5:diff_mode=rectangle")
+    return ["-ss", str(start_time), "-t", str(end_time - start_time), "-i", src, "-filter_complex", graph, "-f", "gif"]
+
+def _video_to_gif(src, out, start_time, end_time, fps=10, width=0):
+    _ffmpeg(_gif_args(src, start_time, end_time, fps, width), out)
+
+# ==========================================
+# METADATA STRIPPING ENGINE
+# ==========================================
+
+# JPEG markers copied through; every other APPn segment and COM (0xFE) is dropped.
+# APP0 is the JFIF header and APP14 the Adobe segment, which decoders need for CMYK.
+JPEG_KEEP_APP = {0xE0: b"JFIF\0", 0xEE: b"Adobe"}
+JPEG_ICC = b"ICC_PROFILE\0"
+
+# Ancillary PNG chunks that change how the image renders or animates; the others
+# (tEXt, zTXt, iTXt with XMP, eXIf, tIME, iCCP, private chunks) are dropped.
+PNG_KEEP = {b"tRNS", b"gAMA", b"cHRM", b"sRGB", b"sBIT", b"bKGD", b"pHYs", b"acTL", b"fcTL", b"fdAT"}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# WebP chunk -> its VP8X feature flag
+WEBP_METADATA = {b"ICCP": 0x20, b"EXIF": 0x08, b"XMP ": 0x04}
+
+# Image.info keys that re-saving would write back out
+METADATA_INFO = {"exif", "icc_profile", "xmp", "XML:com.adobe.xmp", "comment", "photoshop", "extension"}
+
+def _copy_bytes(src, dst, size):
+    while size > 0:
+        chunk = src.read(min(size, UPLOAD_CHUNK))
+        if not chunk:
+            raise ValueError("Truncated image")
+        dst.write(chunk)
+        size -= len(chunk)
+
+def _copy_until(src, dst, marker):
+    """Copy up to and including the first occurrence of marker; the rest is dropped"""
+    tail = b""
+    while chunk := src.read(UPLOAD_CHUNK):
+        chunk = tail + chunk
+        end = chunk.find(marker)
+        if end >= 0:
+            dst.write(chunk[:end + len(marker)])
+            return
+        dst.write(chunk[:1 - len(marker)])
+        tail = chunk[1 - len(marker):]
+    dst.write(tail)
+
+def _strip_jpeg(src, dst, keep_icc):
+    dst.write(src.read(2))
+    while True:
+        marker = src.read(2)
+        while marker[1:] == b"\xff":
+            # Fill bytes before a marker
+            marker = marker[1:] + src.read(1)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            raise ValueError("Corrupt JPEG")
+        code = marker[1]
+        if code == 0xDA:
+            # Start of scan: the compressed data runs to EOI, and whatever follows it
+            # (MPF previews, motion photo video) is dropped with the segments pointing at it
+            dst.write(marker)
+            _copy_until(src, dst, b"\xff\xd9")
+            return
+        if code == 0xD9 or 0xD0 <= code <= 0xD7 or code == 0x01:
+            dst.write(marker)
+            if code == 0xD9:
+                return
+            continue
+        length = src.read(2)
+        payload = src.read(int.from_bytes(length, "big") - 2)
+        if 0xE0 <= code <= 0xEF or code == 0xFE:
+            keep = JPEG_KEEP_APP.get(code)
+            if not (keep and payload.startswith(keep) or keep_icc and code == 0xE2 and payload.startswith(JPEG_ICC)):
+                continue
+        dst.write(marker + length + payload)
+
+def _strip_png(src, dst, keep_icc):
+    dst.write(src.read(8))
+    while header := src.read(8):
+        length, kind = int.from_bytes(header[:4], "big"), header[4:]
+        # Critical chunks (IHDR, PLTE, IDAT, IEND) have an upper-case first letter
+        if not kind[0] & 0x20 or kind in PNG_KEEP or keep_icc and kind == b"iCCP":
+            dst.write(header)
+            _copy_bytes(src, dst, length + 4)
+        else:
+            src.seek(length + 4, os.SEEK_CUR)
+        if kind == b"IEND":
+            return
+
+def _strip_webp(src, dst, keep_icc):
+    end = 8 + int.from_bytes(src.read(12)[4:8], "little")
+    chunks, pos = [], 12
+    while pos + 8 <= end:
+        src.seek(pos)
+        kind, size = src.read(4), int.from_bytes(src.read(4), "little")
+        chunks.append((kind, pos, size))
+        pos += 8 + size + (size & 1)
+    dropped = {kind: flag for kind, flag in WEBP_METADATA.items() if not (keep_icc and kind == b"ICCP")}
+    kept = [chunk for chunk in chunks if chunk[0] not in dropped]
+    # The RIFF header holds the total size, so it is worked out from the chunk headers first
+    dst.write(b"RIFF" + (4 + sum(8 + size + (size & 1) for _, _, size in kept)).to_bytes(4, "little") + b"WEBP")
+    for kind, pos, size in kept:
+        src.seek(pos)
+        if kind == b"VP8X":
+            data = bytearray(src.read(8 + size))
+            data[8] &= ~sum(dropped.values()) & 0xFF
+            dst.write(data)
+        else:
+            _copy_bytes(src, dst, 8 + size)
+        if size & 1:
+            dst.write(b"\0")
+
+def _image_container(magic):
+    if magic.startswith(b"\xff\xd8\xff"):
+        return _strip_jpeg
+    if magic.startswith(PNG_SIGNATURE):
+        return _strip_png
+    if magic[:4] == b"RIFF" and magic[8:12] == b"WEBP":
+        return _strip_webp
+    return None
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+def _strip_decoded(src, out, keep_icc):
+    """Other formats: save the decoded frames again with none of the source's metadata"""
+    from PIL import ImageSequence
+    with Image.open(src) as img:
+        format, animated = img.format, getattr(img, "n_frames", 1) > 1
+        frames = []
+        for frame in ImageSequence.Iterator(img):
+            frame.load()
+            # A plain Image sharing the decoded buffer (copied when there are more
+            # frames to decode) has none of the plugin's tag tables
+            clean = frame._new(frame.im.copy() if animated else frame.im)
+            clean.info = {k: v for k, v in frame.info.items() if k not in METADATA_INFO or keep_icc and k == "icc_profile"}
+            frames.append(clean)
+        frames[0].save(out, format=format, save_all=len(frames) > 1, append_images=frames[1:])
+
+def _clean_metadata(src, out, keep_icc=False):
+    with open(src, "rb") as f:
+        strip = _image_container(f.read(12))
+        if strip:
+            f.seek(0)
+            with open(out, "wb") as dst:
+                strip(f, dst, keep_icc)
+            return
+    _strip_decoded(src, out, keep_icc)
+
+def _base_format(img):
+    # Pillow reports JPEGs with MPF preview frames appended as MPO
+    return "JPEG" if img.format == "MPO" else img.format
+
+def _image_format(src):
+    # Reads the header only; nothing is decoded
+    with Image.open(src) as img:
+        return _base_format(img)
+
+def _image_suffix(format):
+    return {"JPEG": ".jpg", "TIFF": ".tif"}.get(format, "." + format.lower())
+
+# ==========================================
+# RESIZE ENGINE
+# ==========================================
+
+# exact stretches to the box; fit and thumbnail keep the aspect ratio inside it
+# (thumbnail never enlarges); fill covers the box and crops the centre
+RESIZE_MODES = ("exact", "fit", "fill", "thumbnail")
+
+# Output formats that can be asked for; auto keeps the source's format
+RESIZE_FORMATS = {"jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+RESIZE_MAX_SIDE = int(os.environ.get("NEXUS_RESIZE_MAX_SIDE", 16384))
+
+# Shrinking by more than this factor first does a fast integer reduce() and leaves
+# LANCZOS only the last 3x, which looks the same as a full LANCZOS pass
+RESIZE_REDUCING_GAP = 3.0
+
+def _parse_sizes(spec):
+    """Parse "1600x1200,800,x300" into [(width, height)]; a missing side is 0"""
+    sizes = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        width, _, height = part.lower().partition("x")
+        try:
+            sizes.append((int(width or 0), int(height or 0)))
+        except ValueError:
+            raise HTTPException(400, f"Invalid size: {part}")
+    if not sizes:
+        raise HTTPException(400, "sizes is empty")
+    return sizes
+
+def _check_resize(width, height, mode):
+    if mode not in RESIZE_MODES:
+        raise HTTPException(400, f"Unknown mode. Available: {', '.join(RESIZE_MODES)}")
+    if width < 0 or height < 0 or not (width or height):
+        raise HTTPException(400, "Give a width, a height or both")
+    if mode == "fill" and not (width and height):
+        raise HTTPException(400, "fill needs both a width and a height")
+    if max(width, height) > RESIZE_MAX_SIDE:
+        raise HTTPException(400, f"Sizes are limited to {RESIZE_MAX_SIDE} pixels a side")
+
+def _resize_format(format, source):
+    """Pillow format to save as"""
+    if format != "auto":
+        return RESIZE_FORMATS[format]
+    Image.init()
+    return source if source in Image.SAVE else "PNG"
+
+def _resize_plan(size, width, height, mode):
+    """Output size, and for fill the centred source box that gets scaled to it"""
+    w, h = size
+    if mode == "fill":
+        scale = max(width / w, height / h)
+        cw, ch = width / scale, height / scale
+        return (width, height), ((w - cw) / 2, (h - ch) / 2, (w + cw) / 2, (h + ch) / 2)
+    if mode == "exact" and width and height:
+        return (width, height), None
+    # A side given as 0 follows the aspect ratio
+    scale = min(s for s in (width and width / w, height and height / h) if s)
+    if mode == "thumbnail":
+        scale = min(scale, 1)
+    return (max(1, round(w * scale)), max(1, round(h * scale))), None
+
+def _resize_renditions(src, sizes, mode):
+    """Every (width, height) from a single decode. Returns the source format, its
+    ICC profile and the resized images."""
+    from PIL import ImageOps
+    with Image.open(src) as img:
+        source, icc = _base_format(img), img.info.get("icc_profile")
+        turned = img.getexif().get(0x0112, 1) in (5, 6, 7, 8)
+        upright = (img.height, img.width) if turned else img.size
+        plans = [_resize_plan(upright, width, height, mode) for width, height in sizes]
+
+        # JPEG can decode at 1/2, 1/4 or 1/8 scale in the DCT domain. Ask for the
+        # smallest decode that still leaves every rendition its full resolution.
+        need_w = math.ceil(max(size[0] * upright[0] / (box[2] - box[0] if box else upright[0]) for size, box in plans))
+        need_h = math.ceil(max(size[1] * upright[1] / (box[3] - box[1] if box else upright[1]) for size, box in plans))
+        img.draft(img.mode, (need_h, need_w) if turned else (need_w, need_h))
+        with stage("decode"):
+            ImageOps.exif_transpose(img, in_place=True)
+            img.load()
+        if img.mode in ("1", "P"):
+            # Palette images only resample with NEAREST
+            img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+
+        fx, fy = img.width / upright[0], img.height / upright[1]
+        images = [None] * len(plans)
+        with stage("resize"):
+            # Largest first, so a whole-frame rendition can resample the smallest
+            # earlier one that is still at least twice its size.
+            done = []
+            for i in sorted(range(len(plans)), key=lambda i: -plans[i][0][0] * plans[i][0][1]):
+                size, box = plans[i]
+                if box:
+                    box = (box[0] * fx, box[1] * fy, box[2] * fx, box[3] * fy)
+                if size == img.size and box is None:
+                    images[i] = img
+                    continue
+                base = img
+                if box is None:
+                    base = next((prior for prior in reversed(done) if prior.width >= 2 * size[0] and prior.height >= 2 * size[1]), img)
+                images[i] = base.resize(size, Image.Resampling.LANCZOS, box=box, reducing_gap=RESIZE_REDUCING_GAP)
+                if box is None:
+                    done.append(images[i])
+    return source, icc, images
+
+def _save_resized(img, out, format, quality, icc):
+    if format == "JPEG" and img.mode not in ("RGB", "L", "CMYK"):
+        # No alpha in JPEG: flatten onto white rather than dropping it to black
+        rgba = img.convert("RGBA")
+        img = Image.new("RGB", img.size, "white")
+        img.paste(rgba, mask=rgba.getchannel("A"))
+    elif format != "JPEG" and img.mode == "CMYK":
+        img = img.convert("RGB")
+    options = {"quality": quality} if format in ("JPEG", "WEBP") else {}
+    if icc:
+        options["icc_profile"] = icc
+    with stage("encode"):
+        img.save(out, format=format, **options)
+
+def _resize_image(src, out, width, height, mode="exact", quality=85, format="auto"):
+    source, icc, (image,) = _resize_renditions(src, [(width, height)], mode)
+    _save_resized(image, out, _resize_format(format, source), quality, icc)
+
+def _resize_image_set(src, out, sizes, mode="fit", quality=85, format="auto"):
+    """A zip with one rendition per size, named by their pixel size"""
+    source, icc, images = _resize_renditions(src, sizes, mode)
+    format = _resize_format(format, source)
+    names = set()
+    # Images are already compressed; deflating them again only costs time
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as zf:
+        for image in images:
+            name = f"{image.width}x{image.height}{_image_suffix(format)}"
+            if name not in names:
+                names.add(name)
+                with zf.open(name, "w") as dst:
+                    _save_resized(image, dst, format, quality, icc)
+
+# ==========================================
+# IMAGE TO PDF ENGINE
+# ==========================================
+
+# Images being prepared at once per request; pages still go out in order
+IMG_PDF_WINDOW = int(os.environ.get("NEXUS_IMG_PDF_WINDOW", THREAD_WORKERS))
+# "auto" makes each page the size of its image at the image's own resolution
+IMG_PDF_PAGE_SIZES = {"auto": None, "a3": A3, "a4": A4, "a5": A5, "letter": letter, "legal": legal}
+# Resolution assumed for images that do not record one
+IMG_PDF_DEFAULT_DPI = 96
+# PDF viewers reject pages over 200 inches a side
+IMG_PDF_MAX_SIDE = 14400
+# Images less than this much over the target resolution are embedded as they are
+IMG_PDF_DPI_SLACK = 1.1
+
+# EXIF orientation -> page /Rotate for JPEGs embedded untouched. Mirrored
+# orientations have no /Rotate equivalent and are decoded instead.
+JPEG_PDF_ROTATE = {1: 0, 3: 180, 6: 90, 8: 270}
+PDF_COLORSPACES = {"1": "/DeviceGray", "L": "/DeviceGray", "RGB": "/DeviceRGB", "CMYK": "/DeviceCMYK"}
+# ICC profile header color space -> components
+ICC_COMPONENTS = {b"GRAY": 1, b"RGB ": 3, b"CMYK": 4}
+
+def _img_dpi(info):
+    x, y = info.get("dpi") or (0, 0)
+    return (float(x), float(y)) if x > 1 and y > 1 else (IMG_PDF_DEFAULT_DPI, IMG_PDF_DEFAULT_DPI)
+
+def _img_pdf_layout(size, density, page_size):
+    """Page size and the (x, y, width, height) box the image fills, in points"""
+    width, height = size[0] * 72 / density[0], size[1] * 72 / density[1]
+    if page_size is None:
+        scale = min(1, IMG_PDF_MAX_SIDE / max(width, height))
+        return (width * scale, height * scale), (0, 0, width * scale, height * scale)
+    if (width > height) != (page_size[0] > page_size[1]):
+        # Landscape images get landscape pages
+        page_size = page_size[::-1]
+    scale = min(page_size[0] / width, page_size[1] / height)
+    width, height = width * scale, height * scale
+    return page_size, ((page_size[0] - width) / 2, (page_size[1] - height) / 2, width, height)
+
+def _png_image(path, offset=0):
+    """XObject fields for the PNG at offset in path, referencing its IDAT data in
+    place, or None when PDF cannot take the compressed data as it is"""
+    segments, palette = [], None
+    with open(path, "rb") as f:
+        f.seek(offset)
+        if f.read(8) != PNG_SIGNATURE:
+            return None
+        while header := f.read(8):
+            length, kind = int.from_bytes(header[:4], "big"), header[4:]
+            if kind == b"IHDR":
+                ihdr = f.read(length)
+                width, height = int.from_bytes(ihdr[0:4], "big"), int.from_bytes(ihdr[4:8], "big")
+                depth, color, interlace = ihdr[8], ihdr[9], ihdr[12]
+                if color not in (0, 2, 3) or interlace:
+                    # Alpha needs splitting into a soft mask; Adam7 has no PDF predictor
+                    return None
+                f.seek(4, 1)
+                continue
+            if kind == b"PLTE":
+                palette = f.read(length)
+                f.seek(4, 1)
+                continue
+            if kind in (b"tRNS", b"acTL"):
+                return None
+            if kind == b"IDAT":
+                segments.append((path, f.tell(), length))
+            elif kind == b"IEND":
+                break
+            f.seek(length + 4, 1)
+    colors = 3 if color == 2 else 1
+    if color == 3:
+        colorspace = ("/Indexed", "/DeviceRGB", len(palette) // 3 - 1, palette)
+    else:
+        colorspace = "/DeviceRGB" if color == 2 else "/DeviceGray"
+    return {"width": width, "height": height, "colorspace": colorspace, "bits": depth, "filter": "/FlateDecode",
+            "parms": f"<</Predictor 15 /Colors {colors} /BitsPerComponent {depth} /Columns {width}>>", "data": segments}
+
+def _jpeg_image(img, path, offset, size, inverted):
+    # Adobe CMYK JPEGs store the channels inverted
+    return {"width": img.width, "height": img.height, "colorspace": PDF_COLORSPACES[img.mode], "bits": 8,
+            "filter": "/DCTDecode", "decode": "[1 0 1 0 1 0 1 0]" if inverted else None, "data": [(path, offset, size)]}
+
+def _encode_png(img, data):
+    offset = data.tell()
+    img.save(data, "PNG", compress_level=6)
+    data.flush()
+    return _png_image(data.name, offset)
+
+def _encode_image(img, data, lossy, quality, icc):
+    """Encode a decoded frame into the open part file and return its XObject
+    fields. JPEG sources stay JPEG at the given quality; everything else goes
+    through PNG so the data keeps its predictor filtering."""
+    if img.has_transparency_data:
+        img = img.convert("LA" if img.mode in ("1", "L", "LA") else "RGBA")
+    elif img.mode not in ("1", "L", "P", "RGB", "CMYK", "I;16"):
+        img = img.convert("RGB")
+    mask = None
+    if img.mode in ("LA", "RGBA"):
+        mask = _encode_png(img.getchannel("A"), data)
+        img = img.convert(img.mode[:-1])
+    if lossy and img.mode in ("L", "RGB", "CMYK"):
+        offset = data.tell()
+        img.save(data, "JPEG", quality=quality)
+        # Pillow writes CMYK with an Adobe marker, inverted
+        image = _jpeg_image(img, data.name, offset, data.tell() - offset, img.mode == "CMYK")
+    elif img.mode == "CMYK":
+        # PNG has no CMYK; deflate the raw samples
+        offset = data.tell()
+        data.write(zlib.compress(img.tobytes(), 6))
+        image = {"width": img.width, "height": img.height, "colorspace": "/DeviceCMYK", "bits": 8,
+                 "filter": "/FlateDecode", "data": [(data.name, offset, data.tell() - offset)]}
+    else:
+        image = _encode_png(img, data)
+    image["smask"] = mask
+    if icc and isinstance(image["colorspace"], str):
+        image["icc"] = icc
+    return image
+
+def _img_pdf_pages(src, part, page_size, dpi, quality):
+    """(page size, image box, rotation, XObject fields) for each frame of one
+    image. JPEGs and plain PNGs are referenced where they are; anything that
+    has to be decoded, downsampled or turned upright is encoded into part."""
+    from PIL import ImageOps, ImageSequence
+    pages = []
+    with Image.open(src) as img, open(part, "wb") as data:
+        source = _base_format(img)
+        # PNG getexif() decodes the whole image looking for an eXIf chunk after the
+        # pixels; one that matters comes before them
+        orientation = img.getexif().get(0x0112, 1) if source != "PNG" or "exif" in img.info else 1
+        icc = img.info.get("icc_profile")
+        # Multi-picture JPEGs carry previews after the first frame
+        frames = [img] if source == "JPEG" else ImageSequence.Iterator(img)
+        turned = orientation in (5, 6, 7, 8)
+        for frame in frames:
+            size = (frame.height, frame.width) if turned else frame.size
+            page, box = _img_pdf_layout(size, _img_dpi(frame.info), page_size)
+            target = size
+            if dpi:
+                scale = min(box[2] / 72 * dpi / size[0], box[3] / 72 * dpi / size[1])
+                if scale * IMG_PDF_DPI_SLACK < 1:
+                    target = (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+            image, rotate = None, 0
+            if target == size:
+                if source == "JPEG" and orientation in JPEG_PDF_ROTATE and frame.mode in PDF_COLORSPACES:
+                    inverted = frame.mode == "CMYK" and "adobe" in frame.info
+                    image = _jpeg_image(frame, src, 0, os.path.getsize(src), inverted)
+                    rotate = JPEG_PDF_ROTATE[orientation]
+                elif source == "PNG" and orientation == 1 and getattr(img, "n_frames", 1) == 1:
+                    image = _png_image(src)
+            if image is not None:
+                if icc and isinstance(image["colorspace"], str):
+                    image["icc"] = icc
+            elif source == "JPEG" and target != size:
+                # Draft decoding at a fraction of the size, turned upright
+                _, _, (decoded,) = _resize_renditions(src, [target], "exact")
+                image = _encode_image(decoded, data, True, quality, icc)
+            else:
+                decoded = ImageOps.exif_transpose(frame) if orientation != 1 else frame.copy()
+                if target != size:
+                    if decoded.mode in ("1", "P"):
+                        decoded = decoded.convert("RGBA" if decoded.has_transparency_data else "RGB")
+                    decoded = decoded.resize(target, Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+                image = _encode_image(decoded, data, source == "JPEG", quality, icc)
+            if rotate in (90, 270):
+                # The page is laid out upright; /Rotate turns the stored page to match
+                page, box = page[::-1], (box[1], box[0], box[3], box[2])
+            pages.append((page, box, rotate, image))
+    return pages
+
+def _pdf_number(value):
+    return f"{value:.3f}".rstrip("0").rstrip(".")
+
+class PdfObjectWriter:
+    """A PDF written to f object by object, so memory does not grow with the page
+    count. Subclasses add pages to kids; close() writes the page tree and xref."""
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = {}
+        self.kids = []
+        # 1 is the catalog and 2 the page tree, both written once every page is in
+        self.next = 3
+        f.write(b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n")
+
+    def _begin(self, num=None):
+        if num is None:
+            num, self.next = self.next, self.next + 1
+        self.offsets[num] = self.f.tell()
+        return num
+
+    def _object(self, body, num=None):
+        num = self._begin(num)
+        self.f.write(f"{num} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+        return num
+
+    def _stream(self, fields, data=b"", segments=()):
+        num = self._begin()
+        length = len(data) + sum(size for _, _, size in segments)
+        self.f.write(f"{num} 0 obj\n<<{fields} /Length {length}>>\nstream\n".encode("latin-1"))
+        self.f.write(data)
+        for path, offset, size in segments:
+            with open(path, "rb") as src:
+                src.seek(offset)
+                _copy_bytes(src, self.f, size)
+        self.f.write(b"\nendstream\nendobj\n")
+        return num
+
+    def close(self):
+        kids = " ".join(f"{num} 0 R" for num in self.kids)
+        self._object(f"<</Type /Pages /Kids [{kids}] /Count {len(self.kids)}>>", 2)
+        self._object("<</Type /Catalog /Pages 2 0 R>>", 1)
+        start = self.f.tell()
+        self.f.write(f"xref\n0 {self.next}\n0000000000 65535 f \n".encode("latin-1"))
+        self.f.write("".join(f"{self.offsets[num]:010d} 00000 n \n" for num in range(1, self.next)).encode("latin-1"))
+        self.f.write(f"trailer\n<</Size {self.next} /Root 1 0 R>>\nstartxref\n{start}\n%%EOF\n".encode("latin-1"))
+
+class ImagePdf(PdfObjectWriter):
+    """A PDF of one image per page. Image data is copied from the files it sits in."""
+
+    def _image(self, image):
+        colorspace = image["colorspace"]
+        if isinstance(colorspace, tuple):
+            kind, base, top, palette = colorspace
+            colorspace = f"[{kind} {base} {top} <{palette.hex()}>]"
+        elif image.get("icc"):
+            components = ICC_COMPONENTS.get(image["icc"][16:20])
+            if components == {"/DeviceGray": 1, "/DeviceRGB": 3, "/DeviceCMYK": 4}[colorspace]:
+                colorspace = f"[/ICCBased {self._stream(f'/N {components}', image['icc'])} 0 R]"
+        fields = (f"/Type /XObject /Subtype /Image /Width {image['width']} /Height {image['height']}"
+                  f" /ColorSpace {colorspace} /BitsPerComponent {image['bits']} /Filter {image['filter']}")
+        if image.get("parms"):
+            fields += f" /DecodeParms {image['parms']}"
+        if image.get("decode"):
+            fields += f" /Decode {image['decode']}"
+        if image.get("smask"):
+            fields += f" /SMask {self._image(image['smask'])} 0 R"
+        return self._stream(fields, segments=image["data"])
+
+    def add(self, page, box, rotate, image):
+        xobject = self._image(image)
+        x, y, width, height = map(_pdf_number, box)
+        contents = self._stream("", f"q {width} 0 0 {height} {x} {y} cm /Im0 Do Q".encode("latin-1"))
+        self.kids.append(self._object(
+            f"<</Type /Page /Parent 2 0 R /MediaBox [0 0 {_pdf_number(page[0])} {_pdf_number(page[1])}]"
+            + (f" /Rotate {rotate}" if rotate else "")
+            + f" /Resources <</XObject <</Im0 {xobject} 0 R>>>> /Contents {contents} 0 R>>"))
+
+async def _img_pdf_parts(tmp, paths, names, page_size, dpi, quality):
+    """Yield (part file, pages) per image in order while up to IMG_PDF_WINDOW
+    images are prepared in parallel"""
+    images = iter(zip(paths, names))
+    pending = deque()
+
+    def schedule(src, name):
+        part = tmp.new_path(".part")
+        task = asyncio.ensure_future(run_tool("img-to-pdf", _img_pdf_pages, src, part, page_size, dpi, quality))
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        pending.append((name, part, task))
+
+    for src, name in itertools.islice(images, IMG_PDF_WINDOW):
+        schedule(src, name)
+    try:
+        while pending:
+            name, part, task = pending.popleft()
+            try:
+                pages = await task
+            except Image.UnidentifiedImageError:
+                raise Image.UnidentifiedImageError(f"Not an image the server can read: {name}")
+            following = next(images, None)
+            if following:
+                schedule(*following)
+            yield part, pages
+    finally:
+        for _, _, task in pending:
+            task.cancel()
+
+async def _img_to_pdf(tmp, paths, names, out, page_size=None, dpi=0, quality=85):
+    """One page per image (per frame for multi-page TIFFs), written as the images
+    are prepared. Each part file is removed once its pages are written."""
+    with open(out, "wb") as f:
+        pdf = ImagePdf(f)
+        async for part, pages in _img_pdf_parts(tmp, paths, names, page_size, dpi, quality):
+            for page in pages:
+                await asyncio.to_thread(pdf.add, *page)
+            os.remove(part)
+        await asyncio.to_thread(pdf.close)
+
+# ==========================================
+# SPREADSHEET ENGINE
+# ==========================================
+
+# Rows per chunk when reading CSV; bounds memory whatever the file size
+SHEET_CHUNK_ROWS = int(os.environ.get("NEXUS_SHEET_CHUNK_ROWS", 50_000))
+# Excel's row limit. Longer CSVs continue on further sheets under the same header.
+SHEET_MAX_ROWS = 1_048_576
+# Sheet names cannot contain "*", so it is free to mean every sheet
+ALL_SHEETS = "*"
+
+XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+XLSX_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+XLSX_PACKAGE_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+# Characters XML 1.0 cannot carry at all
+XML_ILLEGAL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}</Types>')
+XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>')
+# Style 1 is the bold header row
+XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>')
+
+def _xlsx_cell(ref, value, style):
+    if value is None:
+        return ""
+    if value is True or value is False:
+        return f'<c r="{ref}"{style} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return f'<c r="{ref}"{style}><v>{value!r}</v></c>'
+    # Text stays text: a CSV cell starting with "=" must not become a formula
+    text = html.escape(XML_ILLEGAL.sub("", str(value)), quote=False)
+    return f'<c r="{ref}"{style} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+class XlsxBook:
+    """An XLSX workbook written to out a sheet at a time. Rows are serialized as
+    they arrive, so memory does not grow with the row count."""
+
+    def __init__(self, out):
+        self.zip = zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED)
+        self.names = []
+
+    def add_sheet(self, name, rows, header=None):
+        """Write rows (lists of str, int, float, bool or None) under an optional
+        bold header and return how many rows were written, header included"""
+        from openpyxl.utils.cell import get_column_letter
+        self.names.append(name)
+        columns, buffer, count = [], [], 0
+        with self.zip.open(f"xl/worksheets/sheet{len(self.names)}.xml", "w") as f:
+            f.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<worksheet xmlns="{XLSX_NS[1:-1]}"><sheetData>'.encode())
+            for row in itertools.chain([header] if header else [], rows):
+                count += 1
+                while len(columns) < len(row):
+                    columns.append(get_column_letter(len(columns) + 1))
+                style = ' s="1"' if header and count == 1 else ""
+                buffer.append(f'<row r="{count}">' + "".join([_xlsx_cell(f"{column}{count}", value, style) for column, value in zip(columns, row)]) + "</row>")
+                if len(buffer) == 1000:
+                    f.write("".join(buffer).encode("utf-8"))
+                    buffer.clear()
+            f.write(("".join(buffer) + "</sheetData></worksheet>").encode("utf-8"))
+        return count
+
+    def close(self):
+        sheets = "".join(f'<sheet name="{html.escape(name)}" sheetId="{i}" r:id="rId{i}"/>' for i, name in enumerate(self.names, 1))
+        self.zip.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES.format(sheets="".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(self.names) + 1))))
+        self.zip.writestr("_rels/.rels", XLSX_ROOT_RELS)
+        self.zip.writestr("xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<workbook xmlns="{XLSX_NS[1:-1]}" xmlns:r="{XLSX_REL_NS[1:-1]}"><sheets>{sheets}</sheets></workbook>')
+        self.zip.writestr("xl/_rels/workbook.xml.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<Relationships xmlns="{XLSX_PACKAGE_NS[1:-1]}">'
+            + "".join(f'<Relationship Id="rId{i}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet{i}.xml"/>'
+                      for i in range(1, len(self.names) + 1))
+            + f'<Relationship Id="rId{len(self.names) + 1}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+            '</Relationships>')
+        self.zip.writestr("xl/styles.xml", XLSX_STYLES)
+        self.zip.close()
+
+def _xlsx_part(name):
+    # Relationship targets are relative to xl/ unless they start at the root
+    return name[1:] if name.startswith("/") else posixpath.normpath(posixpath.join("xl", name))
+
+def _xlsx_text(si):
+    """Text of a shared or inline string; phonetic runs (rPh) are not part of it"""
+    text = si.findtext(XLSX_NS + "t")
+    if text is not None:
+        return text
+    return "".join(run.findtext(XLSX_NS + "t", "") for run in si.iter(XLSX_NS + "r"))
+
+def _xlsx_workbook(zf):
+    """(sheet names and parts in workbook order, shared strings part, styles part, 1904 dates)"""
+    import xml.etree.ElementTree as ET
+    rels = {rel.get("Id"): (rel.get("Type").rsplit("/", 1)[-1], _xlsx_part(rel.get("Target")))
+            for rel in ET.fromstring(zf.read("xl/_rels/workbook.xml.rels")).iter(XLSX_PACKAGE_NS + "Relationship")}
+    book = ET.fromstring(zf.read("xl/workbook.xml"))
+    sheets = [(sheet.get("name"), rels[sheet.get(XLSX_REL_NS + "id")][1]) for sheet in book.iter(XLSX_NS + "sheet")
+              if rels.get(sheet.get(XLSX_REL_NS + "id"), ("",))[0] == "worksheet"]
+    parts = {kind: part for kind, part in rels.values()}
+    properties = book.find(XLSX_NS + "workbookPr")
+    date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+    return sheets, parts.get("sharedStrings"), parts.get("styles"), date1904
+
+def _xlsx_date_styles(zf, part):
+    """Indices of the cell styles whose number format is a date or time"""
+    import xml.etree.ElementTree as ET
+    from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+    if not part or part not in zf.namelist():
+        return set()
+    styles = ET.fromstring(zf.read(part))
+    formats = dict(BUILTIN_FORMATS)
+    formats.update((int(fmt.get("numFmtId")), fmt.get("formatCode")) for fmt in styles.iter(XLSX_NS + "numFmt"))
+    xfs = styles.find(XLSX_NS + "cellXfs")
+    return {i for i, xf in enumerate(xfs if xfs is not None else [])
+            if is_date_format(formats.get(int(xf.get("numFmtId", 0)), ""))}
+
+def _xlsx_value(cell, strings, dates, epoch):
+    kind = cell.get("t", "n")
+    if kind == "inlineStr":
+        inline = cell.find(XLSX_NS + "is")
+        return None if inline is None else _xlsx_text(inline)
+    value = cell.findtext(XLSX_NS + "v")
+    if not value:
+        # Formulas saved without a cached result have an empty <v>
+        return None
+    if kind == "s":
+        return strings[int(value)]
+    if kind == "b":
+        return value == "1"
+    if kind != "n":
+        # str (formula result), e (#N/A and friends), d (ISO date)
+        return value
+    number = float(value) if "." in value or "E" in value or "e" in value else int(value)
+    if int(cell.get("s", 0)) in dates:
+        from openpyxl.utils.datetime import from_excel
+        moment = from_excel(number, epoch)
+        if isinstance(moment, datetime.datetime) and moment.time() == datetime.time():
+            return moment.date()
+        return moment
+    return number
+
+def _xlsx_rows(src, sheet=None):
+    """Rows of one worksheet (the first by default) as lists, read as a stream.
+    Missing rows come out empty and every row is padded to the sheet's width."""
+    import xml.etree.ElementTree as ET
+    from openpyxl.utils.cell import column_index_from_string
+    from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+    with zipfile.ZipFile(src) as zf:
+        sheets, strings_part, styles_part, date1904 = _xlsx_workbook(zf)
+        parts = dict(sheets)
+        if sheet is None:
+            sheet = sheets[0][0]
+        if sheet not in parts:
+            raise KeyError(sheet)
+        strings = []
+        if strings_part and strings_part in zf.namelist():
+            with zf.open(strings_part) as f:
+                for _, si in ET.iterparse(f):
+                    if si.tag == XLSX_NS + "si":
+                        strings.append(_xlsx_text(si))
+                        si.clear()
+        dates = _xlsx_date_styles(zf, styles_part)
+        epoch = CALENDAR_MAC_1904 if date1904 else CALENDAR_WINDOWS_1900
+        row_tag, sheet_data_tag, dimension_tag = XLSX_NS + "row", XLSX_NS + "sheetData", XLSX_NS + "dimension"
+        width, expected, data, columns, last = 0, 1, None, {}, None
+
+        def values(el):
+            row = []
+            for cell in el:
+                ref = cell.get("r")
+                if ref:
+                    letters = ref.rstrip("0123456789")
+                    column = columns.get(letters)
+                    if column is None:
+                        column = columns[letters] = column_index_from_string(letters) - 1
+                    if column > len(row):
+                        row.extend([None] * (column - len(row)))
+                row.append(_xlsx_value(cell, strings, dates, epoch))
+            if len(row) < width:
+                row.extend([None] * (width - len(row)))
+            return row
+
+        with zf.open(parts[sheet]) as f:
+            # Start events only, half as many as start and end: a row is complete once
+            # the next one starts, and the last once the parse is done
+            for _, el in ET.iterparse(f, ("start",)):
+                if el.tag == row_tag:
+                    if last is not None:
+                        yield values(last)
+                    # Rows already read are dropped so the tree never grows
+                    data.clear()
+                    number = int(el.get("r", expected))
+                    for _ in range(expected, number):
+                        yield [None] * width
+                    expected, last = number + 1, el
+                elif el.tag == sheet_data_tag:
+                    data = el
+                elif el.tag == dimension_tag:
+                    corner = el.get("ref", "").rpartition(":")[2].rstrip("0123456789")
+                    width = column_index_from_string(corner) if corner else 0
+        if last is not None:
+            yield values(last)
+
+def _legacy_rows(src, sheet):
+    """Rows of a sheet in a format only pandas reads (xls, ods). These load whole."""
+    import pandas as pd
+    frame = pd.read_excel(src, sheet_name=sheet, header=None)
+    return frame.astype(object).where(frame.notna(), None).values.tolist()
+
+def _is_xlsx(src):
+    if not zipfile.is_zipfile(src):
+        return False
+    with zipfile.ZipFile(src) as zf:
+        return "xl/workbook.xml" in zf.namelist()
+
+def _sheet_names(src):
+    if not _is_xlsx(src):
+        import pandas as pd
+        return [str(name) for name in pd.ExcelFile(src).sheet_names]
+    with zipfile.ZipFile(src) as zf:
+        return [name for name, _ in _xlsx_workbook(zf)[0]]
+
+def _sheet_rows(src, sheet=None):
+    """Rows of one worksheet (the first by default), streamed for xlsx"""
+    if _is_xlsx(src):
+        return _xlsx_rows(src, sheet)
+    return iter(_legacy_rows(src, 0 if sheet is None else sheet))
+
+def _excel_to_csv(src, out, sheet=None):
+    """One worksheet (the first by default) to CSV without loading it"""
+    with open(out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerows(_sheet_rows(src, sheet))
+
+def _csv_rows(src):
+    """The header, then every data row of a CSV, read SHEET_CHUNK_ROWS at a time"""
+    import pandas as pd
+    first = True
+    with pd.read_csv(src, chunksize=SHEET_CHUNK_ROWS) as reader:
+        for chunk in reader:
+            if first:
+                yield [str(column) for column in chunk.columns]
+                first = False
+            # object dtype turns numpy scalars into Python ones; NaN becomes an empty cell
+            yield from chunk.astype(object).where(chunk.notna(), None).values.tolist()
+
+def _csv_to_excel(src, out):
+    rows = _csv_rows(src)
+    header = next(rows)
+    book = XlsxBook(out)
+    book.add_sheet("Sheet1", itertools.islice(rows, SHEET_MAX_ROWS - 1), header)
+    for first in rows:
+        # Past Excel's row limit: carry on in Sheet2, Sheet3... under the same header
+        book.add_sheet(f"Sheet{len(book.names) + 1}", itertools.chain([first], itertools.islice(rows, SHEET_MAX_ROWS - 2)), header)
+    book.close()
+
+def _zip_files(out, entries):
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, path in entries:
+            zf.write(path, name)
+
+async def _excel_to_csv_zip(tmp, src, out):
+    """Every worksheet as its own CSV, converted in parallel, in one zip"""
+    names = await run_tool("excel-to-csv", _sheet_names, src)
+    parts = [tmp.new_path(".csv") for _ in names]
+    await asyncio.gather(*(run_tool("excel-to-csv", _excel_to_csv, src, part, name) for name, part in zip(names, parts)))
+    entries, seen = [], set()
+    for name, part in zip(names, parts):
+        entry = re.sub(r'[\\/:*?"<>|]', "_", name) or "sheet"
+        while entry.lower() in seen:
+            entry += "_"
+        seen.add(entry.lower())
+        entries.append((entry + ".csv", part))
+    await asyncio.to_thread(_zip_files, out, entries)
+
+# ==========================================
+# TABLE ENGINE
+# ==========================================
+
+TABLE_PAGE_SIZES = {"a4": A4, "a3": A3, "letter": letter, "legal": legal}
+TABLE_FONT, TABLE_BOLD, TABLE_FONT_SIZE = "Helvetica", "Helvetica-Bold", 8
+TABLE_LEADING = TABLE_FONT_SIZE * 1.25
+TABLE_PADDING = 3
+TABLE_MARGIN = 36
+# Rows measured to size the columns; later rows wrap to fit
+TABLE_SAMPLE_ROWS = 500
+# A column grows to this before its text wraps
+TABLE_MAX_COLUMN = 220
+# Narrowest a column is squeezed; sheets wider than that print in bands of columns
+TABLE_MIN_COLUMN = 40
+# Lines a cell may wrap onto; the rest is cut
+TABLE_MAX_LINES = 6
+# Backslash and parentheses are escaped in PDF strings; other control characters print as spaces
+PDF_STRING_ESCAPES = {**{i: " " for i in range(32)}, ord("\\"): "\\\\", ord("("): "\\(", ord(")"): "\\)"}
+
+def _table_text(value):
+    if value is None:
+        return ""
+    if value is True or value is False:
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        # Excel's 15 significant digits rather than 0.30000000000000004
+        return format(value, ".15g")
+    return str(value)
+
+@functools.lru_cache(maxsize=None)
+def _table_font(name):
+    """Glyph widths of a standard font by WinAnsi code, and the widest of them"""
+    from reportlab.pdfbase.pdfmetrics import getFont
+    widths = getFont(name).widths
+    return widths, max(widths) * TABLE_FONT_SIZE / 1000
+
+def _text_width(text, widths):
+    # WinAnsi is cp1252 for every character the standard fonts can draw
+    return sum(map(widths.__getitem__, text.encode("cp1252", "replace"))) * TABLE_FONT_SIZE / 1000
+
+def _natural_widths(sample):
+    """Width each column wants for the header (first row) and a sample of rows"""
+    natural = [TABLE_MIN_COLUMN / 2] * max(len(row) for row in sample)
+    for number, row in enumerate(sample):
+        widths = _table_font(TABLE_BOLD if number == 0 else TABLE_FONT)[0]
+        for i, value in enumerate(row):
+            for line in _table_text(value).split("\n"):
+                natural[i] = max(natural[i], _text_width(line, widths) + 2 * TABLE_PADDING)
+    return [min(width, TABLE_MAX_COLUMN) for width in natural]
+
+def _fit_widths(widths, usable):
+    """Stretch widths to fill usable, or squeeze the widest columns to a common
+    width until they fit"""
+    total = sum(widths)
+    if total <= usable:
+        return [width * usable / total for width in widths]
+    remaining, count = usable, len(widths)
+    for i, width in enumerate(sorted(widths)):
+        cap = remaining / (count - i)
+        if width > cap:
+            break
+        remaining -= width
+    return [min(width, cap) for width in widths]
+
+def _table_bands(natural, usable):
+    """[(column indices, widths)] that each fit across the page; most sheets
+    are a single band"""
+    count = len(natural)
+    if count * TABLE_MIN_COLUMN <= usable:
+        return [(list(range(count)), _fit_widths(natural, usable))]
+    bands, band, total = [], [], 0
+    for i, width in enumerate(natural):
+        if band and total + width > usable:
+            bands.append(band)
+            band, total = [], 0
+        band.append(i)
+        total += width
+    bands.append(band)
+    return [(band, _fit_widths([natural[i] for i in band], usable)) for band in bands]
+
+def _cell_lines(value, width, font):
+    """[(x offset, line)] for one cell: wrapped to the column, numbers set right"""
+    from reportlab.lib.utils import simpleSplit
+    widths, widest = _table_font(font)
+    text = _table_text(value)
+    room = width - 2 * TABLE_PADDING
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        # Numbers do not wrap, so only their width is needed
+        return [(width - TABLE_PADDING - _text_width(text, widths), text)]
+    # Most cells are short enough to fit whatever their letters, and are never measured
+    if "\n" not in text and (len(text) * widest <= room or _text_width(text, widths) <= room):
+        return [(TABLE_PADDING, text)]
+    lines = []
+    for line in simpleSplit(text, font, TABLE_FONT_SIZE, room):
+        # simpleSplit only breaks at spaces; a word wider than the column is cut
+        while len(line) > 1 and _text_width(line, widths) > room:
+            cut, used = 0, 0
+            for code in line.encode("cp1252", "replace"):
+                used += widths[code] * TABLE_FONT_SIZE / 1000
+                if used > room:
+                    break
+                cut += 1
+            lines.append(line[:max(cut, 1)])
+            line = line[max(cut, 1):]
+        lines.append(line)
+        if len(lines) > TABLE_MAX_LINES:
+            break
+    if len(lines) > TABLE_MAX_LINES:
+        lines = lines[:TABLE_MAX_LINES]
+        lines[-1] = lines[-1][:-3] + "..."
+    return [(TABLE_PADDING, line) for line in lines]
+
+class TablePdf(PdfObjectWriter):
+    """A PDF of pages drawn with the two standard table fonts: /F1 regular and
+    /F2 bold. Each page's content is compressed and written as soon as it is added."""
+
+    def __init__(self, f):
+        super().__init__(f)
+        self.fonts = " ".join(
+            f"/F{i} {self._object(f'<</Type /Font /Subtype /Type1 /BaseFont /{name} /Encoding /WinAnsiEncoding>>')} 0 R"
+            for i, name in ((1, TABLE_FONT), (2, TABLE_BOLD)))
+
+    def add(self, page, content):
+        data = zlib.compress(content.encode("cp1252", "replace"), 6)
+        contents = self._stream("/Filter /FlateDecode", data)
+        self.kids.append(self._object(
+            f"<</Type /Page /Parent 2 0 R /MediaBox [0 0 {_pdf_number(page[0])} {_pdf_number(page[1])}]"
+            f" /Resources <</Font <<{self.fonts}>>>> /Contents {contents} 0 R>>"))
+
+def _draw_rows(pdf, page, caption, header, rows, columns, widths):
+    """Draw rows page after page under a repeated header. Only the page being
+    drawn is held; each finished page goes straight to the file."""
+    page_width, page_height = page
+    top, bottom = page_height - TABLE_MARGIN, TABLE_MARGIN + TABLE_LEADING
+    edges = [TABLE_MARGIN]
+    for width in widths:
+        edges.append(edges[-1] + width)
+    left, right = edges[0], edges[-1]
+
+    def line_up(row, font):
+        cells = [_cell_lines(row[i] if i < len(row) else None, width, font) for i, width in zip(columns, widths)]
+        return cells, max(map(len, cells)) * TABLE_LEADING + 2 * TABLE_PADDING
+
+    def put(ops, cells, y):
+        # T* steps down by the leading for the further lines of a wrapped cell
+        y -= TABLE_PADDING + TABLE_FONT_SIZE
+        for lines, x in zip(cells, edges):
+            if lines[0][1]:
+                ops.append(f"1 0 0 1 {x + lines[0][0]:.2f} {y:.2f} Tm")
+                ops.append(" T* ".join(f"({line.translate(PDF_STRING_ESCAPES)}) Tj" for _, line in lines))
+
+    header_cells, header_height = line_up(header, TABLE_BOLD)
+    footer = f"({caption.translate(PDF_STRING_ESCAPES)}) Tj"
+
+    def start():
+        ops = [f"0.92 g {left:.2f} {top - header_height:.2f} {right - left:.2f} {header_height:.2f} re f 0 g",
+               f"BT /F2 {TABLE_FONT_SIZE} Tf {TABLE_LEADING:.2f} TL"]
+        put(ops, header_cells, top)
+        ops.append(f"/F1 {TABLE_FONT_SIZE} Tf")
+        return ops, [top, top - header_height]
+
+    def finish(ops, rules):
+        number = str(len(pdf.kids) + 1)
+        number_x = page_width - TABLE_MARGIN - _text_width(number, _table_font(TABLE_FONT)[0])
+        ops.append(f"0.4 g 1 0 0 1 {left:.2f} {TABLE_MARGIN - TABLE_LEADING:.2f} Tm {footer}"
+                   f" 1 0 0 1 {number_x:.2f} {TABLE_MARGIN - TABLE_LEADING:.2f} Tm ({number}) Tj ET")
+        ops.append("0.25 w 0.6 G")
+        ops.extend(f"{left:.2f} {y:.2f} m {right:.2f} {y:.2f} l" for y in rules)
+        ops.extend(f"{x:.2f} {top:.2f} m {x:.2f} {rules[-1]:.2f} l" for x in edges)
+        ops.append("S")
+        pdf.add(page, "\n".join(ops))
+
+    ops, rules = start()
+    for row in rows:
+        cells, height = line_up(row, TABLE_FONT)
+        if rules[-1] - height < bottom:
+            finish(ops, rules)
+            ops, rules = start()
+        put(ops, cells, rules[-1])
+        rules.append(rules[-1] - height)
+    finish(ops, rules)
+
+def _draw_sheet(pdf, name, read_rows, page):
+    """One sheet: its first row is the header on every page. Sheets too wide for
+    the page are drawn band by band, reading the rows again for each band."""
+    rows = read_rows()
+    header = next(rows, None)
+    if header is None:
+        return
+    sample = list(itertools.islice(rows, TABLE_SAMPLE_ROWS))
+    natural = _natural_widths([header] + sample)
+    # Landscape when the columns would be squeezed on a portrait page
+    short, long = sorted(page)
+    page = (long, short) if sum(natural) > short - 2 * TABLE_MARGIN else (short, long)
+    bands = _table_bands(natural, page[0] - 2 * TABLE_MARGIN)
+    for number, (columns, widths) in enumerate(bands):
+        caption = name if len(bands) == 1 else f"{name} (columns {columns[0] + 1}-{columns[-1] + 1})"
+        body = itertools.chain(sample, rows) if number == 0 else itertools.islice(read_rows(), 1, None)
+        _draw_rows(pdf, page, caption, header, body, columns, widths)
+
+def _excel_to_pdf(src, out, sheet=ALL_SHEETS, page_size="a4"):
+    """Worksheets (every one, or the one named) as paginated tables, drawn
+    straight from the streamed rows"""
+    page = TABLE_PAGE_SIZES[page_size]
+    names = _sheet_names(src) if sheet == ALL_SHEETS else [sheet]
+    with stage("transform"), open(out, "wb") as f:
+        pdf = TablePdf(f)
+        for name in names:
+            _draw_sheet(pdf, name, lambda: _sheet_rows(src, name), page)
+        if not pdf.kids:
+            # Every sheet empty: still a valid, one-page document
+            pdf.add(page, "")
+        pdf.close()
+
+# ==========================================
+# HTML RENDERING
+# ==========================================
+
+HTML_PAGE = A4
+# 2cm, xhtml2pdf's default page margin
+HTML_MARGIN = 56.7
+
+# xhtml2pdf's default face, given to MuPDF too so both backends set text alike
+HTML_BASE_CSS = "body { font-family: Helvetica; }\n"
+# Stylesheet each kind of document is rendered with; None is built on first use
+HTML_TEMPLATES = {
+    "document": "",
+    "markdown": "",
+    "code": None,
+    "page": "",
+    "contents": "h1 { font-size: 16pt; }\ntable { width: 100%; }\ntd { padding: 2pt 0; }\ntd.page { text-align: right; }",
+}
+
+@functools.lru_cache(maxsize=None)
+def _html_style(template):
+    """A template's stylesheet, built once per process"""
+    css = HTML_TEMPLATES[template]
+    if css is None and template == "code":
+        from pygments.formatters import HtmlFormatter
+        # xhtml2pdf fails on any padding around the inline line numbers
+        css = HtmlFormatter(style="colorful").get_style_defs(".highlight") + \
+            "\nh2.file { font-size: 11pt; }\n.highlight pre { font-family: Courier; font-size: 9pt; white-space: pre-wrap; }" + \
+            "\n.highlight span.linenos { color: #999; padding-left: 0; padding-right: 0; }"
+    return HTML_BASE_CSS + css
+
+def _story_pdf(html, out, css):
+    import pymupdf
+    story = pymupdf.Story(html=html, user_css=css)
+    page = pymupdf.Rect(0, 0, *HTML_PAGE)
+    body = page + (HTML_MARGIN, HTML_MARGIN, -HTML_MARGIN, -HTML_MARGIN)
+    writer = pymupdf.DocumentWriter(out)
+    story.write(writer, lambda rect_num, filled: (page, body, None))
+    writer.close()
+
+def _xhtml2pdf_pdf(html, out, css):
+    from xhtml2pdf import pisa
+    from xhtml2pdf.default import DEFAULT_CSS
+    with open(out, "wb") as f:
+        # The template goes in under xhtml2pdf's own defaults, so a document's
+        # <style> still overrides it
+        pisa.CreatePDF(html, dest=f, default_css=DEFAULT_CSS + css)
+
+# "story" lays pages out with MuPDF and is many times faster. "xhtml2pdf" is the
+# original renderer, kept for documents that rely on how it lays them out.
+HTML_BACKENDS = {"story": _story_pdf, "xhtml2pdf": _xhtml2pdf_pdf}
+HTML_BACKEND = os.environ.get("NEXUS_HTML_BACKEND", "story")
+
+def _html_backend(backend):
+    """The backend a request asked for, or the deployment's default"""
+    if not backend:
+        return HTML_BACKEND
+    if backend not in HTML_BACKENDS:
+        raise HTTPException(400, f"backend must be one of: {', '.join(HTML_BACKENDS)}")
+    return backend
+
+def _render_html(html, out, template, backend):
+    """Lay html out as an A4 PDF at out, styled by template"""
+    with stage("serialize"):
+        HTML_BACKENDS[backend](html, out, _html_style(template))
+
+# ==========================================
+# CODE TO PDF ENGINE
+# ==========================================
+
+# Lines highlighted and laid out per part; parts render in parallel
+CODE_CHUNK_LINES = int(os.environ.get("NEXUS_CODE_CHUNK_LINES", 2000))
+CODE_WINDOW = int(os.environ.get("NEXUS_CODE_WINDOW", PROCESS_WORKERS))
+# Most source a request's zips may unpack to
+CODE_MAX_BYTES = int(os.environ.get("NEXUS_CODE_MAX_BYTES", MAX_FILE_BYTES))
+# Leading bytes checked for a NUL to tell binaries from source
+CODE_SNIFF_BYTES = 8192
+# Extensionless names Pygments knows by name
+CODE_NAMED_FILES = ("Makefile", "Dockerfile", "CMakeLists.txt", "Gemfile", "Rakefile", "Vagrantfile")
+
+def _is_source(path):
+    with open(path, "rb") as f:
+        return b"\0" not in f.read(CODE_SNIFF_BYTES)
+
+def _code_sources(tmp, uploads):
+    """[(name, path)] of the source files among uploads. Zips are unpacked in path
+    order; binaries, hidden paths and macOS resource forks are skipped."""
+    sources, budget = [], CODE_MAX_BYTES
+    for name, path in uploads:
+        if not (name.lower().endswith(".zip") and zipfile.is_zipfile(path)):
+            if _is_source(path):
+                sources.append((name, path))
+            continue
+        with zipfile.ZipFile(path) as zf:
+            for info in sorted(zf.infolist(), key=lambda i: i.filename):
+                parts = info.filename.split("/")
+                if info.is_dir() or any(p.startswith(".") or p == "__MACOSX" for p in parts):
+                    continue
+                budget -= info.file_size
+                if budget < 0:
+                    raise HTTPException(400, f"The zips unpack to more than {CODE_MAX_BYTES // MB} MB")
+                dest = tmp.new_path(os.path.splitext(info.filename)[1])
+                with zf.open(info) as src, open(dest, "wb") as f:
+                    shutil.copyfileobj(src, f)
+                if _is_source(dest):
+                    sources.append((info.filename, dest))
+    return sources
+
+def _read_source(path):
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read().split("\n")
+
+def _code_chunks(lines):
+    """(start, stop) line ranges of about CODE_CHUNK_LINES. A range ends before
+    an unindented line that follows a blank one where there is one close by,
+    since highlighting restarts at each range and top level is a safe place."""
+    start, total = 0, len(lines)
+    while total - start > CODE_CHUNK_LINES:
+        stop = start + CODE_CHUNK_LINES
+        for cut in range(stop, min(stop + CODE_CHUNK_LINES // 10, total)):
+            if not lines[cut - 1].strip() and lines[cut][:1] not in ("", " ", "\t"):
+                stop = cut
+                break
+        yield start, stop
+        start = stop
+    yield start, total
+
+def _code_plan(sources):
+    """[(name, start, code)] parts for every source, in order. Each file is read
+    once here; the parts carry their own lines to the workers."""
+    plan = []
+    for name, path in sources:
+        lines = _read_source(path)
+        plan.extend((name, start, "\n".join(lines[start:stop])) for start, stop in _code_chunks(lines))
+    return plan
+
+@functools.lru_cache(maxsize=256)
+def _code_lexer(key):
+    """Lexer by extension. Finding one tries every lexer Pygments has, so it is
+    done once per extension per process. Unknown files are plain text."""
+    from pygments.lexers import TextLexer, get_lexer_for_filename
+    from pygments.util import ClassNotFound
+    # stripnl would drop a part's leading blank lines and put its numbers out
+    try:
+        return get_lexer_for_filename(key if key in CODE_NAMED_FILES else "x" + key, stripnl=False)
+    except ClassNotFound:
+        return TextLexer(stripnl=False)
+
+def _code_part(name, start, code, out, backend):
+    """Lines of a source file from line start on as a PDF; the first part of a
+    file opens with its name"""
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+    base = os.path.basename(name)
+    lexer = _code_lexer(base if base in CODE_NAMED_FILES else os.path.splitext(base)[1].lower())
+    # Inline line numbers rather than a two-cell table, so long files break across pages.
+    # The space after each number stands in for padding, which xhtml2pdf cannot take there;
+    # the colours come from the code template's stylesheet.
+    formatter = HtmlFormatter(style="colorful", linenos="inline", linenostart=start + 1)
+    with stage("transform"):
+        body = re.sub(r'(<span class="linenos">[^<]*)</span>', r"\1 </span>", highlight(code, lexer, formatter))
+    heading = f'<h2 class="file">{html.escape(name)}</h2>' if start == 0 else ""
+    _render_html(f"<html><body>{heading}{body}</body></html>", out, "code", backend)
+
+def _code_contents(entries, out, offset):
+    """Contents pages listing (name, page) with page numbers moved on by offset.
+    Returns the page count and where each entry landed, for links."""
+    import pymupdf
+    rows = "".join(f'<tr id="entry{i}"><td>{html.escape(name)}</td><td class="page">{page + offset}</td></tr>'
+                   for i, (name, page) in enumerate(entries))
+    story = pymupdf.Story(html=f"<h1>Contents</h1><table>{rows}</table>", user_css=_html_style("contents"))
+    page = pymupdf.Rect(0, 0, *HTML_PAGE)
+    body = page + (HTML_MARGIN, HTML_MARGIN, -HTML_MARGIN, -HTML_MARGIN)
+    spots, pages = {}, [0]
+
+    def position(p):
+        if (p.id or "").startswith("entry") and p.open_close & 1:
+            spots[int(p.id[5:])] = (p.page_num - 1, pymupdf.Rect(body.x0, p.rect[1], body.x1, p.rect[3]))
+
+    def rect(rect_num, filled):
+        pages[0] += 1
+        return page, body, None
+
+    writer = pymupdf.DocumentWriter(out)
+    story.write(writer, rect, positionfn=position)
+    writer.close()
+    return pages[0], spots
+
+def _code_book(parts, out, contents_path):
+    """Join the part PDFs, in order, into one book: a bookmark per file, page
+    numbers, and contents pages in front when there is more than one file"""
+    import pymupdf
+    book = pymupdf.open()
+    files = []
+    with stage("parse"):
+        for name, path, first in parts:
+            if first:
+                files.append((name, book.page_count + 1))
+            with pymupdf.open(path) as part:
+                book.insert_pdf(part)
+            os.remove(path)
+    with stage("serialize"):
+        offset, spots = 0, {}
+        if len(files) > 1:
+            # The contents' own length moves every page on; it depends on the
+            # number of entries, not the numbers, so a second pass settles it
+            guess = 1
+            while True:
+                count, spots = _code_contents(files, contents_path, guess)
+                if count == guess:
+                    break
+                guess = count
+            offset = count
+            with pymupdf.open(contents_path) as contents:
+                book.insert_pdf(contents, start_at=0)
+            for i, (number, spot) in spots.items():
+                book[number].insert_link({"kind": pymupdf.LINK_GOTO, "from": spot, "page": files[i][1] + offset - 1})
+        width, height = HTML_PAGE
+        for number, page in enumerate(book, 1):
+            page.insert_text((width - HTML_MARGIN - 20, height - HTML_MARGIN / 2), str(number), fontsize=8, color=(0.4, 0.4, 0.4))
+        toc = [[1, "Contents", 1]] if offset else []
+        book.set_toc(toc + [[1, name, page + offset] for name, page in files])
+        book.save(out, garbage=1, deflate=True)
+
+async def _code_to_pdf(tmp, sources, out, backend):
+    """Highlight and lay out sources part by part, CODE_WINDOW parts at a time,
+    then bind the parts into one PDF"""
+    plan = await run_tool("code-to-pdf", _code_plan, sources)
+    window = asyncio.Semaphore(CODE_WINDOW)
+
+    async def render(name, start, code):
+        part = tmp.new_path(".pdf")
+        async with window:
+            await run_tool("code-to-pdf", _code_part, name, start, code, part, backend)
+        return name, part, start == 0
+
+    parts = await asyncio.gather(*(render(*entry) for entry in plan))
+    await run_tool("code-to-pdf", _code_book, parts, out, tmp.new_path(".pdf"))
 
 # ==========================================
 # GROUP 1: PDF CORE - EXISTING + NEW
 # ==========================================
 
 @app.post("/api/img-to-pdf")
-async def img_to_pdf(files: List[UploadFile] = File(...)):
+async def img_to_pdf(files: List[UploadFile] = File(...), page_size: str = Form("auto"), dpi: int = Form(0),
+                     quality: int = Form(85)):
+    """One page per image. page_size "auto" sizes each page to its image, a named
+    size fits the image on it. dpi > 0 downsamples images finer than that."""
     if not files: raise HTTPException(400, "No files uploaded")
+    if page_size not in IMG_PDF_PAGE_SIZES:
+        raise HTTPException(400, f"Unknown page size. Available: {', '.join(IMG_PDF_PAGE_SIZES)}")
+    if dpi < 0:
+        raise HTTPException(400, "dpi must be 0 (keep resolution) or more")
+    if not 1 <= quality <= 100:
+        raise HTTPException(400, "quality must be between 1 and 100")
+    async with RequestFiles() as tmp:
+        image_paths = [await tmp.save(f) for f in files]
+        try:
+            out = tmp.new_path(".pdf")
+            if not cache_fetch(tmp, "img-to-pdf", (image_paths, out, page_size, dpi, quality), out):
+                await _img_to_pdf(tmp, image_paths, [f.filename for f in files], out, IMG_PDF_PAGE_SIZES[page_size], dpi, quality)
+                cache_store(tmp, out)
+            return tmp.send_file(out, "application/pdf", "converted.pdf")
+        except Image.UnidentifiedImageError as e: raise HTTPException(400, str(e))
+        except Exception as e: raise HTTPException(500, str(e))
+
+def _merge_pdfs(pdf_paths, out):
+    merger = PdfWriter()
+    handles = [open(path, "rb") for path in pdf_paths]
     try:
-        image_data = [await f.read() for f in files]
-        pdf_bytes = img2pdf.convert(image_data)
-        return Response(content=pdf_bytes, media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=converted.pdf"})
-    except Exception as e: raise HTTPException(500, str(e))
+        with stage("parse"):
+            for f in handles:
+                merger.append(f)
+        with stage("serialize"):
+            merger.write(out)
+    finally:
+        for f in handles:
+            f.close()
 
 @app.post("/api/merge-pdfs")
 async def merge_pdfs(files: List[UploadFile] = File(...)):
     if len(files) < 2: raise HTTPException(400, "Need 2+ files")
-    merger = PdfWriter()
-    try:
-        for f in files:
-            merger.append(io.BytesIO(await f.read()))
-        out = io.BytesIO()
-        merger.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=merged.pdf"})
-    except Exception as e: raise HTTPException(500, str(e))
+    async with RequestFiles() as tmp:
+        pdf_paths = [await tmp.save(f, ".pdf") for f in files]
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "merge-pdfs", _merge_pdfs, pdf_paths, out)
+            return tmp.send_file(out, "application/pdf", "merged.pdf")
+        except Exception as e: raise HTTPException(500, str(e))
 
-@app.post("/api/split-pdf")
-async def split_pdf(file: UploadFile = File(...), start_page: int = Form(...), end_page: int = Form(...)):
-    try:
-        reader = PdfReader(io.BytesIO(await file.read()))
+def _split_pdf(src, out, start_page, end_page):
+    with open(src, "rb") as f:
+        reader = PdfReader(f)
         writer = PdfWriter()
         total_pages = len(reader.pages)
         if start_page < 1 or end_page > total_pages or start_page > end_page:
             raise HTTPException(400, f"Invalid range. Document has {total_pages} pages.")
         for i in range(start_page - 1, end_page):
             writer.add_page(reader.pages[i])
-        out = io.BytesIO()
         writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=extracted_pages.pdf"})
-    except Exception as e: raise HTTPException(500, str(e))
+
+@app.post("/api/split-pdf")
+async def split_pdf(file: UploadFile = File(...), start_page: int = Form(...), end_page: int = Form(...)):
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "split-pdf", _split_pdf, src, out, start_page, end_page)
+            return tmp.send_file(out, "application/pdf", "extracted_pages.pdf")
+        except Exception as e: raise HTTPException(500, str(e))
+
+def _edit_pdf(src, out, op, *params):
+    """Clone, apply one in-memory op, write once: the body of the single-op PDF tools"""
+    with stage("parse"):
+        writer = PdfWriter(clone_from=src)
+    with stage("transform"):
+        op(writer, *params)
+    with stage("serialize"):
+        writer.write(out)
+
+def _rotate_pages(writer, rotation):
+    for page in writer.pages:
+        page.rotate(rotation)
+
+def _rotate_pdf(src, out, rotation):
+    _edit_pdf(src, out, _rotate_pages, rotation)
 
 @app.post("/api/rotate-pdf")
 async def rotate_pdf(file: UploadFile = File(...), rotation: int = Form(...)):
     if rotation not in [90, 180, 270]: raise HTTPException(400, "Rotation must be 90, 180, or 270")
-    try:
-        reader = PdfReader(io.BytesIO(await file.read()))
-        writer = PdfWriter()
-        for page in reader.pages:
-            page.rotate(rotation)
-            writer.add_page(page)
-        out = io.BytesIO()
-        writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=rotated.pdf"})
-    except Exception as e: raise HTTPException(500, str(e))
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "rotate-pdf", _rotate_pdf, src, out, rotation)
+            return tmp.send_file(out, "application/pdf", "rotated.pdf")
+        except Exception as e: raise HTTPException(500, str(e))
 
 @app.post("/api/compress-pdf")
 async def compress_pdf(file: UploadFile = File(...), quality: str = Form("medium")):
-    """Compress PDF by removing duplicate objects and optimizing streams"""
-    try:
-        reader = PdfReader(io.BytesIO(await file.read()))
-        writer = PdfWriter()
-        
-        for page in reader.pages:
-            page.compress_content_streams()
-            writer.add_page(page)
-        
-        # Set compression level based on quality
-        if quality == "high":
-            writer.add_metadata(reader.metadata)
-        
-        out = io.BytesIO()
-        writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=compressed.pdf"})
-    except Exception as e:
-        raise HTTPException(500, f"Compression failed: {str(e)}")
+    """Compress PDF by downsampling images, removing duplicate objects and optimizing streams"""
+    if quality not in COMPRESS_TIERS:
+        raise HTTPException(400, f"Unknown quality. Available: {', '.join(COMPRESS_TIERS)}")
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            report = await run_cached(tmp, "compress-pdf", _compress_pdf, src, out, quality)
+            response = tmp.send_file(out, "application/pdf", "compressed.pdf")
+            if report:
+                # Stored bytes per category before and after
+                response.headers["X-Nexus-Compression"] = json.dumps(report, separators=(",", ":"))
+            return response
+        except Exception as e:
+            raise HTTPException(500, f"Compression failed: {str(e)}")
 
-@app.post("/api/organize-pdf")
-async def organize_pdf(file: UploadFile = File(...), page_order: str = Form(...)):
-    """Reorder, delete, or duplicate pages. Format: 1,3,2,4-7"""
-    try:
-        reader = PdfReader(io.BytesIO(await file.read()))
+def _organize_pdf(src, out, page_order):
+    with open(src, "rb") as f:
+        reader = PdfReader(f)
         writer = PdfWriter()
         
         # Parse page order string
@@ -171,310 +3611,298 @@ async def organize_pdf(file: UploadFile = File(...), page_order: str = Form(...)
             if 1 <= page_num <= len(reader.pages):
                 writer.add_page(reader.pages[page_num - 1])
         
-        out = io.BytesIO()
         writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=organized.pdf"})
-    except Exception as e:
-        raise HTTPException(500, f"Organization failed: {str(e)}")
+
+@app.post("/api/organize-pdf")
+async def organize_pdf(file: UploadFile = File(...), page_order: str = Form(...)):
+    """Reorder, delete, or duplicate pages. Format: 1,3,2,4-7"""
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "organize-pdf", _organize_pdf, src, out, page_order)
+            return tmp.send_file(out, "application/pdf", "organized.pdf")
+        except Exception as e:
+            raise HTTPException(500, f"Organization failed: {str(e)}")
 
 # ==========================================
 # GROUP 2: PDF CONVERSION - NEW
 # ==========================================
 
+def _pdf_to_word(pdf_path, docx_path):
+    from pdf2docx import Converter
+    
+    # Convert
+    cv = Converter(pdf_path)
+    cv.convert(docx_path)
+    cv.close()
+
 @app.post("/api/pdf-to-word")
 async def pdf_to_word(file: UploadFile = File(...)):
     """Convert PDF to DOCX using pdf2docx"""
-    try:
-        from pdf2docx import Converter
-        
-        # Save uploaded PDF temporarily
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp_pdf:
-            tmp_pdf.write(await file.read())
-            pdf_path = tmp_pdf.name
-        
-        # Output DOCX path
-        docx_path = pdf_path.replace(".pdf", ".docx")
-        
-        # Convert
-        cv = Converter(pdf_path)
-        cv.convert(docx_path)
-        cv.close()
+    async with RequestFiles() as tmp:
+        pdf_path = await tmp.save(file, ".pdf")
+        try:
+            docx_path = tmp.new_path(".docx")
+            await run_cached(tmp, "pdf-to-word", _pdf_to_word, pdf_path, docx_path)
+            
+            return tmp.send_file(
+                docx_path,
+                "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+                "document.docx"
+            )
+        except ImportError:
+            raise HTTPException(500, "pdf2docx library not installed. Run: pip install pdf2docx")
+        except Exception as e:
+            raise HTTPException(500, f"Conversion failed: {str(e)}")
+
+def _pdf_to_ppt(pdf_path, out, progress=None):
+    from pptx import Presentation
+    from pptx.util import Inches
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    
+    # Create presentation
+    prs = Presentation()
+    prs.slide_width = Inches(10)
+    prs.slide_height = Inches(7.5)
+    
+    # Rasterize one page at a time so only the current page image is in memory
+    page_count = pdfinfo_from_path(pdf_path)["Pages"]
+    for page_num in range(1, page_count + 1):
+        img = convert_from_path(pdf_path, first_page=page_num, last_page=page_num)[0]
         
-        # Read result
-        with open(docx_path, "rb") as f:
-            docx_bytes = f.read()
+        # Add blank slide
+        blank_layout = prs.slide_layouts[6]  # Blank layout
+        slide = prs.slides.add_slide(blank_layout)
         
-        # Cleanup
-        os.remove(pdf_path)
-        os.remove(docx_path)
+        # Save image to bytes
+        img_bytes = io.BytesIO()
+        img.save(img_bytes, format='PNG')
+        img_bytes.seek(0)
         
-        return Response(
-            content=docx_bytes, 
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={"Content-Disposition": "attachment; filename=document.docx"}
-        )
-    except ImportError:
-        raise HTTPException(500, "pdf2docx library not installed. Run: pip install pdf2docx")
-    except Exception as e:
-        raise HTTPException(500, f"Conversion failed: {str(e)}")
+        # Add image to slide
+        slide.shapes.add_picture(img_bytes, 0, 0, width=prs.slide_width)
+        if progress:
+            progress(page_num, page_count)
+    
+    prs.save(out)
 
 @app.post("/api/pdf-to-ppt")
 async def pdf_to_ppt(file: UploadFile = File(...)):
     """Convert PDF pages to PowerPoint slides"""
-    try:
-        from pptx import Presentation
-        from pptx.util import Inches
-        from pdf2image import convert_from_bytes
-        
-        # Convert PDF pages to images
-        pdf_bytes = await file.read()
-        images = convert_from_bytes(pdf_bytes)
-        
-        # Create presentation
-        prs = Presentation()
-        prs.slide_width = Inches(10)
-        prs.slide_height = Inches(7.5)
-        
-        for img in images:
-            # Add blank slide
-            blank_layout = prs.slide_layouts[6]  # Blank layout
-            slide = prs.slides.add_slide(blank_layout)
-            
-            # Save image to bytes
-            img_bytes = io.BytesIO()
-            img.save(img_bytes, format='PNG')
-            img_bytes.seek(0)
+    async with RequestFiles() as tmp:
+        pdf_path = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pptx")
+            await run_cached(tmp, "pdf-to-ppt", _pdf_to_ppt, pdf_path, out)
             
-            # Add image to slide
-            slide.shapes.add_picture(img_bytes, 0, 0, width=prs.slide_width)
-        
-        # Save to bytes
-        ppt_bytes = io.BytesIO()
-        prs.save(ppt_bytes)
-        ppt_bytes.seek(0)
-        
-        return Response(
-            content=ppt_bytes.getvalue(),
-            media_type="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-            headers={"Content-Disposition": "attachment; filename=presentation.pptx"}
-        )
-    except ImportError:
-        raise HTTPException(500, "Required libraries not installed. Run: pip install python-pptx pdf2image")
-    except Exception as e:
-        raise HTTPException(500, f"Conversion failed: {str(e)}")
+            return tmp.send_file(
+                out,
+                "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                "presentation.pptx"
+            )
+        except ImportError:
+            raise HTTPException(500, "Required libraries not installed. Run: pip install python-pptx pdf2image")
+        except Exception as e:
+            raise HTTPException(500, f"Conversion failed: {str(e)}")
+
+def _pdf_to_excel(pdf_path, out):
+    import pandas as pd
+    import tabula
+    
+    # Extract tables
+    tables = tabula.read_pdf(pdf_path, pages='all', multiple_tables=True)
+    
+    if not tables:
+        raise HTTPException(400, "No tables found in PDF")
+    
+    # Save to Excel
+    with pd.ExcelWriter(out, engine='openpyxl') as writer:
+        for i, table in enumerate(tables):
+            sheet_name = f'Table_{i+1}'
+            table.to_excel(writer, sheet_name=sheet_name, index=False)
 
 @app.post("/api/pdf-to-excel")
 async def pdf_to_excel(file: UploadFile = File(...)):
     """Extract tables from PDF to Excel"""
-    try:
-        import tabula
-        
-        # Save PDF temporarily
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            tmp.write(await file.read())
-            pdf_path = tmp.name
-        
-        # Extract tables
-        tables = tabula.read_pdf(pdf_path, pages='all', multiple_tables=True)
-        
-        if not tables:
-            raise HTTPException(400, "No tables found in PDF")
-        
-        # Save to Excel
-        excel_bytes = io.BytesIO()
-        with pd.ExcelWriter(excel_bytes, engine='openpyxl') as writer:
-            for i, table in enumerate(tables):
-                sheet_name = f'Table_{i+1}'
-                table.to_excel(writer, sheet_name=sheet_name, index=False)
-        
-        os.remove(pdf_path)
-        
-        return Response(
-            content=excel_bytes.getvalue(),
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment; filename=data.xlsx"}
-        )
-    except ImportError:
-        raise HTTPException(500, "tabula-py not installed. Run: pip install tabula-py")
-    except Exception as e:
-        raise HTTPException(500, f"Extraction failed: {str(e)}")
+    async with RequestFiles() as tmp:
+        pdf_path = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".xlsx")
+            await run_cached(tmp, "pdf-to-excel", _pdf_to_excel, pdf_path, out)
+            
+            return tmp.send_file(
+                out,
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                "data.xlsx"
+            )
+        except ImportError:
+            raise HTTPException(500, "tabula-py not installed. Run: pip install tabula-py")
+        except Exception as e:
+            raise HTTPException(500, f"Extraction failed: {str(e)}")
+
+def _pdf_to_jpg(pdf_path):
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    
+    # Rasterize one page at a time; each JPG is zipped and sent as soon as it is ready
+    page_count = pdfinfo_from_path(pdf_path)["Pages"]
+    for page_num in range(1, page_count + 1):
+        img = convert_from_path(pdf_path, first_page=page_num, last_page=page_num)[0]
+        img_bytes = io.BytesIO()
+        img.save(img_bytes, format='JPEG', quality=95)
+        yield f"page_{page_num}.jpg", img_bytes.getvalue()
 
 @app.post("/api/pdf-to-jpg")
 async def pdf_to_jpg(file: UploadFile = File(...)):
     """Convert each PDF page to JPG images (returns ZIP)"""
-    try:
-        from pdf2image import convert_from_bytes
-        
-        pdf_bytes = await file.read()
-        images = convert_from_bytes(pdf_bytes)
-        
-        # Create ZIP with all images
-        zip_bytes = io.BytesIO()
-        with zipfile.ZipFile(zip_bytes, "w", zipfile.ZIP_DEFLATED) as zf:
-            for i, img in enumerate(images):
-                img_bytes = io.BytesIO()
-                img.save(img_bytes, format='JPEG', quality=95)
-                zf.writestr(f"page_{i+1}.jpg", img_bytes.getvalue())
-        
-        return Response(
-            content=zip_bytes.getvalue(),
-            media_type="application/zip",
-            headers={"Content-Disposition": "attachment; filename=pdf_images.zip"}
-        )
-    except ImportError:
-        raise HTTPException(500, "pdf2image not installed. Run: pip install pdf2image")
-    except Exception as e:
-        raise HTTPException(500, f"Conversion failed: {str(e)}")
+    async with RequestFiles() as tmp:
+        pdf_path = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".zip")
+            if cache_fetch(tmp, "pdf-to-jpg", (pdf_path,), out):
+                return tmp.send_file(out, "application/zip", "pdf_images.zip")
+            chunks = await stream_in_pool(zip_stream(_pdf_to_jpg(pdf_path)))
+            return tmp.send_stream(cache_tee(tmp, chunks), "application/zip", "pdf_images.zip")
+        except ImportError:
+            raise HTTPException(500, "pdf2image not installed. Run: pip install pdf2image")
+        except Exception as e:
+            raise HTTPException(500, f"Conversion failed: {str(e)}")
+
+def _pdf_to_pdfa(pdf_path, out):
+    import pikepdf
+    
+    # Open with pikepdf
+    with pikepdf.open(pdf_path) as pdf:
+        # Save as PDF/A
+        pdf.save(out, linearize=True)
 
 @app.post("/api/pdf-to-pdfa")
 async def pdf_to_pdfa(file: UploadFile = File(...)):
     """Convert PDF to PDF/A archival format"""
-    try:
-        import pikepdf
-        
-        pdf_bytes = await file.read()
-        
-        # Open with pikepdf
-        with pikepdf.open(io.BytesIO(pdf_bytes)) as pdf:
-            # Save as PDF/A
-            out = io.BytesIO()
-            pdf.save(out, linearize=True)
-            
-        return Response(
-            content=out.getvalue(),
-            media_type="application/pdf",
-            headers={"Content-Disposition": "attachment; filename=archive_pdfa.pdf"}
-        )
-    except ImportError:
-        raise HTTPException(500, "pikepdf not installed. Run: pip install pikepdf")
-    except Exception as e:
-        raise HTTPException(500, f"Conversion failed: {str(e)}")
+    async with RequestFiles() as tmp:
+        pdf_path = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "pdf-to-pdfa", _pdf_to_pdfa, pdf_path, out)
+            return tmp.send_file(out, "application/pdf", "archive_pdfa.pdf")
+        except ImportError:
+            raise HTTPException(500, "pikepdf not installed. Run: pip install pikepdf")
+        except Exception as e:
+            raise HTTPException(500, f"Conversion failed: {str(e)}")
 
 # ==========================================
 # GROUP 3: TO PDF CONVERSION - NEW
 # ==========================================
 
 @app.post("/api/word-to-pdf")
-async def word_to_pdf(file: UploadFile = File(...)):
+async def word_to_pdf(file: UploadFile = File(...), backend: str = Form("")):
     """Convert Word (DOC/DOCX) to PDF"""
-    return await docx_to_pdf(file)  # Reuse existing function
+    return await docx_to_pdf(file, backend)  # Reuse existing function
+
+def _ppt_to_pdf(src, out):
+    from pptx import Presentation
+    
+    # This is a simplified version - real conversion requires more complex rendering
+    prs = Presentation(src)
+    
+    # Create PDF with slide count info
+    c = canvas.Canvas(out, pagesize=letter)
+    
+    c.drawString(100, 750, f"PowerPoint Presentation - {len(prs.slides)} slides")
+    c.drawString(100, 730, "Note: Full PPT to PDF conversion requires LibreOffice/external service")
+    
+    y = 700
+    for i, slide in enumerate(prs.slides):
+        c.drawString(100, y, f"Slide {i+1}")
+        y -= 20
+        if y < 100:
+            c.showPage()
+            y = 750
+    
+    c.save()
 
 @app.post("/api/ppt-to-pdf")
 async def ppt_to_pdf(file: UploadFile = File(...)):
     """Convert PowerPoint to PDF"""
-    try:
-        from pptx import Presentation
-        
-        # This is a simplified version - real conversion requires more complex rendering
-        prs = Presentation(io.BytesIO(await file.read()))
-        
-        # Create PDF with slide count info
-        pdf_buffer = io.BytesIO()
-        c = canvas.Canvas(pdf_buffer, pagesize=letter)
-        
-        c.drawString(100, 750, f"PowerPoint Presentation - {len(prs.slides)} slides")
-        c.drawString(100, 730, "Note: Full PPT to PDF conversion requires LibreOffice/external service")
-        
-        y = 700
-        for i, slide in enumerate(prs.slides):
-            c.drawString(100, y, f"Slide {i+1}")
-            y -= 20
-            if y < 100:
-                c.showPage()
-                y = 750
-        
-        c.save()
-        
-        return Response(
-            content=pdf_buffer.getvalue(),
-            media_type="application/pdf",
-            headers={"Content-Disposition": "attachment; filename=slides.pdf"}
-        )
-    except Exception as e:
-        raise HTTPException(500, f"Conversion requires LibreOffice or external service: {str(e)}")
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file)
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "ppt-to-pdf", _ppt_to_pdf, src, out)
+            return tmp.send_file(out, "application/pdf", "slides.pdf")
+        except Exception as e:
+            raise HTTPException(500, f"Conversion requires LibreOffice or external service: {str(e)}")
 
 @app.post("/api/excel-to-pdf")
-async def excel_to_pdf(file: UploadFile = File(...)):
-    """Convert Excel to PDF"""
-    try:
-        df = pd.read_excel(io.BytesIO(await file.read()))
-        
-        # Convert to HTML then PDF
-        html = df.to_html(index=False)
-        styled_html = f"""
-        <html>
-        <head>
-            <style>
-                table {{ border-collapse: collapse; width: 100%; }}
-                th, td {{ border: 1px solid black; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-            </style>
-        </head>
-        <body>{html}</body>
-        </html>
-        """
-        
-        pdf_buffer = io.BytesIO()
-        pisa.CreatePDF(io.BytesIO(styled_html.encode("utf-8")), dest=pdf_buffer)
-        
-        return Response(
-            content=pdf_buffer.getvalue(),
-            media_type="application/pdf",
-            headers={"Content-Disposition": "attachment; filename=spreadsheet.pdf"}
-        )
-    except Exception as e:
-        raise HTTPException(500, f"Conversion failed: {str(e)}")
+async def excel_to_pdf(file: UploadFile = File(...), sheet: str = Form(ALL_SHEETS), page_size: str = Form("a4")):
+    """Every worksheet as a table, its header row repeated on each page, or only
+    the one named by sheet. Wide sheets turn landscape."""
+    if page_size not in TABLE_PAGE_SIZES:
+        raise HTTPException(400, f"page_size must be one of: {', '.join(TABLE_PAGE_SIZES)}")
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file)
+        try:
+            names = await run_tool("excel-to-pdf", _sheet_names, src)
+        except Exception:
+            raise HTTPException(400, "Not a spreadsheet the server can read")
+        if sheet != ALL_SHEETS and sheet not in names:
+            raise HTTPException(400, f"No sheet named {sheet!r}. Available: {', '.join(names)}")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "excel-to-pdf", _excel_to_pdf, src, out, sheet, page_size)
+            return tmp.send_file(out, "application/pdf", "spreadsheet.pdf")
+        except Exception as e:
+            raise HTTPException(500, f"Conversion failed: {str(e)}")
 
 class HtmlToPdfRequest(BaseModel):
     url: str
+    backend: str = ""
+
+def _html_to_pdf(url, out, backend):
+    import requests
+    
+    # Fetch webpage
+    response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    _render_html(response.text, out, "page", backend)
 
 @app.post("/api/html-to-pdf")
 async def html_to_pdf(request: HtmlToPdfRequest):
     """Convert HTML webpage to PDF"""
-    try:
-        import requests
-        
-        # Fetch webpage
-        response = requests.get(request.url, timeout=10)
-        response.raise_for_status()
-        html_content = response.text
-        
-        # Convert to PDF
-        pdf_buffer = io.BytesIO()
-        pisa.CreatePDF(io.BytesIO(html_content.encode("utf-8")), dest=pdf_buffer)
-        
-        return Response(
-            content=pdf_buffer.getvalue(),
-            media_type="application/pdf",
-            headers={"Content-Disposition": "attachment; filename=webpage.pdf"}
-        )
-    except Exception as e:
-        raise HTTPException(500, f"Web capture failed: {str(e)}")
+    backend = _html_backend(request.backend)
+    async with RequestFiles() as tmp:
+        try:
+            out = tmp.new_path(".pdf")
+            await run_tool("html-to-pdf", _html_to_pdf, request.url, out, backend)
+            return tmp.send_file(out, "application/pdf", "webpage.pdf")
+        except Exception as e:
+            raise HTTPException(500, f"Web capture failed: {str(e)}")
 
 # ==========================================
 # GROUP 4: PDF SECURITY - EXISTING + NEW
 # ==========================================
 
+def _lock_document(writer, password):
+    writer.encrypt(password)
+
+def _lock_pdf(src, out, password):
+    _edit_pdf(src, out, _lock_document, password)
+
 @app.post("/api/lock-pdf")
 async def lock_pdf(file: UploadFile = File(...), password: str = Form(...)):
     """Encrypt PDF with password"""
-    try:
-        reader = PdfReader(io.BytesIO(await file.read()))
-        writer = PdfWriter()
-        for page in reader.pages:
-            writer.add_page(page)
-        writer.encrypt(password)
-        out = io.BytesIO()
-        writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=protected.pdf"})
-    except Exception as e:
-        raise HTTPException(500, f"Encryption failed: {str(e)}")
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_tool("lock-pdf", _lock_pdf, src, out, password)
+            return tmp.send_file(out, "application/pdf", "protected.pdf")
+        except Exception as e:
+            raise HTTPException(500, f"Encryption failed: {str(e)}")
 
-@app.post("/api/unlock-pdf")
-async def unlock_pdf(file: UploadFile = File(...), password: str = Form(...)):
-    """Remove password protection from PDF"""
-    try:
-        reader = PdfReader(io.BytesIO(await file.read()), password=password)
+def _unlock_pdf(src, out, password):
+    with open(src, "rb") as f:
+        reader = PdfReader(f, password=password)
         
         if reader.is_encrypted:
             reader.decrypt(password)
@@ -483,221 +3911,216 @@ async def unlock_pdf(file: UploadFile = File(...), password: str = Form(...)):
         for page in reader.pages:
             writer.add_page(page)
         
-        out = io.BytesIO()
         writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=unlocked.pdf"})
-    except Exception as e:
-        raise HTTPException(500, f"Unlock failed - wrong password or error: {str(e)}")
+
+@app.post("/api/unlock-pdf")
+async def unlock_pdf(file: UploadFile = File(...), password: str = Form(...)):
+    """Remove password protection from PDF"""
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_tool("unlock-pdf", _unlock_pdf, src, out, password)
+            return tmp.send_file(out, "application/pdf", "unlocked.pdf")
+        except Exception as e:
+            raise HTTPException(500, f"Unlock failed - wrong password or error: {str(e)}")
+
+def _watermark_pages(writer, text):
+    apply_overlays(writer, lambda page_num, width, height: ("watermark", text.upper(), "Helvetica-Bold", 60, width, height, "center"))
+
+def _watermark_pdf(src, out, text):
+    _edit_pdf(src, out, _watermark_pages, text)
 
 @app.post("/api/watermark-pdf")
 async def watermark_pdf(file: UploadFile = File(...), text: str = Form(...)):
     """Add watermark to PDF"""
-    try:
-        packet = io.BytesIO()
-        can = canvas.Canvas(packet, pagesize=letter)
-        can.setFont("Helvetica-Bold", 60)
-        can.setFillColor(Color(0.5,0.5,0.5,0.3))
-        can.saveState()
-        can.translate(300,400)
-        can.rotate(45)
-        can.drawCentredString(0,0,text.upper())
-        can.restoreState()
-        can.save()
-        
-        packet.seek(0)
-        w_page = PdfReader(packet).pages[0]
-        reader = PdfReader(io.BytesIO(await file.read()))
-        writer = PdfWriter()
-        for p in reader.pages:
-            p.merge_page(w_page)
-            writer.add_page(p)
-        out = io.BytesIO()
-        writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=watermarked.pdf"})
-    except Exception as e:
-        raise HTTPException(500, f"Watermarking failed: {str(e)}")
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "watermark-pdf", _watermark_pdf, src, out, text)
+            return tmp.send_file(out, "application/pdf", "watermarked.pdf")
+        except Exception as e:
+            raise HTTPException(500, f"Watermarking failed: {str(e)}")
 
 @app.post("/api/redact-pdf")
-async def redact_pdf(file: UploadFile = File(...), text_to_redact: str = Form(...)):
-    """Redact sensitive text from PDF"""
-    try:
-        reader = PdfReader(io.BytesIO(await file.read()))
-        writer = PdfWriter()
-        
-        for page in reader.pages:
-            # Extract text and find positions (simplified - real redaction needs coordinates)
-            content = page.extract_text()
-            if text_to_redact.lower() in content.lower():
-                # Add redaction annotation (simplified)
-                pass
-            writer.add_page(page)
-        
-        out = io.BytesIO()
-        writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=redacted.pdf"})
-    except Exception as e:
-        raise HTTPException(500, f"Redaction failed: {str(e)}")
+async def redact_pdf(file: UploadFile = File(...), text_to_redact: str = Form(""), terms: str = Form(""),
+                     patterns: str = Form(""), case_sensitive: bool = Form(False), format: str = Form("pdf")):
+    """Black out every match of the given terms and regular expressions, removing
+    the text underneath. terms and patterns are JSON lists (or a single string).
+    format is pdf (redacted file), json (hit counts per page) or zip (both)."""
+    if format not in REDACT_FORMATS:
+        raise HTTPException(400, f"Unknown format. Available: {', '.join(REDACT_FORMATS)}")
+    term_list = ([text_to_redact] if text_to_redact else []) + _parse_redact_list(terms, "terms")
+    pattern_list = _parse_redact_list(patterns, "patterns")
+    if not term_list and not pattern_list:
+        raise HTTPException(400, "Nothing to redact: give text_to_redact, terms or patterns")
+    matcher = _redact_matcher(term_list, pattern_list, case_sensitive)
+    media_type, suffix = REDACT_FORMATS[format]
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(suffix)
+            if not cache_fetch(tmp, "redact-pdf", (src, out, term_list, pattern_list, case_sensitive), out):
+                pdf = out if format == "pdf" else tmp.new_path(".pdf")
+                report = await _redact(tmp, src, pdf, matcher, term_list + pattern_list)
+                if format == "json":
+                    await asyncio.to_thread(_write_json, out, report)
+                elif format == "zip":
+                    await asyncio.to_thread(_write_redact_zip, out, pdf, report)
+                cache_store(tmp, out)
+            return tmp.send_file(out, media_type, "redacted" + suffix)
+        except Exception as e:
+            raise HTTPException(500, f"Redaction failed: {str(e)}")
 
 # ==========================================
 # GROUP 5: PDF ADVANCED - NEW
 # ==========================================
 
+def _number_pages(writer, position):
+    apply_overlays(writer, lambda page_num, width, height: ("text", str(page_num), "Helvetica", 10, width, height, position))
+
+def _add_page_numbers(src, out, position):
+    _edit_pdf(src, out, _number_pages, position)
+
 @app.post("/api/add-page-numbers")
 async def add_page_numbers(file: UploadFile = File(...), position: str = Form("bottom-center")):
     """Add page numbers to PDF"""
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "add-page-numbers", _add_page_numbers, src, out, position)
+            return tmp.send_file(out, "application/pdf", "numbered.pdf")
+        except Exception as e:
+            raise HTTPException(500, f"Page numbering failed: {str(e)}")
+
+OCR_DPI = int(os.environ.get("NEXUS_OCR_DPI", 300))
+OCR_WORKERS = int(os.environ.get("NEXUS_OCR_WORKERS", CPU_COUNT))
+OCR_BATCH_PAGES = int(os.environ.get("NEXUS_OCR_BATCH_PAGES", OCR_WORKERS * 2))
+
+def _ocr_batches(pages):
+    """Group page numbers into runs of consecutive pages, at most OCR_BATCH_PAGES long"""
+    batch = []
+    for page_num in pages:
+        if batch and (page_num != batch[-1] + 1 or len(batch) == OCR_BATCH_PAGES):
+            yield batch[0], batch[-1]
+            batch = []
+        batch.append(page_num)
+    if batch:
+        yield batch[0], batch[-1]
+
+def _ocr_page(img):
+    import pytesseract
+    # textonly_pdf leaves the page image out: the result is just the invisible text layer
+    return pytesseract.image_to_pdf_or_hocr(img, extension="pdf", config=f"--dpi {OCR_DPI} -c textonly_pdf=1")
+
+def _ocr_pdf(pdf_path, out, progress=None):
+    import pymupdf
+    from pdf2image import convert_from_path
+    
+    doc = pymupdf.open(pdf_path)
     try:
-        reader = PdfReader(io.BytesIO(await file.read()))
-        writer = PdfWriter()
+        page_count = len(doc)
+        # Pages that already carry a text layer are kept as they are
+        pending = [page.number + 1 for page in doc if not page.get_text("text").strip()]
+        done = page_count - len(pending)
+        if progress:
+            progress(done, page_count)
         
-        for page_num, page in enumerate(reader.pages, start=1):
-            # Create page number overlay
-            packet = io.BytesIO()
-            can = canvas.Canvas(packet, pagesize=letter)
-            
-            # Position calculations
-            if "bottom" in position:
-                y = 30
-            elif "top" in position:
-                y = 750
-            else:
-                y = 400
-            
-            if "left" in position:
-                x = 50
-            elif "right" in position:
-                x = 550
-            else:
-                x = 300
-            
-            can.setFont("Helvetica", 10)
-            can.drawString(x, y, str(page_num))
-            can.save()
-            
-            packet.seek(0)
-            number_page = PdfReader(packet).pages[0]
-            page.merge_page(number_page)
-            writer.add_page(page)
+        with ThreadPoolExecutor(OCR_WORKERS) as ocr_pool:
+            for first, last in _ocr_batches(pending):
+                # Rasterize one batch at a time so memory is bounded by batch size
+                images = convert_from_path(pdf_path, dpi=OCR_DPI, first_page=first, last_page=last,
+                                           thread_count=min(OCR_WORKERS, last - first + 1))
+                for page_num, layer_pdf in zip(range(first, last + 1), ocr_pool.map(_ocr_page, images)):
+                    page = doc[page_num - 1]
+                    with pymupdf.open("pdf", layer_pdf) as layer:
+                        # The layer matches the rendered (rotated) page; map it back onto the unrotated page
+                        page.show_pdf_page(page.rect * page.derotation_matrix, layer, 0, rotate=page.rotation)
+                done += len(images)
+                del images
+                if progress:
+                    progress(done, page_count)
         
-        out = io.BytesIO()
-        writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=numbered.pdf"})
-    except Exception as e:
-        raise HTTPException(500, f"Page numbering failed: {str(e)}")
+        doc.save(out, garbage=3, deflate=True)
+    finally:
+        doc.close()
 
 @app.post("/api/ocr-pdf")
 async def ocr_pdf(file: UploadFile = File(...)):
     """Perform OCR on scanned PDF to make it searchable"""
-    try:
-        import pytesseract
-        from pdf2image import convert_from_bytes
-        from reportlab.lib.pagesizes import letter
-        
-        # Convert PDF to images
-        pdf_bytes = await file.read()
-        images = convert_from_bytes(pdf_bytes)
-        
-        # Create new PDF with OCR text
-        pdf_buffer = io.BytesIO()
-        c = canvas.Canvas(pdf_buffer, pagesize=letter)
-        
-        for img in images:
-            # Perform OCR
-            text = pytesseract.image_to_string(img)
-            
-            # Add text to PDF (simplified - real OCR PDF embeds invisible text)
-            c.setFont("Helvetica", 10)
-            y = 750
-            for line in text.split('\n'):
-                if line.strip():
-                    c.drawString(50, y, line[:100])  # Limit line length
-                    y -= 15
-                    if y < 50:
-                        break
-            c.showPage()
-        
-        c.save()
-        return Response(content=pdf_buffer.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=ocr_result.pdf"})
-    except ImportError:
-        raise HTTPException(500, "OCR libraries not installed. Run: pip install pytesseract pdf2image")
-    except Exception as e:
-        raise HTTPException(500, f"OCR failed: {str(e)}")
+    async with RequestFiles() as tmp:
+        pdf_path = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "ocr-pdf", _ocr_pdf, pdf_path, out)
+            return tmp.send_file(out, "application/pdf", "ocr_result.pdf")
+        except ImportError:
+            raise HTTPException(500, "OCR libraries not installed. Run: pip install pytesseract pdf2image pymupdf")
+        except Exception as e:
+            raise HTTPException(500, f"OCR failed: {str(e)}")
 
 @app.post("/api/compare-pdf")
-async def compare_pdf(file1: UploadFile = File(...), file2: UploadFile = File(...)):
-    """Compare two PDFs and highlight differences"""
-    try:
-        reader1 = PdfReader(io.BytesIO(await file1.read()))
-        reader2 = PdfReader(io.BytesIO(await file2.read()))
-        
-        # Create comparison report
-        pdf_buffer = io.BytesIO()
-        c = canvas.Canvas(pdf_buffer, pagesize=letter)
-        
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(100, 750, "PDF Comparison Report")
-        
-        c.setFont("Helvetica", 12)
-        c.drawString(100, 720, f"File 1: {file1.filename} - {len(reader1.pages)} pages")
-        c.drawString(100, 700, f"File 2: {file2.filename} - {len(reader2.pages)} pages")
-        
-        y = 670
-        for i in range(min(len(reader1.pages), len(reader2.pages))):
-            text1 = reader1.pages[i].extract_text()
-            text2 = reader2.pages[i].extract_text()
-            
-            if text1 != text2:
-                c.drawString(100, y, f"Page {i+1}: DIFFERENT")
-                y -= 20
-            else:
-                c.drawString(100, y, f"Page {i+1}: Same")
-                y -= 20
-            
-            if y < 100:
-                c.showPage()
-                y = 750
+async def compare_pdf(file1: UploadFile = File(...), file2: UploadFile = File(...), format: str = Form("pdf")):
+    """Compare two PDFs: pages are aligned, and changed pages get word-level diffs.
+    format is pdf (highlighted report), json (machine-readable diff) or zip (both)."""
+    if format not in COMPARE_FORMATS:
+        raise HTTPException(400, f"Unknown format. Available: {', '.join(COMPARE_FORMATS)}")
+    media_type, suffix = COMPARE_FORMATS[format]
+    async with RequestFiles() as tmp:
+        src1 = await tmp.save(file1, ".pdf")
+        src2 = await tmp.save(file2, ".pdf")
+        try:
+            out = tmp.new_path(suffix)
+            if not cache_fetch(tmp, "compare-pdf", (src1, src2, out, file1.filename, file2.filename), out):
+                diff, highlights = await _compare(src1, src2, file1.filename, file2.filename)
+                if format == "json":
+                    await asyncio.to_thread(_write_json, out, diff)
+                else:
+                    report = out if format == "pdf" else tmp.new_path(".pdf")
+                    await run_tool("compare-pdf", _compare_report, src1, src2, report, diff, highlights)
+                    if format == "zip":
+                        await asyncio.to_thread(_write_compare_zip, out, report, diff)
+                cache_store(tmp, out)
+            return tmp.send_file(out, media_type, "comparison" + suffix)
+        except Exception as e:
+            raise HTTPException(500, f"Comparison failed: {str(e)}")
+
+def _crop_pages(writer, margin):
+    for page in writer.pages:
+        # Get current mediabox
+        mediabox = page.mediabox
         
-        c.save()
-        return Response(content=pdf_buffer.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=comparison.pdf"})
-    except Exception as e:
-        raise HTTPException(500, f"Comparison failed: {str(e)}")
+        # Crop by margin
+        page.mediabox.lower_left = (
+            mediabox.left + margin,
+            mediabox.bottom + margin
+        )
+        page.mediabox.upper_right = (
+            mediabox.right - margin,
+            mediabox.top - margin
+        )
+
+def _crop_pdf(src, out, margin):
+    _edit_pdf(src, out, _crop_pages, margin)
 
 @app.post("/api/crop-pdf")
 async def crop_pdf(file: UploadFile = File(...), margin: int = Form(50)):
     """Crop PDF pages by specified margin"""
-    try:
-        reader = PdfReader(io.BytesIO(await file.read()))
-        writer = PdfWriter()
-        
-        for page in reader.pages:
-            # Get current mediabox
-            mediabox = page.mediabox
-            
-            # Crop by margin
-            page.mediabox.lower_left = (
-                mediabox.left + margin,
-                mediabox.bottom + margin
-            )
-            page.mediabox.upper_right = (
-                mediabox.right - margin,
-                mediabox.top - margin
-            )
-            
-            writer.add_page(page)
-        
-        out = io.BytesIO()
-        writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=cropped.pdf"})
-    except Exception as e:
-        raise HTTPException(500, f"Cropping failed: {str(e)}")
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "crop-pdf", _crop_pdf, src, out, margin)
+            return tmp.send_file(out, "application/pdf", "cropped.pdf")
+        except Exception as e:
+            raise HTTPException(500, f"Cropping failed: {str(e)}")
 
-@app.post("/api/repair-pdf")
-async def repair_pdf(file: UploadFile = File(...)):
-    """Attempt to repair corrupted PDF"""
-    try:
-        pdf_bytes = await file.read()
-        
+def _repair_pdf(src, out):
+    with open(src, "rb") as f:
         # Try to read with strict=False to be more forgiving
-        reader = PdfReader(io.BytesIO(pdf_bytes), strict=False)
+        reader = PdfReader(f, strict=False)
         writer = PdfWriter()
         
         # Copy all readable pages
@@ -713,124 +4136,223 @@ async def repair_pdf(file: UploadFile = File(...)):
             '/Title': 'Repaired Document'
         })
         
-        out = io.BytesIO()
         writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=repaired.pdf"})
-    except Exception as e:
-        raise HTTPException(500, f"Repair failed - file may be too damaged: {str(e)}")
+
+@app.post("/api/repair-pdf")
+async def repair_pdf(file: UploadFile = File(...)):
+    """Attempt to repair corrupted PDF"""
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "repair-pdf", _repair_pdf, src, out)
+            return tmp.send_file(out, "application/pdf", "repaired.pdf")
+        except Exception as e:
+            raise HTTPException(500, f"Repair failed - file may be too damaged: {str(e)}")
 
 @app.post("/api/extract-text")
-async def extract_text(file: UploadFile = File(...)):
-    """Extract text from PDF"""
-    try:
-        reader = PdfReader(io.BytesIO(await file.read()))
-        text = "\n".join([p.extract_text() for p in reader.pages])
-        return Response(content=text, media_type="text/plain", headers={"Content-Disposition": "attachment; filename=text.txt"})
-    except Exception as e:
-        raise HTTPException(500, str(e))
+async def extract_text(file: UploadFile = File(...), backend: str = Form("pymupdf"), pages: str = Form(""), format: str = Form("text")):
+    """Extract text from PDF, streamed page by page as batches finish"""
+    if backend not in TEXT_BACKENDS:
+        raise HTTPException(400, f"Unknown backend. Available: {', '.join(TEXT_BACKENDS)}")
+    if format not in TEXT_FORMATS:
+        raise HTTPException(400, f"Unknown format. Available: {', '.join(TEXT_FORMATS)}")
+    ranges = _parse_page_ranges(pages)
+    media_type, suffix = TEXT_FORMATS[format]
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        out = tmp.new_path(suffix)
+        if cache_fetch(tmp, "extract-text", (src, backend, pages, format), out):
+            return tmp.send_file(out, media_type, "text" + suffix)
+        try:
+            total = await run_tool("extract-text", _pdf_page_count, src)
+        except Exception as e:
+            raise HTTPException(500, str(e))
+        selected = _select_pages(ranges, total)
+        METRICS.inc("nexus_tool_pages_total", (("tool", "extract-text"),), len(selected))
+        try:
+            chunks = await _primed(_text_chunks(src, backend, selected, format))
+        except ImportError:
+            raise HTTPException(500, "pdfplumber not installed. Run: pip install pdfplumber")
+        except Exception as e:
+            raise HTTPException(500, str(e))
+        return tmp.send_stream(cache_tee(tmp, chunks), media_type, "text" + suffix)
+
+def _set_metadata(writer, title, author):
+    writer.add_metadata({'/Title': title, '/Author': author})
+
+def _edit_metadata(src, out, title, author):
+    _edit_pdf(src, out, _set_metadata, title, author)
 
 @app.post("/api/edit-pdf-metadata")
 async def edit_metadata(file: UploadFile = File(...), title: str = Form(""), author: str = Form("")):
     """Edit PDF metadata"""
-    try:
-        reader = PdfReader(io.BytesIO(await file.read()))
-        writer = PdfWriter()
-        for p in reader.pages:
-            writer.add_page(p)
-        writer.add_metadata({'/Title': title, '/Author': author})
-        out = io.BytesIO()
-        writer.write(out)
-        return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=meta.pdf"})
-    except Exception as e:
-        raise HTTPException(500, str(e))
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            await run_cached(tmp, "edit-pdf-metadata", _edit_metadata, src, out, title, author)
+            return tmp.send_file(out, "application/pdf", "meta.pdf")
+        except Exception as e:
+            raise HTTPException(500, str(e))
 
 # ==========================================
 # GROUP 6: IMAGE TOOLS - EXISTING
 # ==========================================
 
-@app.post("/api/convert-format")
-async def convert_format(file: UploadFile = File(...), target_format: str = Form(...)):
-    img = Image.open(io.BytesIO(await file.read()))
+def _convert_format(src, out, target_format):
+    img = Image.open(src)
     if target_format.upper() == "JPEG" and img.mode in ("RGBA", "P"):
         img = img.convert("RGB")
-    out = io.BytesIO()
     img.save(out, format=target_format)
-    return Response(content=out.getvalue(), media_type=f"image/{target_format.lower()}", headers={"Content-Disposition": f"attachment; filename=converted.{target_format.lower()}"})
+
+@app.post("/api/convert-format")
+async def convert_format(file: UploadFile = File(...), target_format: str = Form(...)):
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file)
+        out = tmp.new_path()
+        await run_cached(tmp, "convert-format", _convert_format, src, out, target_format)
+        return tmp.send_file(out, f"image/{target_format.lower()}", f"converted.{target_format.lower()}")
 
 @app.post("/api/resize-image")
-async def resize_image(file: UploadFile = File(...), width: int = Form(...), height: int = Form(...)):
-    img = Image.open(io.BytesIO(await file.read())).resize((width, height), Image.Resampling.LANCZOS)
-    out = io.BytesIO()
-    img.save(out, format=img.format or 'PNG')
-    return Response(content=out.getvalue(), media_type="image/png", headers={"Content-Disposition": "attachment; filename=resized.png"})
+async def resize_image(file: UploadFile = File(...), width: int = Form(0), height: int = Form(0), mode: str = Form("exact"),
+                       format: str = Form("auto"), quality: int = Form(85), sizes: str = Form("")):
+    """Resize to width x height; a side left at 0 follows the aspect ratio. sizes
+    ("1600x1200,800,x300") returns a zip of renditions made from one decode."""
+    if format != "auto" and format not in RESIZE_FORMATS:
+        raise HTTPException(400, f"Unknown format. Available: auto, {', '.join(RESIZE_FORMATS)}")
+    if not 1 <= quality <= 100:
+        raise HTTPException(400, "quality must be between 1 and 100")
+    targets = _parse_sizes(sizes) if sizes else [(width, height)]
+    for target in targets:
+        _check_resize(*target, mode)
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file)
+        try:
+            output = _resize_format(format, await run_tool("resize-image", _image_format, src))
+        except Exception:
+            raise HTTPException(400, "Not an image format the server can read")
+        try:
+            if sizes:
+                out = tmp.new_path(".zip")
+                await run_cached(tmp, "resize-image", _resize_image_set, src, out, targets, mode, quality, format)
+                return tmp.send_file(out, "application/zip", "resized.zip")
+            out = tmp.new_path(_image_suffix(output))
+            await run_cached(tmp, "resize-image", _resize_image, src, out, width, height, mode, quality, format)
+        except Exception as e:
+            raise HTTPException(500, f"Resize failed: {str(e)}")
+        return tmp.send_file(out, Image.MIME.get(output, "application/octet-stream"), "resized" + _image_suffix(output))
 
 @app.post("/api/clean-metadata")
-async def clean_metadata(file: UploadFile = File(...)):
-    img = Image.open(io.BytesIO(await file.read()))
-    data = list(img.getdata())
-    clean = Image.new(img.mode, img.size)
-    clean.putdata(data)
-    out = io.BytesIO()
-    clean.save(out, format=img.format or 'PNG')
-    return Response(content=out.getvalue(), media_type="image/png", headers={"Content-Disposition": "attachment; filename=clean.png"})
+async def clean_metadata(file: UploadFile = File(...), keep_icc: bool = Form(False)):
+    """Strip EXIF, XMP, IPTC, ICC profiles and comments, keeping the image's format.
+    JPEG, PNG and WebP are rewritten segment by segment without decoding pixels."""
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file)
+        try:
+            format = await run_tool("clean-metadata", _image_format, src)
+        except Exception:
+            raise HTTPException(400, "Not an image format the server can read")
+        out = tmp.new_path(_image_suffix(format))
+        try:
+            await run_cached(tmp, "clean-metadata", _clean_metadata, src, out, keep_icc)
+        except Exception as e:
+            raise HTTPException(500, f"Metadata removal failed: {str(e)}")
+        return tmp.send_file(out, Image.MIME.get(format, "application/octet-stream"), "clean" + _image_suffix(format))
 
 # ==========================================
 # GROUP 7: MEDIA TOOLS - EXISTING
 # ==========================================
 
-@app.post("/api/extract-audio")
-async def extract_audio(file: UploadFile = File(...)):
-    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as t:
-        t.write(await file.read())
-        tname = t.name
+async def _probe(src, tool):
     try:
-        clip = VideoFileClip(tname)
-        clip.audio.write_audiofile(tname+".mp3", logger=None)
-        clip.close()
-        with open(tname+".mp3", "rb") as f:
-            return Response(content=f.read(), media_type="audio/mpeg", headers={"Content-Disposition": "attachment; filename=audio.mp3"})
-    finally:
+        return await run_tool(tool, _probe_media, src)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    except Exception as e:
+        raise HTTPException(500, str(e))
+
+@app.post("/api/extract-audio")
+async def extract_audio(file: UploadFile = File(...), format: str = Form("mp3")):
+    """Extract the audio track. It is copied without re-encoding when the source
+    codec fits the format; auto picks whichever format that is."""
+    if format != "auto" and format not in AUDIO_FORMATS:
+        raise HTTPException(400, f"Unknown format. Available: auto, {', '.join(AUDIO_FORMATS)}")
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file)
+        media = await _probe(src, "extract-audio")
+        if not media["audio"]:
+            raise HTTPException(400, "The file has no audio track")
+        target, copy = _audio_target(media["audio"], format)
+        _, suffix, media_type, _ = AUDIO_FORMATS[target]
+        out = tmp.new_path(suffix)
+        if cache_fetch(tmp, "extract-audio", (src, target), out):
+            return tmp.send_file(out, media_type, "audio" + suffix)
         try:
-            os.remove(tname)
-            os.remove(tname+".mp3")
-        except:
-            pass
+            chunks = await stream_in_pool(_ffmpeg_stream(_audio_args(src, target, copy)))
+        except Exception as e:
+            raise HTTPException(500, f"Audio extraction failed: {str(e)}")
+        return tmp.send_stream(cache_tee(tmp, chunks), media_type, "audio" + suffix)
 
 @app.post("/api/video-to-gif")
-async def video_to_gif(file: UploadFile = File(...), start_time: int = Form(0), end_time: int = Form(5)):
-    with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as t:
-        t.write(await file.read())
-        tname = t.name
-    try:
-        clip = VideoFileClip(tname).subclip(start_time, end_time)
-        clip.write_gif(tname+".gif", fps=10, program='ffmpeg', logger=None)
-        clip.close()
-        with open(tname+".gif", "rb") as f:
-            return Response(content=f.read(), media_type="image/gif", headers={"Content-Disposition": "attachment; filename=clip.gif"})
-    finally:
+async def video_to_gif(file: UploadFile = File(...), start_time: float = Form(0), end_time: float = Form(5),
+                       fps: int = Form(10), width: int = Form(0)):
+    """Animated GIF of a clip. width 0 keeps the video's width."""
+    if start_time < 0 or end_time <= start_time:
+        raise HTTPException(400, "end_time must be after start_time")
+    if not 1 <= fps <= GIF_MAX_FPS:
+        raise HTTPException(400, f"fps must be between 1 and {GIF_MAX_FPS}")
+    if width < 0:
+        raise HTTPException(400, "width must be positive, or 0 to keep the video's width")
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file)
+        out = tmp.new_path(".gif")
+        if cache_fetch(tmp, "video-to-gif", (src, start_time, end_time, fps, width), out):
+            return tmp.send_file(out, "image/gif", "clip.gif")
+        media = await _probe(src, "video-to-gif")
+        if not media["video"]:
+            raise HTTPException(400, "The file has no video track")
+        if media["duration"] is not None and start_time >= media["duration"]:
+            raise HTTPException(400, f"start_time is past the end of the video ({media['duration']:.1f}s)")
         try:
-            os.remove(tname)
-            os.remove(tname+".gif")
-        except:
-            pass
+            chunks = await stream_in_pool(_ffmpeg_stream(_gif_args(src, start_time, end_time, fps, width)))
+        except Exception as e:
+            raise HTTPException(500, f"GIF conversion failed: {str(e)}")
+        return tmp.send_stream(cache_tee(tmp, chunks), "image/gif", "clip.gif")
 
 # ==========================================
 # GROUP 8: DOCUMENT TOOLS - EXISTING
 # ==========================================
 
+def _docx_to_pdf(src, out, backend):
+    import mammoth
+    with open(src, "rb") as f:
+        html = mammoth.convert_to_html(f).value
+    _render_html(f"<html><body>{html}</body></html>", out, "document", backend)
+
 @app.post("/api/docx-to-pdf")
-async def docx_to_pdf(file: UploadFile = File(...)):
-    html = mammoth.convert_to_html(io.BytesIO(await file.read())).value
-    out = io.BytesIO()
-    pisa.CreatePDF(io.BytesIO(f"<html><style>body{{font-family:Helvetica}}</style><body>{html}</body></html>".encode("utf-8")), dest=out)
-    return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=doc.pdf"})
+async def docx_to_pdf(file: UploadFile = File(...), backend: str = Form("")):
+    backend = _html_backend(backend)
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".docx")
+        out = tmp.new_path(".pdf")
+        await run_cached(tmp, "docx-to-pdf", _docx_to_pdf, src, out, backend)
+        return tmp.send_file(out, "application/pdf", "doc.pdf")
+
+def _md_to_pdf(src, out, backend):
+    import markdown
+    with open(src, encoding="utf-8") as f:
+        html = markdown.markdown(f.read(), extensions=['extra', 'codehilite'])
+    _render_html(f"<html><body>{html}</body></html>", out, "markdown", backend)
 
 @app.post("/api/md-to-pdf")
-async def md_to_pdf(file: UploadFile = File(...)):
-    html = markdown.markdown((await file.read()).decode("utf-8"), extensions=['extra', 'codehilite'])
-    out = io.BytesIO()
-    pisa.CreatePDF(io.BytesIO(f"<html><body>{html}</body></html>".encode("utf-8")), dest=out)
-    return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=markdown.pdf"})
+async def md_to_pdf(file: UploadFile = File(...), backend: str = Form("")):
+    backend = _html_backend(backend)
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file)
+        out = tmp.new_path(".pdf")
+        await run_cached(tmp, "md-to-pdf", _md_to_pdf, src, out, backend)
+        return tmp.send_file(out, "application/pdf", "markdown.pdf")
 
 # ==========================================
 # GROUP 9: OFFICE SUITE - EXISTING
@@ -838,74 +4360,622 @@ async def md_to_pdf(file: UploadFile = File(...)):
 
 @app.post("/api/csv-to-excel")
 async def csv_to_excel(file: UploadFile = File(...)):
-    out = io.BytesIO()
-    with pd.ExcelWriter(out, engine='openpyxl') as w:
-        pd.read_csv(io.BytesIO(await file.read())).to_excel(w, index=False)
-    return Response(content=out.getvalue(), media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers={"Content-Disposition": "attachment; filename=data.xlsx"})
+    """CSV to XLSX, streamed through in chunks. Rows past Excel's 1,048,576-row
+    limit continue on further sheets."""
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".csv")
+        out = tmp.new_path(".xlsx")
+        await run_cached(tmp, "csv-to-excel", _csv_to_excel, src, out)
+        return tmp.send_file(out, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "data.xlsx")
 
 @app.post("/api/excel-to-csv")
-async def excel_to_csv(file: UploadFile = File(...)):
-    out = io.BytesIO()
-    pd.read_excel(io.BytesIO(await file.read())).to_csv(out, index=False)
-    return Response(content=out.getvalue(), media_type="text/csv", headers={"Content-Disposition": "attachment; filename=data.csv"})
+async def excel_to_csv(file: UploadFile = File(...), sheet: str = Form("")):
+    """The first worksheet as CSV, or the one named by sheet. sheet "*" returns
+    every worksheet as a zip of CSVs."""
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file)
+        try:
+            names = await run_tool("excel-to-csv", _sheet_names, src)
+        except Exception:
+            raise HTTPException(400, "Not a spreadsheet the server can read")
+        if sheet == ALL_SHEETS:
+            out = tmp.new_path(".zip")
+            if not cache_fetch(tmp, "excel-to-csv", (src, out, sheet), out):
+                await _excel_to_csv_zip(tmp, src, out)
+                cache_store(tmp, out)
+            return tmp.send_file(out, "application/zip", "sheets.zip")
+        if sheet and sheet not in names:
+            raise HTTPException(400, f"No sheet named {sheet!r}. Available: {', '.join(names)}")
+        out = tmp.new_path(".csv")
+        await run_cached(tmp, "excel-to-csv", _excel_to_csv, src, out, sheet or None)
+        return tmp.send_file(out, "text/csv", "data.csv")
 
 @app.post("/api/create-zip")
 async def create_zip(files: List[UploadFile] = File(...)):
-    out = io.BytesIO()
-    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as z:
-        for f in files:
-            z.writestr(f.filename, await f.read())
-    return Response(content=out.getvalue(), media_type="application/zip", headers={"Content-Disposition": "attachment; filename=archive.zip"})
+    async with RequestFiles() as tmp:
+        entries = [(f.filename, await tmp.save(f)) for f in files]
+        out = tmp.new_path(".zip")
+        if cache_fetch(tmp, "create-zip", entries, out):
+            return tmp.send_file(out, "application/zip", "archive.zip")
+        chunks = await stream_in_pool(zip_stream(entries))
+        return tmp.send_stream(cache_tee(tmp, chunks), "application/zip", "archive.zip")
 
 # ==========================================
 # GROUP 10: UTILITIES - EXISTING
 # ==========================================
 
-@app.post("/api/epub-to-text")
-async def epub_to_text(file: UploadFile = File(...)):
-    with tempfile.NamedTemporaryFile(suffix=".epub", delete=False) as t:
-        t.write(await file.read())
-        tname = t.name
+def _epub_to_text(tname):
+    import ebooklib
+    from ebooklib import epub
+    from bs4 import BeautifulSoup
     
     book = epub.read_epub(tname)
-    full_text = []
+    first = True
     
+    # Each chapter is sent as soon as it is parsed
     for item in book.get_items():
         if item.get_type() == ebooklib.ITEM_DOCUMENT:
             soup = BeautifulSoup(item.get_content(), 'html.parser')
-            full_text.append(soup.get_text())
-    
-    os.remove(tname)
-    return Response(content="\n".join(full_text), media_type="text/plain", headers={"Content-Disposition": "attachment; filename=book.txt"})
+            yield ("" if first else "\n") + soup.get_text()
+            first = False
+
+@app.post("/api/epub-to-text")
+async def epub_to_text(file: UploadFile = File(...)):
+    async with RequestFiles() as tmp:
+        tname = await tmp.save(file, ".epub")
+        out = tmp.new_path(".txt")
+        if cache_fetch(tmp, "epub-to-text", (tname,), out):
+            return tmp.send_file(out, "text/plain", "book.txt")
+        chunks = await stream_in_pool(_epub_to_text(tname))
+        return tmp.send_stream(cache_tee(tmp, chunks), "text/plain", "book.txt")
 
 @app.post("/api/code-to-pdf")
-async def code_to_pdf(file: UploadFile = File(...)):
-    code = (await file.read()).decode("utf-8")
-    try:
-        lexer = get_lexer_for_filename(file.filename)
-    except:
-        lexer = PythonLexer()
-    
-    formatter = HtmlFormatter(style='colorful', full=True, linenos=True)
-    html_content = highlight(code, lexer, formatter)
-    
-    out = io.BytesIO()
-    pisa.CreatePDF(io.BytesIO(html_content.encode("utf-8")), dest=out)
-    return Response(content=out.getvalue(), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=code.pdf"})
+async def code_to_pdf(files: List[UploadFile] = File(None), file: UploadFile = File(None), backend: str = Form("")):
+    """Source files, or zips of a whole tree, as one PDF with a bookmark per file
+    and contents pages when there is more than one. file takes a single upload."""
+    backend = _html_backend(backend)
+    uploads = (files or []) + ([file] if file else [])
+    if not uploads: raise HTTPException(400, "No files uploaded")
+    async with RequestFiles() as tmp:
+        saved = [(f.filename or "source", await tmp.save(f)) for f in uploads]
+        out = tmp.new_path(".pdf")
+        if not cache_fetch(tmp, "code-to-pdf", (saved, out, backend), out):
+            sources = await asyncio.to_thread(_code_sources, tmp, saved)
+            if not sources:
+                raise HTTPException(400, "No source files in the upload")
+            try:
+                await _code_to_pdf(tmp, sources, out, backend)
+            except Exception as e:
+                raise HTTPException(500, f"Conversion failed: {str(e)}")
+            cache_store(tmp, out)
+        return tmp.send_file(out, "application/pdf", "code.pdf")
+
+def _file_hash(src):
+    md5 = hashlib.md5()
+    with open(src, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK):
+            md5.update(chunk)
+    return os.path.getsize(src), md5.hexdigest()
+
+PAGES_NOT_COUNTED.add(_file_hash)
 
 @app.post("/api/file-hash")
 async def file_hash(file: UploadFile = File(...)):
-    content = await file.read()
-    md5 = hashlib.md5(content).hexdigest()
-    sha256 = hashlib.sha256(content).hexdigest()
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file)
+        # SHA-256 was already taken while the upload was spooled
+        sha256 = tmp.digests[src]
+        size, md5 = await run_tool("file-hash", _file_hash, src)
     
-    report = f"--- FILE INTEGRITY REPORT ---\nFilename: {file.filename}\nSize: {len(content)} bytes\n\nMD5:\n{md5}\n\nSHA-256:\n{sha256}"
+    report = f"--- FILE INTEGRITY REPORT ---\nFilename: {file.filename}\nSize: {size} bytes\n\nMD5:\n{md5}\n\nSHA-256:\n{sha256}"
     return Response(content=report, media_type="text/plain", headers={"Content-Disposition": "attachment; filename=hash_report.txt"})
 
+# ==========================================
+# GROUP 11: BACKGROUND JOBS - NEW
+# ==========================================
+
+JOBS_DIR = os.environ.get("NEXUS_JOBS_DIR") or os.path.join(UPLOAD_DIR, "nexus-jobs")
+JOBS_DB = os.path.join(JOBS_DIR, "jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("NEXUS_JOB_WORKERS", 2))
+JOB_RETENTION = int(os.environ.get("NEXUS_JOB_RETENTION", 24 * 3600))
+# Seconds a worker waits after a failed claim or purge before trying again
+JOB_RETRY_DELAY = 1.0
+
+# Jobs at or below this size default to the interactive priority so they are not queued behind bulk work
+JOB_SMALL_BYTES = int(os.environ.get("NEXUS_JOB_SMALL_BYTES", 5 * MB))
+PRIORITY_INTERACTIVE = 10
+PRIORITY_BULK = 0
+
+# tool -> (function, input suffix, output suffix, media type, download name, [(form field, type, default)])
+JOB_TOOLS = {
+    "ocr-pdf": (_ocr_pdf, ".pdf", ".pdf", "application/pdf", "ocr_result.pdf", []),
+    "pdf-to-word": (_pdf_to_word, ".pdf", ".docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document", "document.docx", []),
+    "pdf-to-excel": (_pdf_to_excel, ".pdf", ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "data.xlsx", []),
+    "pdf-to-ppt": (_pdf_to_ppt, ".pdf", ".pptx", "application/vnd.openxmlformats-officedocument.presentationml.presentation", "presentation.pptx", []),
+    "video-to-gif": (_video_to_gif, ".mp4", ".gif", "image/gif", "clip.gif",
+                     [("start_time", float, 0), ("end_time", float, 5), ("fps", int, 10), ("width", int, 0)]),
+}
+
+# Tools that accept a progress(done, total) callback
+JOB_PROGRESS_TOOLS = {"ocr-pdf", "pdf-to-ppt"}
+
+class JobCancelled(Exception):
+    pass
+
+def _jobs_db():
+    conn = sqlite3.connect(JOBS_DB, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+def _init_jobs_db():
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    with closing(_jobs_db()) as db:
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            tool TEXT NOT NULL,
+            status TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            params TEXT NOT NULL,
+            input TEXT NOT NULL,
+            digest TEXT NOT NULL,
+            output TEXT,
+            no_cache INTEGER NOT NULL DEFAULT 0,
+            progress_done INTEGER NOT NULL DEFAULT 0,
+            progress_total INTEGER NOT NULL DEFAULT 0,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            worker_pid INTEGER,
+            created REAL NOT NULL,
+            started REAL,
+            finished REAL)""")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created)")
+        # Requeue jobs whose worker process died mid-run
+        for row in db.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall():
+            if not _pid_alive(row["worker_pid"]):
+                db.execute("UPDATE jobs SET status = 'queued', worker_pid = NULL WHERE id = ?", (row["id"],))
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except (OSError, TypeError):
+        return False
+
+class JobProgress:
+    """Picklable progress callback handed to tools running a job. It records
+    page progress and raises JobCancelled once cancellation is requested."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def __call__(self, done, total):
+        with closing(_jobs_db()) as db:
+            db.execute("UPDATE jobs SET progress_done = ?, progress_total = ? WHERE id = ?", (done, total, self.job_id))
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.job_id,)).fetchone()
+        if row and row["cancel_requested"]:
+            raise JobCancelled()
+
+def _claim_job():
+    """Atomically move the highest priority queued job to running"""
+    with closing(_jobs_db()) as db:
+        db.execute("BEGIN IMMEDIATE")
+        row = db.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created LIMIT 1").fetchone()
+        if row:
+            db.execute("UPDATE jobs SET status = 'running', started = ?, worker_pid = ? WHERE id = ?", (time.time(), os.getpid(), row["id"]))
+        db.execute("COMMIT")
+        return row
+
+def _finish_job(job_id, status, error=None, output=None):
+    with closing(_jobs_db()) as db:
+        db.execute("UPDATE jobs SET status = ?, error = ?, output = ?, finished = ? WHERE id = ?", (status, error, output, time.time(), job_id))
+
+def _purge_jobs():
+    cutoff = time.time() - JOB_RETENTION
+    with closing(_jobs_db()) as db:
+        expired = db.execute("SELECT id FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished < ?", (cutoff,)).fetchall()
+        for row in expired:
+            shutil.rmtree(os.path.join(JOBS_DIR, row["id"]), ignore_errors=True)
+            db.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+
+async def _run_job(job):
+    fn, _, out_suffix, _, _, fields = JOB_TOOLS[job["tool"]]
+    params = json.loads(job["params"])
+    out = os.path.join(JOBS_DIR, job["id"], "output" + out_suffix)
+    kwargs = {"progress": JobProgress(job["id"])} if job["tool"] in JOB_PROGRESS_TOOLS else {}
+
+    # The job directory stands in for a request's files so the result cache is shared with the endpoints
+    files = RequestFiles()
+    files.paths = [job["input"], out]
+    files.digests = {job["input"]: job["digest"]}
+    cache_bypass.set(bool(job["no_cache"]))
+    try:
+        await run_cached(files, job["tool"], fn, job["input"], out, *[params[name] for name, _, _ in fields], **kwargs)
+    except JobCancelled:
+        _finish_job(job["id"], "cancelled")
+        return
+    except Exception as e:
+        _finish_job(job["id"], "failed", error=str(e))
+        return
+    with closing(_jobs_db()) as db:
+        cancelled = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job["id"],)).fetchone()["cancel_requested"]
+    if cancelled:
+        _finish_job(job["id"], "cancelled")
+    else:
+        _finish_job(job["id"], "done", output=out)
+
+_job_wakeup = asyncio.Event()
+_job_tasks = []
+
+async def _job_worker():
+    purge_every = 60
+    last_purge = 0
+    while True:
+        try:
+            if time.time() - last_purge > purge_every:
+                await asyncio.to_thread(_purge_jobs)
+                last_purge = time.time()
+            job = await asyncio.to_thread(_claim_job)
+            if job is None:
+                # Other worker processes share the queue, so poll as well as waiting for a local submit
+                _job_wakeup.clear()
+                try:
+                    await asyncio.wait_for(_job_wakeup.wait(), timeout=2)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await _run_job(job)
+        except Exception:
+            # A locked database or a full disk must not end the worker; queued jobs would sit forever
+            log.exception("job worker: iteration failed, retrying")
+            await asyncio.sleep(JOB_RETRY_DELAY)
+
+def start_job_workers():
+    _init_jobs_db()
+    for _ in range(JOB_WORKERS):
+        _job_tasks.append(asyncio.create_task(_job_worker()))
+
+async def stop_job_workers():
+    for task in _job_tasks:
+        task.cancel()
+    await asyncio.gather(*_job_tasks, return_exceptions=True)
+    _job_tasks.clear()
+
+def _job_status(row):
+    state = row["status"]
+    if state == "running" and row["cancel_requested"]:
+        # Stopping at the next page, or for tools without page progress once they finish
+        state = "cancelling"
+    status = {
+        "id": row["id"],
+        "tool": row["tool"],
+        "status": state,
+        "priority": row["priority"],
+        "progress": {"done": row["progress_done"], "total": row["progress_total"]},
+        "created": row["created"],
+        "started": row["started"],
+        "finished": row["finished"],
+        "error": row["error"],
+    }
+    if row["status"] == "done":
+        status["result"] = f"/api/jobs/{row['id']}/result"
+    return status
+
+def _get_job(job_id):
+    with closing(_jobs_db()) as db:
+        row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        raise HTTPException(404, "Job not found")
+    return row
+
+@app.post("/api/jobs/{tool}", status_code=202)
+async def submit_job(tool: str, request: Request):
+    """Queue a long-running conversion. Form fields: file, the tool's own
+    parameters and an optional priority (higher runs first)."""
+    if tool not in JOB_TOOLS:
+        raise HTTPException(404, f"Unknown job tool. Available: {', '.join(JOB_TOOLS)}")
+    _, in_suffix, _, _, _, fields = JOB_TOOLS[tool]
+    form = await request.form()
+    upload = form.get("file")
+    if not isinstance(upload, StarletteUploadFile):
+        raise HTTPException(400, "No file uploaded")
+    params = form_params(form, fields)
+    try:
+        priority = int(form["priority"]) if form.get("priority") else None
+    except ValueError:
+        raise HTTPException(400, "Invalid parameter: priority")
+
+    job_id = uuid.uuid4().hex
+    async with RequestFiles() as tmp:
+        src = await tmp.save(upload, in_suffix)
+        # Created only once the upload is in, so a refused upload leaves nothing behind
+        job_dir = os.path.join(JOBS_DIR, job_id)
+        os.makedirs(job_dir)
+        input_path = os.path.join(job_dir, "input" + in_suffix)
+        try:
+            os.replace(src, input_path)
+        except OSError:
+            shutil.rmtree(job_dir, ignore_errors=True)
+            raise
+    if priority is None:
+        priority = PRIORITY_INTERACTIVE if tmp.total <= JOB_SMALL_BYTES else PRIORITY_BULK
+
+    with closing(_jobs_db()) as db:
+        db.execute(
+            "INSERT INTO jobs (id, tool, status, priority, params, input, digest, no_cache, created) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?)",
+            (job_id, tool, priority, json.dumps(params), input_path, tmp.digests[src], int(cache_bypass.get()), time.time()),
+        )
+    _job_wakeup.set()
+    return {"id": job_id, "status": "queued", "tool": tool, "priority": priority}
+
+@app.get("/api/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Job state and page-level progress"""
+    return _job_status(_get_job(job_id))
+
+@app.get("/api/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """Download the finished artifact"""
+    row = _get_job(job_id)
+    if row["status"] != "done":
+        raise HTTPException(409, f"Job is {row['status']}")
+    _, _, _, media_type, filename, _ = JOB_TOOLS[row["tool"]]
+    return FileResponse(row["output"], media_type=media_type, headers=attachment(filename))
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued job at once. A running job reports "cancelling" until it
+    stops: at its next page for tools with page progress (ocr-pdf, pdf-to-ppt),
+    otherwise only when the tool finishes, whose result is then discarded."""
+    _get_job(job_id)
+    with closing(_jobs_db()) as db:
+        db.execute("UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'", (time.time(), job_id))
+        db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+    return _job_status(_get_job(job_id))
+
+# ==========================================
+# GROUP 12: PIPELINES - NEW
+# ==========================================
+
+# Operations on an in-memory PdfWriter: op -> (fn, [(field, type, default)]).
+# Fields without a default are required.
+PIPELINE_OPS = {
+    "rotate": (_rotate_pages, [("rotation", int, None)]),
+    "crop": (_crop_pages, [("margin", int, 50)]),
+    "watermark": (_watermark_pages, [("text", str, None)]),
+    "page-numbers": (_number_pages, [("position", str, "bottom-center")]),
+    "lock": (_lock_document, [("password", str, None)]),
+    "metadata": (_set_metadata, [("title", str, ""), ("author", str, "")]),
+}
+
+# (op, field) -> (test, what a valid value is), checked before any work starts
+PIPELINE_CHECKS = {
+    ("rotate", "rotation"): (lambda v: v in (90, 180, 270), "must be 90, 180, or 270"),
+    ("crop", "margin"): (lambda v: v >= 0, "must be 0 or more"),
+    ("watermark", "text"): (bool, "must not be empty"),
+    ("lock", "password"): (bool, "must not be empty"),
+}
+
+def _pipeline_value(value, cast):
+    """A JSON value as the field's type: ints may also come as numeric strings; None, bools and floats are refused"""
+    if cast is int and isinstance(value, str):
+        return int(value)
+    if type(value) is not cast:
+        raise TypeError(value)
+    return value
+
+def _parse_pipeline(operations):
+    """Validate the operations field: a JSON list like [{"op": "rotate", "rotation": 90}, ...]"""
+    try:
+        steps = json.loads(operations)
+    except ValueError:
+        raise HTTPException(400, "operations must be a JSON list")
+    if not isinstance(steps, list) or not steps:
+        raise HTTPException(400, "operations must be a non-empty JSON list")
+    
+    parsed = []
+    for num, step in enumerate(steps, start=1):
+        if not isinstance(step, dict) or step.get("op") not in PIPELINE_OPS:
+            raise HTTPException(400, f"Step {num}: unknown operation. Available: {', '.join(PIPELINE_OPS)}")
+        op, fields = step["op"], PIPELINE_OPS[step["op"]][1]
+        unknown = set(step) - {"op"} - {name for name, _, _ in fields}
+        if unknown:
+            raise HTTPException(400, f"Step {num} ({op}): unknown field {', '.join(sorted(unknown))}")
+        params = []
+        for name, cast, default in fields:
+            if name not in step and default is None:
+                raise HTTPException(400, f"Step {num} ({op}): missing {name}")
+            try:
+                value = _pipeline_value(step.get(name, default), cast)
+            except (TypeError, ValueError):
+                raise HTTPException(400, f"Step {num} ({op}): {name} must be {'an integer' if cast is int else 'a string'}")
+            test, valid = PIPELINE_CHECKS.get((op, name), (None, None))
+            if test and not test(value):
+                raise HTTPException(400, f"Step {num} ({op}): {name} {valid}")
+            params.append(value)
+        parsed.append((op, params))
+    return parsed
+
+def _run_pipeline(src, out, steps):
+    """Apply steps to one in-memory document and write it once; returns (step, seconds) timings"""
+    timings = []
+    start = time.perf_counter()
+    writer = PdfWriter(clone_from=src)
+    timings.append(("read", time.perf_counter() - start))
+    for op, params in steps:
+        start = time.perf_counter()
+        PIPELINE_OPS[op][0](writer, *params)
+        timings.append((op, time.perf_counter() - start))
+    start = time.perf_counter()
+    writer.write(out)
+    timings.append(("write", time.perf_counter() - start))
+    return timings
+
+@app.post("/api/pipeline")
+async def pipeline(file: UploadFile = File(...), operations: str = Form(...)):
+    """Run several PDF operations in order with a single parse and a single write"""
+    steps = _parse_pipeline(operations)
+    async with RequestFiles() as tmp:
+        src = await tmp.save(file, ".pdf")
+        try:
+            out = tmp.new_path(".pdf")
+            if any(op == "lock" for op, _ in steps):
+                # Encrypted output is never cached, same as lock-pdf
+                timings = await run_tool("pipeline", _run_pipeline, src, out, steps)
+            else:
+                timings = await run_cached(tmp, "pipeline", _run_pipeline, src, out, steps)
+            response = tmp.send_file(out, "application/pdf", "pipeline.pdf")
+            if timings:
+                response.headers["Server-Timing"] = ", ".join(
+                    f'{num}-{op};dur={seconds * 1000:.1f}' for num, (op, seconds) in enumerate(timings))
+            return response
+        except Exception as e:
+            raise HTTPException(500, f"Pipeline failed: {str(e)}")
+
+
+# ==========================================
+# GROUP 13: BATCH PROCESSING - NEW
+# ==========================================
+
+BATCH_MAX_FILES = int(os.environ.get("NEXUS_BATCH_MAX_FILES", 500))
+
+# tool -> (function, input suffix (None keeps the upload's), output suffix template, [(form field, type, default)]).
+# The output suffix is formatted with the parameters and the input's extension as {ext}.
+BATCH_TOOLS = {
+    "rotate-pdf": (_rotate_pdf, ".pdf", ".pdf", [("rotation", int, None)]),
+    "compress-pdf": (_compress_pdf, ".pdf", ".pdf", [("quality", str, "medium")]),
+    "crop-pdf": (_crop_pdf, ".pdf", ".pdf", [("margin", int, 50)]),
+    "repair-pdf": (_repair_pdf, ".pdf", ".pdf", []),
+    "watermark-pdf": (_watermark_pdf, ".pdf", ".pdf", [("text", str, None)]),
+    "add-page-numbers": (_add_page_numbers, ".pdf", ".pdf", [("position", str, "bottom-center")]),
+    "edit-pdf-metadata": (_edit_metadata, ".pdf", ".pdf", [("title", str, ""), ("author", str, "")]),
+    "extract-text": (_extract_text_file, ".pdf", ".txt", [("backend", str, "pymupdf")]),
+    "pdf-to-word": (_pdf_to_word, ".pdf", ".docx", []),
+    "pdf-to-pdfa": (_pdf_to_pdfa, ".pdf", ".pdf", []),
+    "ocr-pdf": (_ocr_pdf, ".pdf", ".pdf", []),
+    "convert-format": (_convert_format, None, ".{target_format}", [("target_format", str, None)]),
+    "resize-image": (_resize_image, None, "{ext}", [("width", int, 0), ("height", int, 0), ("mode", str, "exact"), ("quality", int, 85)]),
+    "clean-metadata": (_clean_metadata, None, "{ext}", [("keep_icc", form_bool, False)]),
+}
+
+def _check_rotation(params):
+    if params["rotation"] not in (90, 180, 270):
+        raise HTTPException(400, "Rotation must be 90, 180, or 270")
+
+def _check_compress_quality(params):
+    if params["quality"] not in COMPRESS_TIERS:
+        raise HTTPException(400, f"Unknown quality. Available: {', '.join(COMPRESS_TIERS)}")
+
+def _check_text_backend(params):
+    if params["backend"] not in TEXT_BACKENDS:
+        raise HTTPException(400, f"Unknown backend. Available: {', '.join(TEXT_BACKENDS)}")
+
+def _check_target_format(params):
+    Image.init()
+    if params["target_format"].upper() not in Image.SAVE:
+        raise HTTPException(400, f"Unknown target_format. Available: {', '.join(sorted(Image.SAVE))}")
+
+def _check_resize_params(params):
+    _check_resize(params["width"], params["height"], params["mode"])
+    if not 1 <= params["quality"] <= 100:
+        raise HTTPException(400, "quality must be between 1 and 100")
+
+# tool -> check of its parameters, made once before any file is dispatched
+BATCH_CHECKS = {
+    "rotate-pdf": _check_rotation,
+    "compress-pdf": _check_compress_quality,
+    "extract-text": _check_text_backend,
+    "convert-format": _check_target_format,
+    "resize-image": _check_resize_params,
+}
+
+def _batch_concurrency(tool):
+    return PROCESS_WORKERS if TOOL_POOLS.get(tool, "thread") == "process" else THREAD_WORKERS
+
+async def _batch_entries(tool, uploads, params, parent):
+    """Run tool on every upload, at most one per pool worker at a time, and
+    yield ZIP entries in completion order followed by a manifest. A failed
+    file is recorded in the manifest instead of ending the batch."""
+    fn, in_suffix, out_suffix, _ = BATCH_TOOLS[tool]
+    semaphore = asyncio.Semaphore(_batch_concurrency(tool))
+    
+    async def run_one(index, upload):
+        name = os.path.basename(upload.filename or f"file{index + 1}")
+        tmp = RequestFiles(parent)
+        start = time.perf_counter()
+        async with semaphore:
+            try:
+                src = await tmp.save(upload, in_suffix)
+                out = tmp.new_path(out_suffix.format(ext=os.path.splitext(src)[1], **params).lower())
+                await run_cached(tmp, tool, fn, src, out, *params.values())
+                return index, name, tmp, out, None, time.perf_counter() - start
+            except asyncio.CancelledError:
+                tmp.cleanup()
+                raise
+            except Exception as e:
+                error = e.detail if isinstance(e, HTTPException) else str(e)
+                return index, name, tmp, None, error, time.perf_counter() - start
+    
+    tasks = [asyncio.create_task(run_one(i, upload)) for i, upload in enumerate(uploads)]
+    manifest = [None] * len(tasks)
+    names = set()
+    try:
+        for task in asyncio.as_completed(tasks):
+            index, name, tmp, out, error, seconds = await task
+            entry = {"file": name, "status": "ok" if error is None else "error", "seconds": round(seconds, 3)}
+            if error is None:
+                stem = os.path.splitext(name)[0] or f"file{index + 1}"
+                arcname, n = stem + os.path.splitext(out)[1], 1
+                while arcname in names:
+                    n += 1
+                    arcname = f"{stem} ({n}){os.path.splitext(out)[1]}"
+                names.add(arcname)
+                entry.update(output=arcname, cache=tmp.cache_status)
+                manifest[index] = entry
+                try:
+                    yield arcname, out
+                finally:
+                    tmp.cleanup()
+            else:
+                entry["error"] = error
+                manifest[index] = entry
+                tmp.cleanup()
+        yield "manifest.json", json.dumps(manifest, indent=2).encode("utf-8")
+    finally:
+        # Client went away: stop waiting on the rest and drop whatever they produce
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            if task.done() and not task.cancelled():
+                task.result()[2].cleanup()
+
+@app.post("/api/batch/{tool}")
+async def batch(tool: str, request: Request):
+    """Apply one tool to many files. Form fields: files (repeated) and the
+    tool's own parameters. Returns a ZIP streamed as files finish, ending
+    with manifest.json listing each file's status."""
+    if tool not in BATCH_TOOLS:
+        raise HTTPException(404, f"Unknown batch tool. Available: {', '.join(BATCH_TOOLS)}")
+    form = await request.form(max_files=BATCH_MAX_FILES)
+    uploads = [upload for upload in form.getlist("files") if isinstance(upload, StarletteUploadFile)]
+    if not uploads:
+        raise HTTPException(400, "No files uploaded")
+    params = form_params(form, BATCH_TOOLS[tool][3])
+    if tool in BATCH_CHECKS:
+        BATCH_CHECKS[tool](params)
+    # The parts are already parsed, so a chunked body that got past the
+    # Content-Length check is refused here, before any work is queued
+    if sum(upload.size or 0 for upload in uploads) > MAX_REQUEST_BYTES:
+        raise HTTPException(413, f"Upload exceeds the {MAX_REQUEST_BYTES // MB} MB per-request limit")
+    
+    tmp = RequestFiles()
+    return tmp.send_stream(zip_stream_async(_batch_entries(tool, uploads, params, tmp)), "application/zip", "batch.zip")
+
+
 # ==========================================
 # SERVER STARTUP
 # ==========================================
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,35 @@
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Uploads, cache entries and jobs go to a throwaway directory, set before main reads its config
+os.environ.setdefault("NEXUS_UPLOAD_DIR", tempfile.mkdtemp(prefix="nexus-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    with TestClient(main.app) as c:
+        yield c
+
+
+def text_pdf(pages, label="Page"):
+    """A small text PDF, one line of text per page"""
+    from reportlab.pdfgen import canvas
+    buf = io.BytesIO()
+    can = canvas.Canvas(buf)
+    for page in range(pages):
+        can.drawString(72, 720, f"{label} {page + 1} of the test document")
+        can.showPage()
+    can.save()
+    return buf.getvalue()
+
+
+def is_pdf(response):
+    return response.status_code == 200 and response.content.startswith(b"%PDF")
@@ -0,0 +1,81 @@
+import asyncio
+import io
+import json
+import zipfile
+
+import pymupdf
+import pytest
+from fastapi import HTTPException, UploadFile
+
+import main
+from conftest import text_pdf
+
+
+def _batch(client, tool, files, data=None):
+    return client.post(f"/api/batch/{tool}", files=[("files", f) for f in files], data=data or {})
+
+
+def test_batch_zip_and_manifest(client):
+    r = _batch(client, "rotate-pdf", [("a.pdf", text_pdf(1)), ("a.pdf", text_pdf(2)), ("bad.pdf", b"not a pdf")], {"rotation": "90"})
+    assert r.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+        manifest = json.loads(zf.read("manifest.json"))
+        assert sorted(zf.namelist()) == ["a (2).pdf", "a.pdf", "manifest.json"]
+    assert [entry["status"] for entry in manifest] == ["ok", "ok", "error"]
+
+
+@pytest.mark.parametrize("tool, data, mark", [
+    ("watermark-pdf", {"text": "DRAFT"}, "DRAFT"),
+    ("add-page-numbers", {}, "1"),
+])
+def test_overlay_entries_keep_the_page_text(client, tool, data, mark):
+    r = _batch(client, tool, [("a.pdf", text_pdf(1)), ("b.pdf", text_pdf(1, "Sheet"))], data)
+    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+        page = pymupdf.open(stream=zf.read("b.pdf"))[0]
+    assert "Sheet 1 of the test document" in page.get_text()
+    assert mark in page.get_text().split()
+
+
+@pytest.mark.parametrize("tool, data, message", [
+    ("rotate-pdf", {"rotation": "45"}, "90, 180, or 270"),
+    ("rotate-pdf", {"rotation": "x"}, "Invalid parameter"),
+    ("rotate-pdf", {}, "Missing parameter"),
+    ("extract-text", {"backend": "ocr"}, "Unknown backend"),
+    ("convert-format", {"target_format": "nope"}, "Unknown target_format"),
+    ("resize-image", {}, "Give a width"),
+    ("resize-image", {"width": "10", "mode": "stretch"}, "Unknown mode"),
+    ("resize-image", {"width": "10", "quality": "0"}, "quality"),
+])
+def test_params_checked_once(client, tool, data, message):
+    r = _batch(client, tool, [("a.pdf", text_pdf(1))] * 3, data)
+    assert r.status_code == 400
+    assert message in r.json()["detail"]
+
+
+def test_unknown_tool(client):
+    assert _batch(client, "shred", [("a.pdf", b"x")]).status_code == 404
+
+
+def test_entries_share_the_request_budget(monkeypatch):
+    monkeypatch.setattr(main, "MAX_REQUEST_BYTES", 150)
+    parent = main.RequestFiles()
+
+    async def save_three():
+        children = [main.RequestFiles(parent) for _ in range(3)]
+        try:
+            for child in children:
+                await child.save(UploadFile(io.BytesIO(b"x" * 60), filename="a.bin"))
+        finally:
+            for child in children:
+                child.cleanup()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(save_three())
+    assert error.value.status_code == 413
+    assert parent.total == 120
+
+
+def test_batch_over_the_request_budget(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_REQUEST_BYTES", 2000)
+    r = _batch(client, "repair-pdf", [("a.pdf", b"x" * 1500), ("b.pdf", b"x" * 1500)])
+    assert r.status_code == 413
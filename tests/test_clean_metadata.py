@@ -0,0 +1,112 @@
+import io
+
+import pytest
+from PIL import Image, PngImagePlugin
+
+XMP = b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF/><secret>where the photo was taken</secret></x:xmpmeta>'
+
+
+def _exif():
+    exif = Image.Exif()
+    exif[0x010F] = "SecretCam"  # Make
+    exif[0x9003] = "2020:01:02 03:04:05"  # DateTimeOriginal
+    return exif.tobytes()
+
+
+def _photo():
+    img = Image.new("RGB", (64, 48))
+    img.putdata([(x * 4, y * 5, (x * y) % 256) for y in range(48) for x in range(64)])
+    return img
+
+
+def _icc():
+    from PIL import ImageCms
+    return ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+
+
+def _jpeg():
+    buf = io.BytesIO()
+    _photo().save(buf, "JPEG", quality=90, exif=_exif(), xmp=XMP, comment=b"SecretComment", icc_profile=_icc())
+    return buf.getvalue()
+
+
+def _png():
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Author", "SecretAuthor")
+    info.add_text("Comment", "SecretComment", zip=True)
+    info.add_itxt("XML:com.adobe.xmp", XMP.decode())
+    buf = io.BytesIO()
+    _photo().save(buf, "PNG", pnginfo=info, exif=_exif(), icc_profile=_icc())
+    return buf.getvalue()
+
+
+def _webp():
+    buf = io.BytesIO()
+    _photo().save(buf, "WEBP", quality=80, exif=_exif(), xmp=XMP, icc_profile=_icc())
+    return buf.getvalue()
+
+
+def _jpeg_scan(data):
+    """Everything from start of scan on: the compressed pixels"""
+    return data[data.index(b"\xff\xda"):]
+
+
+def _png_chunks(data):
+    chunks, pos = [], 8
+    while pos < len(data):
+        length = int.from_bytes(data[pos:pos + 4], "big")
+        chunks.append((data[pos + 4:pos + 8], data[pos + 8:pos + 8 + length]))
+        pos += 12 + length
+    return chunks
+
+
+def _webp_chunks(data):
+    chunks, pos = [], 12
+    while pos < len(data):
+        size = int.from_bytes(data[pos + 4:pos + 8], "little")
+        chunks.append((data[pos:pos + 4], data[pos + 8:pos + 8 + size]))
+        pos += 8 + size + (size & 1)
+    return chunks
+
+
+def _clean(client, data, name, **form):
+    r = client.post("/api/clean-metadata", files={"file": (name, data)}, data=form)
+    assert r.status_code == 200, r.text[:200]
+    return r
+
+
+@pytest.mark.parametrize("make, name, media_type", [(_jpeg, "a.jpg", "image/jpeg"), (_png, "a.png", "image/png"),
+                                                    (_webp, "a.webp", "image/webp")])
+def test_metadata_removed_pixels_kept(client, make, name, media_type):
+    data = make()
+    assert b"SecretCam" in data and b"where the photo was taken" in data
+    r = _clean(client, data, name)
+    assert r.headers["content-type"] == media_type
+    out = r.content
+    for secret in (b"SecretCam", b"where the photo was taken", b"SecretComment", b"SecretAuthor", b"sRGB"):
+        assert secret not in out
+    img = Image.open(io.BytesIO(out))
+    assert not {"exif", "xmp", "icc_profile", "comment"} & set(img.info)
+    assert img.tobytes() == Image.open(io.BytesIO(data)).tobytes()
+    if media_type == "image/jpeg":
+        assert _jpeg_scan(out) == _jpeg_scan(data)
+    elif media_type == "image/png":
+        assert [c for c in _png_chunks(out) if c[0] == b"IDAT"] == [c for c in _png_chunks(data) if c[0] == b"IDAT"]
+        assert {kind for kind, _ in _png_chunks(out)} == {b"IHDR", b"IDAT", b"IEND"}
+    else:
+        assert [c for c in _webp_chunks(out) if c[0] in (b"VP8 ", b"VP8L")] == \
+               [c for c in _webp_chunks(data) if c[0] in (b"VP8 ", b"VP8L")]
+        assert {kind for kind, _ in _webp_chunks(out)} <= {b"VP8X", b"VP8 ", b"VP8L", b"ALPH"}
+
+
+@pytest.mark.parametrize("make, name", [(_jpeg, "a.jpg"), (_png, "a.png"), (_webp, "a.webp")])
+def test_keep_icc(client, make, name):
+    r = _clean(client, make(), name, keep_icc="true")
+    img = Image.open(io.BytesIO(r.content))
+    assert img.info.get("icc_profile") == _icc()
+    assert "exif" not in img.info and b"SecretCam" not in r.content
+
+
+def test_not_an_image(client):
+    r = client.post("/api/clean-metadata", files={"file": ("a.jpg", b"plain text")})
+    assert r.status_code == 400
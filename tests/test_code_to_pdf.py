@@ -0,0 +1,67 @@
+import io
+import zipfile
+
+import pymupdf
+
+import main
+
+
+def _zip(entries):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_chunks_end_at_top_level_code(monkeypatch):
+    monkeypatch.setattr(main, "CODE_CHUNK_LINES", 10)
+    lines = [line + "\n" for i in range(8) for line in (f"def f{i}():", "    x = 1", "", "    return x", "")]
+    chunks = list(main._code_chunks(lines))
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(lines)
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:]))
+    # Each cut falls before a def, not after the blank line inside a function
+    assert all(lines[start].startswith("def ") for start, _ in chunks[1:])
+    assert len(chunks) > 2
+
+
+
+def test_plan_reads_each_source_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "CODE_CHUNK_LINES", 10)
+    text = "".join(f"def f{i}():\n    return {i}\n\n" for i in range(20))
+    path = tmp_path / "big.py"
+    path.write_text(text)
+    reads = []
+    read_source = main._read_source
+    monkeypatch.setattr(main, "_read_source", lambda p: reads.append(p) or read_source(p))
+    plan = main._code_plan([("big.py", str(path))])
+    assert reads == [str(path)]
+    assert len(plan) > 2
+    assert [start for _, start, _ in plan][0] == 0
+    # Each part starts where the previous one's lines ran out, and together they are the file
+    assert all(b[1] == a[1] + a[2].count("\n") + 1 for a, b in zip(plan, plan[1:]))
+    assert "\n".join(code for _, _, code in plan) == text
+
+def test_project_becomes_one_bookmarked_book(client):
+    project = _zip({"proj/b.py": "def f():\n    return 1\n", "proj/a/Makefile": "all:\n\techo hi\n", "proj/.git/config": "[core]\n",
+                    "__MACOSX/proj/._b.py": "junk", "proj/logo.png": b"\x89PNG\r\n\x1a\n\x00\x00binary"})
+    r = client.post("/api/code-to-pdf", files=[("files", ("proj.zip", project)), ("files", ("notes.md", b"# Notes\n"))])
+    assert r.status_code == 200, r.text[:200]
+    doc = pymupdf.open(stream=r.content)
+    toc = [(level, title) for level, title, _ in doc.get_toc()]
+    assert toc == [(1, "Contents"), (1, "proj/a/Makefile"), (1, "proj/b.py"), (1, "notes.md")]
+    text = "".join(page.get_text() for page in doc)
+    assert "junk" not in text and "[core]" not in text
+    assert any(link.get("kind") == pymupdf.LINK_GOTO for link in doc[0].get_links())
+
+
+def test_single_file_has_no_contents_page(client):
+    r = client.post("/api/code-to-pdf", files={"file": ("a.py", b"print(1)\n")})
+    doc = pymupdf.open(stream=r.content)
+    assert [title for _, title, _ in doc.get_toc()] == ["a.py"]
+
+
+def test_nothing_to_render(client):
+    assert client.post("/api/code-to-pdf").status_code == 400
+    r = client.post("/api/code-to-pdf", files={"file": ("only.zip", _zip({"img.png": b"\x00\x01"}))})
+    assert r.status_code == 400
@@ -0,0 +1,79 @@
+import io
+import json
+import zipfile
+
+from conftest import is_pdf, text_pdf
+
+
+def _pdf(pages):
+    """A PDF from page specs: ("text", str, y) or ("image", RGB colour)"""
+    import pymupdf
+    from PIL import Image
+    doc = pymupdf.open()
+    for kind, *spec in pages:
+        page = doc.new_page(width=300, height=300)
+        if kind == "text":
+            text, y = spec
+            page.insert_text((40, y), text)
+        else:
+            buf = io.BytesIO()
+            Image.new("RGB", (40, 40), spec[0]).save(buf, "PNG")
+            page.insert_image(page.rect, stream=buf.getvalue())
+    return doc.tobytes()
+
+
+def _compare(client, old, new, format="json"):
+    r = client.post("/api/compare-pdf", files={"file1": ("old.pdf", old), "file2": ("new.pdf", new)}, data={"format": format})
+    assert r.status_code == 200, r.text[:200]
+    return r
+
+
+def test_identical(client):
+    pdf = text_pdf(3)
+    diff = _compare(client, pdf, pdf).json()
+    assert diff["summary"] == {"identical": 3, "changed": 0, "deleted": 0, "inserted": 0}
+
+
+def test_image_only_pages_differ(client):
+    diff = _compare(client, _pdf([("image", "red")]), _pdf([("image", "blue")])).json()
+    assert diff["summary"]["identical"] == 0
+    assert diff["pages"] == [{"status": "changed", "page1": 1, "page2": 1, "changes": []}]
+
+
+def test_same_text_moved(client):
+    diff = _compare(client, _pdf([("text", "Total due", 100)]), _pdf([("text", "Total due", 200)])).json()
+    assert diff["pages"] == [{"status": "changed", "page1": 1, "page2": 1, "changes": []}]
+
+
+def test_same_text_different_image(client):
+    old = _pdf([("text", "Cover", 100), ("image", "red")])
+    new = _pdf([("text", "Cover", 100), ("image", "green")])
+    diff = _compare(client, old, new).json()
+    assert [e["status"] for e in diff["pages"]] == ["identical", "changed"]
+
+
+def test_inserted_page_shifts_the_rest(client):
+    old = _pdf([("text", "Intro", 50), ("text", "Amount due 100", 50), ("text", "Closing", 50)])
+    new = _pdf([("text", "Intro", 50), ("text", "A new page", 50), ("text", "Amount due 250", 50), ("text", "Closing", 50)])
+    diff = _compare(client, old, new).json()
+    assert diff["summary"] == {"identical": 2, "changed": 1, "deleted": 0, "inserted": 1}
+    assert {"status": "identical", "page1": 3, "page2": 4} in diff["pages"]
+
+
+def test_word_diff(client):
+    diff = _compare(client, _pdf([("text", "Amount due 100 today", 50)]), _pdf([("text", "Amount due 250 today", 50)])).json()
+    assert diff["pages"][0]["changes"] == [{"op": "replace", "line1": 1, "old": "100", "line2": 1, "new": "250"}]
+
+
+def test_report_formats(client):
+    old, new = text_pdf(2), text_pdf(2, "Sheet")
+    assert is_pdf(_compare(client, old, new, "pdf"))
+    with zipfile.ZipFile(io.BytesIO(_compare(client, old, new, "zip").content)) as zf:
+        assert sorted(zf.namelist()) == ["comparison.json", "comparison.pdf"]
+        assert json.loads(zf.read("comparison.json"))["summary"]["changed"] == 2
+
+
+def test_unknown_format(client):
+    pdf = text_pdf(1)
+    r = client.post("/api/compare-pdf", files={"file1": ("a.pdf", pdf), "file2": ("b.pdf", pdf)}, data={"format": "html"})
+    assert r.status_code == 400
@@ -0,0 +1,93 @@
+import io
+import json
+import random
+
+import pikepdf
+import pymupdf
+import pytest
+from PIL import Image
+
+from conftest import text_pdf
+
+
+def _photo(size=(1600, 1200), quality=95):
+    rng = random.Random(7)
+    small = Image.frombytes("RGB", (size[0] // 8, size[1] // 8), bytes(rng.randrange(256) for _ in range(size[0] * size[1] * 3 // 64)))
+    buf = io.BytesIO()
+    small.resize(size, Image.Resampling.BICUBIC).save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _photo_pdf():
+    """A scan as reportlab writes it: the JPEG under [/ASCII85Decode /DCTDecode]"""
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfgen import canvas
+    out = io.BytesIO()
+    can = canvas.Canvas(out)
+    can.drawImage(ImageReader(io.BytesIO(_photo())), 0, 0, 612, 792)
+    can.showPage()
+    can.save()
+    return out.getvalue()
+
+
+def _flate_jpeg_pdf():
+    """The JPEG under [/FlateDecode /DCTDecode]"""
+    import zlib
+    pdf = pikepdf.new()
+    jpeg = _photo(quality=90)
+    image = pikepdf.Stream(pdf, zlib.compress(jpeg))
+    image.stream_dict = pikepdf.Dictionary(Type=pikepdf.Name.XObject, Subtype=pikepdf.Name.Image, Width=1600, Height=1200,
+                                           ColorSpace=pikepdf.Name.DeviceRGB, BitsPerComponent=8,
+                                           Filter=pikepdf.Array([pikepdf.Name.FlateDecode, pikepdf.Name.DCTDecode]))
+    page = pikepdf.Page(pdf.add_blank_page(page_size=(612, 792)))
+    page.obj.Resources = pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image))
+    page.obj.Contents = pdf.make_stream(b"q 612 0 0 792 0 0 cm /Im0 Do Q")
+    out = io.BytesIO()
+    pdf.save(out)
+    return out.getvalue()
+
+
+def _compress(client, data, quality="medium"):
+    r = client.post("/api/compress-pdf", files={"file": ("a.pdf", data)}, data={"quality": quality})
+    assert r.status_code == 200, r.text[:200]
+    return r
+
+
+def _image_filters(data):
+    with pikepdf.open(io.BytesIO(data)) as pdf:
+        return [image.get("/Filter") for page in pdf.pages for image in page.images.values()]
+
+
+@pytest.mark.parametrize("make", [_photo_pdf, _flate_jpeg_pdf])
+def test_jpeg_scans_shrink(client, make):
+    data = make()
+    r = _compress(client, data)
+    assert len(r.content) < len(data) * 0.7
+    assert _image_filters(r.content) == [pikepdf.Name.DCTDecode]
+    report = json.loads(r.headers["X-Nexus-Compression"])
+    assert report["after"]["images"] < report["before"]["images"]
+    page = pymupdf.open(stream=r.content)[0]
+    assert not page.parent.is_repaired
+    assert page.get_pixmap(dpi=20).width > 0
+
+
+def test_lower_tiers_are_smaller(client):
+    data = _photo_pdf()
+    sizes = [len(_compress(client, data, quality).content) for quality in ("high", "medium", "low")]
+    assert sizes[0] > sizes[1] > sizes[2]
+
+
+def test_text_only_pdf_passes_through(client):
+    data = text_pdf(3)
+    r = _compress(client, data)
+    doc = pymupdf.open(stream=r.content)
+    assert not doc.is_repaired
+    assert [page.get_text().strip() for page in doc] == [f"Page {n} of the test document" for n in range(1, 4)]
+
+
+def test_unknown_tier(client):
+    r = client.post("/api/compress-pdf", files={"file": ("a.pdf", text_pdf(1))}, data={"quality": "extreme"})
+    assert r.status_code == 400
+    assert "low, medium, high" in r.json()["detail"]
+    r = client.post("/api/batch/compress-pdf", files=[("files", ("a.pdf", text_pdf(1)))], data={"quality": "extreme"})
+    assert r.status_code == 400
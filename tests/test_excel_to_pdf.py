@@ -0,0 +1,73 @@
+import io
+
+import pymupdf
+from pypdf import PdfReader
+
+import main
+
+
+def _sheets(path, sheets):
+    book = main.XlsxBook(str(path))
+    for name, rows in sheets:
+        book.add_sheet(name, iter(rows))
+    book.close()
+    return str(path)
+
+
+def _render(tmp_path, sheets, **options):
+    out = str(tmp_path / "out.pdf")
+    main._excel_to_pdf(_sheets(tmp_path / "in.xlsx", sheets), out, **options)
+    with open(out, "rb") as f:
+        data = f.read()
+    doc = pymupdf.open(stream=data)
+    assert not doc.is_repaired
+    assert len(PdfReader(io.BytesIO(data), strict=True).pages) == doc.page_count
+    return doc
+
+
+def test_rows_paginate_under_a_repeated_header(tmp_path):
+    rows = [["Invoice", "Customer", "Total"]] + [[f"INV-{i:04d}", f"Customer {i}", i * 1.5] for i in range(300)]
+    doc = _render(tmp_path, [("Sales", rows)])
+    assert doc.page_count > 1
+    texts = [page.get_text() for page in doc]
+    assert all("Invoice" in text and "Customer\n" in text for text in texts)
+    # Footer: the sheet name, then the page number
+    assert all(text.endswith(f"\nSales\n{n}\n") for n, text in enumerate(texts, 1))
+    found = [word for text in texts for word in text.split() if word.startswith("INV-")]
+    assert found == [f"INV-{i:04d}" for i in range(300)]
+
+
+def test_awkward_text_is_escaped_and_wrapped(tmp_path):
+    long_word = "x" * 120
+    doc = _render(tmp_path, [("S", [["a"], ["paren (open) back\\slash"], [long_word], ["tab\there"]])])
+    text = doc[0].get_text()
+    assert "paren (open) back\\slash" in text
+    assert "tab here" in text
+    assert "".join(line for line in text.split() if set(line) == {"x"}) == long_word
+
+
+def test_wide_sheets_turn_landscape_then_band(tmp_path):
+    medium = [[f"heading number {i}" for i in range(8)], ["value " * 5] * 8]
+    wide = [[f"column {i}" for i in range(40)], [f"v{i}" for i in range(40)]]
+    doc = _render(tmp_path, [("Medium", medium), ("Wide", wide)])
+    assert doc[0].rect.width > doc[0].rect.height
+    captions = [line for page in doc for line in page.get_text().splitlines() if line.startswith("Wide")]
+    assert len(captions) > 1 and captions[0].startswith("Wide (columns 1-")
+    assert "column 39" in "".join(page.get_text() for page in doc)
+
+
+def test_page_size_and_one_sheet(tmp_path):
+    doc = _render(tmp_path, [("One", [["a"], ["first"]]), ("Two", [["b"], ["second"]])], sheet="Two", page_size="letter")
+    assert doc.page_count == 1
+    assert tuple(round(v) for v in doc[0].rect[2:]) == (612, 792)
+    assert "second" in doc[0].get_text() and "first" not in doc[0].get_text()
+
+
+def test_endpoint_errors(client, tmp_path):
+    with open(_sheets(tmp_path / "in.xlsx", [("One", [["a"]])]), "rb") as f:
+        xlsx = f.read()
+    post = lambda content, **data: client.post("/api/excel-to-pdf", files={"file": ("a.xlsx", content)}, data=data)
+    assert post(xlsx).content.startswith(b"%PDF")
+    assert post(xlsx, page_size="b5").status_code == 400
+    assert post(xlsx, sheet="Missing").status_code == 400
+    assert post(b"not a spreadsheet").status_code == 400
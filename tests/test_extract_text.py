@@ -0,0 +1,69 @@
+import io
+import json
+import re
+
+import pytest
+
+import main
+from conftest import text_pdf
+
+
+def _split_word_pdf():
+    """"Gam" and "ma" drawn separately, side by side; "Alpha" and "Beta" apart on one line"""
+    from reportlab.pdfgen import canvas
+    buf = io.BytesIO()
+    can = canvas.Canvas(buf)
+    can.drawString(72, 720, "Alpha")
+    can.drawString(200, 720, "Beta")
+    can.drawString(72, 700, "Gam")
+    can.drawString(72 + can.stringWidth("Gam", "Helvetica", 12), 700, "ma")
+    can.showPage()
+    can.save()
+    return buf.getvalue()
+
+
+def _extract(client, data, **form):
+    return client.post("/api/extract-text", files={"file": ("a.pdf", data)}, data=form)
+
+
+def test_backend_selection(client):
+    data = _split_word_pdf()
+    texts = {backend: _extract(client, data, backend=backend).text for backend in main.TEXT_BACKENDS}
+    # PyMuPDF joins the touching halves; pypdf keeps each drawString on its own line
+    assert "Gamma" in texts["pymupdf"]
+    assert "Gam\nma" in texts["pypdf"]
+    # pdfplumber lays text out where it sits on the page
+    assert re.search(r"^ +Alpha {3,}Beta", texts["pdfplumber"], re.M)
+    assert _extract(client, data, backend="tika").status_code == 400
+
+
+def test_ndjson_order_across_parallel_batches(client, monkeypatch):
+    monkeypatch.setattr(main, "TEXT_BATCH_PAGES", 3)
+    monkeypatch.setattr(main, "TEXT_WINDOW", 4)
+    r = _extract(client, text_pdf(40), format="ndjson", pages="30-40,2,5-12")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    expected = [*range(30, 41), 2, *range(5, 13)]
+    assert [line["page"] for line in lines] == expected
+    assert [line["text"].strip() for line in lines] == [f"Page {n} of the test document" for n in expected]
+
+
+def test_plain_text_keeps_page_order(client, monkeypatch):
+    monkeypatch.setattr(main, "TEXT_BATCH_PAGES", 2)
+    r = _extract(client, text_pdf(9))
+    assert [line for line in r.text.splitlines() if line] == [f"Page {n} of the test document" for n in range(1, 10)]
+
+
+@pytest.mark.parametrize("pages", ["5", "4-9", "12-"])
+def test_out_of_range_pages(client, pages):
+    r = _extract(client, text_pdf(3), pages=pages)
+    assert r.status_code == 400
+    assert "the document has 3" in r.json()["detail"]
+
+
+@pytest.mark.parametrize("pages", ["0", "3-1", "a-b"])
+def test_invalid_page_range(client, pages):
+    r = _extract(client, text_pdf(3), pages=pages)
+    assert r.status_code == 400
+    assert "Invalid page range" in r.json()["detail"]
@@ -0,0 +1,71 @@
+import functools
+import http.server
+import io
+import threading
+
+import pytest
+
+from conftest import is_pdf
+
+
+def _docx():
+    from docx import Document
+    doc = Document()
+    doc.add_heading("Quarterly report", 0)
+    doc.add_paragraph("Revenue grew in every region.")
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+@pytest.fixture(scope="module")
+def html_url(tmp_path_factory):
+    root = tmp_path_factory.mktemp("site")
+    (root / "page.html").write_text("<html><body><h1>Hello</h1><p>A served page.</p></body></html>")
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(root))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/page.html"
+    server.shutdown()
+
+
+@pytest.mark.parametrize("backend", ["", "story", "xhtml2pdf"])
+@pytest.mark.parametrize("endpoint", ["/api/docx-to-pdf", "/api/word-to-pdf"])
+def test_docx(client, endpoint, backend):
+    r = client.post(endpoint, files={"file": ("report.docx", _docx())}, data={"backend": backend})
+    assert is_pdf(r), r.text[:200]
+
+
+def test_word_to_pdf_without_backend(client):
+    r = client.post("/api/word-to-pdf", files={"file": ("report.docx", _docx())})
+    assert is_pdf(r), r.text[:200]
+
+
+@pytest.mark.parametrize("backend", ["", "xhtml2pdf"])
+def test_markdown(client, backend):
+    r = client.post("/api/md-to-pdf", files={"file": ("notes.md", b"# Notes\n\n- one\n- *two*\n")}, data={"backend": backend})
+    assert is_pdf(r), r.text[:200]
+
+
+@pytest.mark.parametrize("backend", ["", "xhtml2pdf"])
+def test_html(client, html_url, backend):
+    r = client.post("/api/html-to-pdf", json={"url": html_url, "backend": backend})
+    assert is_pdf(r), r.text[:200]
+
+
+@pytest.mark.parametrize("backend", ["", "xhtml2pdf"])
+def test_code(client, backend):
+    r = client.post("/api/code-to-pdf", files={"file": ("a.py", b"def f():\n    return 1\n")}, data={"backend": backend})
+    assert is_pdf(r), r.text[:200]
+
+
+@pytest.mark.parametrize("endpoint", ["/api/docx-to-pdf", "/api/word-to-pdf", "/api/md-to-pdf", "/api/code-to-pdf"])
+def test_unknown_backend(client, endpoint):
+    r = client.post(endpoint, files={"file": ("a.md", b"# x\n")}, data={"backend": "wkhtml"})
+    assert r.status_code == 400
+    assert "backend" in r.json()["detail"]
+
+
+def test_html_unknown_backend(client, html_url):
+    r = client.post("/api/html-to-pdf", json={"url": html_url, "backend": "wkhtml"})
+    assert r.status_code == 400
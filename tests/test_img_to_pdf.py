@@ -0,0 +1,103 @@
+import io
+
+import pytest
+from PIL import Image
+
+
+
+def _image(fmt, mode="RGB", size=(64, 48), **save):
+    img = Image.new("RGB", size)
+    img.putdata([(x * 4 % 256, y * 5 % 256, (x + y) % 256) for y in range(size[1]) for x in range(size[0])])
+    if mode != "RGB":
+        img = img.convert(mode)
+    buf = io.BytesIO()
+    img.save(buf, fmt, **save)
+    return img, buf.getvalue()
+
+
+def _convert(client, files, **data):
+    r = client.post("/api/img-to-pdf", files=[("files", f) for f in files], data={k: str(v) for k, v in data.items()})
+    assert r.status_code == 200, r.text[:200]
+    import pymupdf
+    doc = pymupdf.open(stream=r.content)
+    # The hand-written xref must be exact: nothing for either parser to repair
+    assert not doc.is_repaired
+    from pypdf import PdfReader
+    assert len(PdfReader(io.BytesIO(r.content), strict=True).pages) == doc.page_count
+    return doc
+
+
+def _samples(doc, page=0):
+    import pymupdf
+    xref = doc[page].get_images()[0][0]
+    return pymupdf.Pixmap(doc, xref)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "L", "P"])
+def test_png_pixels_survive(client, mode):
+    img, data = _image("PNG", mode)
+    doc = _convert(client, [("a.png", data)])
+    pix = _samples(doc)
+    assert (pix.width, pix.height) == img.size
+    expected = img.convert("RGB") if mode == "P" else img
+    assert pix.samples == expected.tobytes()
+
+
+def test_png_alpha_becomes_a_soft_mask(client):
+    img, data = _image("PNG", "RGBA")
+    doc = _convert(client, [("a.png", data)])
+    smask = doc[0].get_images()[0][1]
+    assert smask
+
+
+def test_jpeg_is_embedded_as_is(client):
+    _, data = _image("JPEG", quality=90)
+    doc = _convert(client, [("a.jpg", data)])
+    assert doc.extract_image(doc[0].get_images()[0][0])["image"] == data
+    # 64x48 pixels at the assumed 96 dpi
+    assert tuple(round(v) for v in doc[0].rect[2:]) == (48, 36)
+
+
+def test_exif_rotation_turns_the_page(client):
+    img, _ = _image("JPEG")
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", exif=exif)
+    doc = _convert(client, [("a.jpg", buf.getvalue())])
+    assert doc[0].rotation == 90
+    # Displayed upright: taller than wide
+    assert doc[0].rect.width < doc[0].rect.height
+
+
+def test_cmyk_jpeg_is_not_inverted(client):
+    img = Image.new("CMYK", (32, 32), (0, 0, 0, 0))  # white
+    buf = io.BytesIO()
+    img.save(buf, "JPEG")
+    doc = _convert(client, [("a.jpg", buf.getvalue())])
+    pix = doc[0].get_pixmap()
+    assert pix.pixel(pix.width // 2, pix.height // 2) == (255, 255, 255)
+
+
+def test_one_page_per_tiff_frame_in_order(client):
+    frames = [Image.new("RGB", (20, 10 * (i + 1)), "white") for i in range(3)]
+    buf = io.BytesIO()
+    frames[0].save(buf, "TIFF", save_all=True, append_images=frames[1:])
+    _, png = _image("PNG")
+    doc = _convert(client, [("a.tif", buf.getvalue()), ("b.png", png)])
+    assert [round(page.rect.height) for page in doc] == [8, 15, 22, 36]
+
+
+def test_named_page_size_and_downsampling(client):
+    _, data = _image("JPEG", size=(2000, 1000))
+    doc = _convert(client, [("wide.jpg", data)], page_size="a4", dpi=72)
+    assert doc[0].rect.width > doc[0].rect.height
+    assert round(doc[0].rect.width) == 842
+    assert _samples(doc).width < 2000
+
+
+def test_bad_input(client):
+    r = client.post("/api/img-to-pdf", files=[("files", ("a.png", b"not an image"))])
+    assert r.status_code == 400 and "a.png" in r.json()["detail"]
+    _, png = _image("PNG")
+    assert client.post("/api/img-to-pdf", files=[("files", ("a.png", png))], data={"page_size": "b5"}).status_code == 400
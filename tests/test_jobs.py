@@ -0,0 +1,78 @@
+import os
+import time
+
+import main
+from conftest import text_pdf
+
+
+def _wait(client, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = client.get(f"/api/jobs/{job_id}").json()
+        if status["status"] not in ("queued", "running", "cancelling"):
+            return status
+        time.sleep(0.2)
+    raise AssertionError(f"job still {status['status']}")
+
+
+def test_job_runs_to_a_result(client):
+    r = client.post("/api/jobs/pdf-to-word", files={"file": ("a.pdf", text_pdf(2))})
+    assert r.status_code == 202
+    job = r.json()
+    assert job["priority"] == main.PRIORITY_INTERACTIVE
+    status = _wait(client, job["id"])
+    assert status["status"] == "done", status
+    result = client.get(status["result"])
+    assert result.status_code == 200 and result.content.startswith(b"PK")
+
+
+def test_refused_upload_leaves_no_job_directory(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_FILE_BYTES", 100)
+    before = set(os.listdir(main.JOBS_DIR))
+    r = client.post("/api/jobs/pdf-to-word", files={"file": ("a.pdf", text_pdf(2))})
+    assert r.status_code == 413
+    assert set(os.listdir(main.JOBS_DIR)) == before
+
+
+def test_submit_errors(client):
+    assert client.post("/api/jobs/shred", files={"file": ("a.pdf", b"x")}).status_code == 404
+    assert client.post("/api/jobs/pdf-to-word", data={"priority": "1"}).status_code == 400
+    r = client.post("/api/jobs/pdf-to-word", files={"file": ("a.pdf", b"x")}, data={"priority": "high"})
+    assert r.status_code == 400
+
+
+def test_unknown_job(client):
+    assert client.get("/api/jobs/nope").status_code == 404
+    assert client.delete("/api/jobs/nope").status_code == 404
+
+
+def _row(**fields):
+    row = dict(id="j", tool="pdf-to-word", status="queued", priority=0, progress_done=0, progress_total=0,
+               cancel_requested=0, created=0, started=None, finished=None, error=None)
+    row.update(fields)
+    return row
+
+
+def test_running_job_reports_cancelling():
+    assert main._job_status(_row(status="running"))["status"] == "running"
+    assert main._job_status(_row(status="running", cancel_requested=1))["status"] == "cancelling"
+    assert main._job_status(_row(status="cancelled", cancel_requested=1))["status"] == "cancelled"
+
+
+def test_worker_survives_a_failed_claim(client, monkeypatch, caplog):
+    claim = main._claim_job
+    failures = []
+
+    def flaky_claim():
+        if len(failures) < 3:
+            failures.append(1)
+            raise main.sqlite3.OperationalError("database is locked")
+        return claim()
+
+    monkeypatch.setattr(main, "JOB_RETRY_DELAY", 0.01)
+    monkeypatch.setattr(main, "_claim_job", flaky_claim)
+    r = client.post("/api/jobs/pdf-to-word", files={"file": ("a.pdf", text_pdf(1, label="Retry"))})
+    assert _wait(client, r.json()["id"])["status"] == "done"
+    assert len(failures) == 3
+    assert not any(task.done() for task in main._job_tasks)
+    assert "job worker: iteration failed" in caplog.text
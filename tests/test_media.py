@@ -0,0 +1,58 @@
+import io
+import subprocess
+
+import pytest
+from PIL import Image
+
+import main
+
+
+@pytest.fixture(scope="module")
+def video(tmp_path_factory):
+    """Two seconds of 160x120 test pattern at 10 fps, with an AAC sine tone"""
+    try:
+        ffmpeg = main._ffmpeg_exe()
+    except Exception:
+        pytest.skip("ffmpeg is not available")
+    path = tmp_path_factory.mktemp("media") / "clip.mp4"
+    subprocess.run([ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+                    "-f", "lavfi", "-i", "testsrc=duration=2:size=160x120:rate=10", "-f", "lavfi", "-i", "sine=duration=2",
+                    "-c:v", "mpeg4", "-c:a", "aac", "-shortest", str(path)], check=True)
+    return path.read_bytes()
+
+
+def _gif(client, video, **form):
+    return client.post("/api/video-to-gif", files={"file": ("clip.mp4", video)}, data=form)
+
+
+def test_gif(client, video):
+    r = _gif(client, video, start_time="0.5", end_time="1.5", fps="5", width="80")
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "image/gif"
+    assert r.content[:6] == b"GIF89a"
+    img = Image.open(io.BytesIO(r.content))
+    assert img.size == (80, 60)
+    assert img.n_frames == 5
+
+
+def test_gif_start_past_the_end(client, video):
+    r = _gif(client, video, start_time="3", end_time="4")
+    assert r.status_code == 400
+    assert "past the end" in r.json()["detail"]
+
+
+@pytest.mark.parametrize("form", [{"start_time": "2", "end_time": "1"}, {"fps": "0"}, {"fps": "51"}, {"width": "-1"}])
+def test_gif_bad_options(client, video, form):
+    assert _gif(client, video, **form).status_code == 400
+
+
+def test_gif_needs_a_video(client):
+    assert _gif(client, b"not a video at all").status_code == 400
+
+
+def test_audio_is_copied_when_it_fits(client, video):
+    r = client.post("/api/extract-audio", files={"file": ("clip.mp4", video)}, data={"format": "auto"})
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "audio/aac"
+    # ADTS frames start with a 12-bit sync word
+    assert r.content[:2] in (b"\xff\xf1", b"\xff\xf9")
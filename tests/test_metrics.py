@@ -0,0 +1,77 @@
+import re
+import uuid
+
+from conftest import text_pdf
+
+SAMPLE = re.compile(r"^(\w+)(?:\{(.*)\})? (\S+)$")
+
+
+def _metrics(client):
+    """{(name, frozenset of label pairs): value}"""
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in r.text.splitlines():
+        if line.startswith("#"):
+            continue
+        name, labels, value = SAMPLE.match(line).groups()
+        pairs = frozenset(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', labels or ""))
+        samples[name, pairs] = float(value)
+    return samples
+
+
+def _delta(before, after, name, **labels):
+    key = (name, frozenset(labels.items()))
+    return after.get(key, 0) - before.get(key, 0)
+
+
+def test_request_is_recorded(client):
+    # A document no earlier test has sent, so the result cache cannot answer it
+    data = text_pdf(3, label=uuid.uuid4().hex)
+    before = _metrics(client)
+    r = client.post("/api/rotate-pdf", files={"file": ("a.pdf", data)}, data={"rotation": "90"})
+    assert r.status_code == 200
+    after = _metrics(client)
+
+    route = "/api/rotate-pdf"
+    assert _delta(before, after, "nexus_http_requests_total", route=route, method="POST", status="200") == 1
+    assert _delta(before, after, "nexus_http_request_duration_seconds_count", route=route) == 1
+    assert _delta(before, after, "nexus_http_request_duration_seconds_bucket", route=route, le="+Inf") == 1
+    assert _delta(before, after, "nexus_http_request_duration_seconds_sum", route=route) > 0
+    assert _delta(before, after, "nexus_http_request_bytes_total", route=route) > len(data)
+    assert _delta(before, after, "nexus_http_response_bytes_total", route=route) == len(r.content)
+    assert _delta(before, after, "nexus_tool_pages_total", tool="rotate-pdf") == 3
+    assert after[("nexus_http_requests_in_flight", frozenset({("route", route)}))] == 0
+    for pool in ("process", "thread"):
+        # Work left over from other tests may still be running, so only the arithmetic is fixed
+        labels = frozenset({("pool", pool)})
+        workers, tasks = after[("nexus_pool_workers", labels)], after.get(("nexus_pool_tasks", labels), 0)
+        assert workers >= 1
+        assert after[("nexus_pool_queue_depth", labels)] == max(0, tasks - workers)
+
+
+def test_errors_by_exception_type(client):
+    before = _metrics(client)
+    assert client.post("/api/rotate-pdf", files={"file": ("a.pdf", text_pdf(1))}, data={"rotation": "45"}).status_code == 400
+    assert client.post("/api/rotate-pdf", files={"file": ("a.pdf", b"%PDF-1.4 broken")}, data={"rotation": "90"}).status_code == 500
+    assert client.post("/api/rotate-pdf", files={"file": ("a.pdf", text_pdf(1))}).status_code == 422
+    after = _metrics(client)
+
+    route = "/api/rotate-pdf"
+    assert _delta(before, after, "nexus_http_errors_total", route=route, exception="HTTPException") == 1
+    assert _delta(before, after, "nexus_http_errors_total", route=route, exception="RequestValidationError") == 1
+    # The 500 is labelled with what the tool raised, not the HTTPException wrapping it
+    raised = {dict(labels)["exception"] for (name, labels) in after
+              if name == "nexus_tool_errors_total" and dict(labels)["tool"] == "rotate-pdf"}
+    assert raised
+    assert sum(_delta(before, after, "nexus_http_errors_total", route=route, exception=e) for e in raised) == 1
+
+
+def test_routes_are_templates(client):
+    before = _metrics(client)
+    client.get(f"/api/jobs/{uuid.uuid4().hex}")
+    client.get("/no/such/path")
+    after = _metrics(client)
+    assert _delta(before, after, "nexus_http_request_duration_seconds_count", route="/api/jobs/{job_id}") == 1
+    assert _delta(before, after, "nexus_http_request_duration_seconds_count", route="unmatched") == 1
@@ -0,0 +1,63 @@
+import io
+
+import pikepdf
+import pymupdf
+import pytest
+
+from conftest import text_pdf
+
+
+def _contents_are_references(data):
+    with pikepdf.open(io.BytesIO(data)) as pdf:
+        for page in pdf.pages:
+            contents = page.obj.Contents
+            items = list(contents) if isinstance(contents, pikepdf.Array) else [contents]
+            assert all(item.is_indirect for item in items)
+
+
+def _array_contents_pdf():
+    """Pages whose /Contents is already an array of two streams"""
+    doc = pymupdf.open()
+    for n in range(2):
+        page = doc.new_page()
+        page.insert_text((72, 100), f"first half {n + 1}")
+        page.insert_text((72, 140), f"second half {n + 1}")
+    data = doc.tobytes()
+    with pikepdf.open(io.BytesIO(data)) as pdf:
+        for page in pdf.pages:
+            page.contents_add(pdf.make_stream(b"q Q"), prepend=True)
+        out = io.BytesIO()
+        pdf.save(out)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("endpoint, data, mark", [
+    ("/api/add-page-numbers", {"position": "bottom-center"}, "{n}"),
+    ("/api/add-page-numbers", {"position": "top-right"}, "{n}"),
+    ("/api/watermark-pdf", {"text": "DRAFT"}, "DRAFT"),
+])
+def test_original_text_survives(client, endpoint, data, mark):
+    r = client.post(endpoint, files={"file": ("a.pdf", text_pdf(3))}, data=data)
+    assert r.status_code == 200
+    _contents_are_references(r.content)
+    doc = pymupdf.open(stream=r.content)
+    for n, page in enumerate(doc, 1):
+        lines = page.get_text().split()
+        assert f"Page {n} of the test document".split() == lines[:6]
+        assert mark.format(n=n) in lines
+
+
+def test_pages_with_several_content_streams(client):
+    r = client.post("/api/add-page-numbers", files={"file": ("a.pdf", _array_contents_pdf())})
+    _contents_are_references(r.content)
+    texts = [page.get_text() for page in pymupdf.open(stream=r.content)]
+    assert all(f"first half {n}" in text and f"second half {n}" in text for n, text in enumerate(texts, 1))
+
+
+def test_rotated_pages(client):
+    doc = pymupdf.open(stream=text_pdf(2))
+    doc[0].set_rotation(90)
+    r = client.post("/api/watermark-pdf", files={"file": ("a.pdf", doc.tobytes())}, data={"text": "DRAFT"})
+    out = pymupdf.open(stream=r.content)
+    assert out[0].rotation == 90
+    assert all("test document" in page.get_text() and "DRAFT" in page.get_text() for page in out)
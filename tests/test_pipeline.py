@@ -0,0 +1,67 @@
+import io
+import json
+
+import pymupdf
+import pytest
+from fastapi import HTTPException
+from pypdf import PdfReader
+
+import main
+from conftest import is_pdf, text_pdf
+
+
+def _run(client, operations):
+    return client.post("/api/pipeline", files={"file": ("a.pdf", text_pdf(2))}, data={"operations": json.dumps(operations)})
+
+
+def test_parse_defaults_and_casts():
+    steps = main._parse_pipeline(json.dumps([{"op": "rotate", "rotation": "180"}, {"op": "crop"}, {"op": "metadata", "title": "T"}]))
+    assert steps == [("rotate", [180]), ("crop", [50]), ("metadata", ["T", ""])]
+
+
+@pytest.mark.parametrize("operations, message", [
+    ("not json", "JSON list"),
+    ("[]", "non-empty"),
+    ([{"op": "shred"}], "unknown operation"),
+    ([{"op": "rotate"}], "missing rotation"),
+    ([{"op": "rotate", "rotation": 45}], "90, 180, or 270"),
+    ([{"op": "rotate", "rotation": None}], "must be an integer"),
+    ([{"op": "rotate", "rotation": True}], "must be an integer"),
+    ([{"op": "rotate", "rotation": 90.5}], "must be an integer"),
+    ([{"op": "rotate", "rotation": "ninety"}], "must be an integer"),
+    ([{"op": "rotate", "rotation": 90, "angle": 90}], "unknown field angle"),
+    ([{"op": "crop", "margin": -5}], "0 or more"),
+    ([{"op": "watermark", "text": ""}], "must not be empty"),
+    ([{"op": "watermark", "text": None}], "must be a string"),
+    ([{"op": "lock", "password": 1234}], "must be a string"),
+    ([{"op": "crop"}, {"op": "page-numbers", "position": ["top"]}], "Step 2 (page-numbers)"),
+])
+def test_parse_rejects(operations, message):
+    with pytest.raises(HTTPException) as error:
+        main._parse_pipeline(operations if isinstance(operations, str) else json.dumps(operations))
+    assert error.value.status_code == 400
+    assert message in error.value.detail
+
+
+def test_bad_rotation_is_a_client_error(client):
+    r = _run(client, [{"op": "rotate", "rotation": 45}])
+    assert r.status_code == 400
+
+
+def test_runs_every_step(client):
+    r = _run(client, [{"op": "rotate", "rotation": 90}, {"op": "watermark", "text": "draft"},
+                      {"op": "page-numbers"}, {"op": "metadata", "title": "Piped"}])
+    assert is_pdf(r), r.text[:200]
+    assert r.headers["Server-Timing"].startswith("0-read")
+    reader = PdfReader(io.BytesIO(r.content))
+    assert [page.rotation for page in reader.pages] == [90, 90]
+    assert reader.metadata.title == "Piped"
+
+
+def test_overlay_steps_keep_the_page_text(client):
+    r = _run(client, [{"op": "watermark", "text": "draft"}, {"op": "page-numbers"}])
+    assert is_pdf(r), r.text[:200]
+    for n, page in enumerate(pymupdf.open(stream=r.content), 1):
+        words = page.get_text().split()
+        assert f"Page {n} of the test document".split() == words[:6]
+        assert "DRAFT" in words and str(n) in words
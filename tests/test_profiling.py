@@ -0,0 +1,36 @@
+import os
+import subprocess
+import sys
+
+import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_main(**env):
+    return subprocess.run([sys.executable, "-c", "import main"], cwd=ROOT, capture_output=True, text=True,
+                          env={**os.environ, **env})
+
+
+def test_sampling_without_a_token_fails_at_startup():
+    result = _import_main(NEXUS_PROFILE_SAMPLE_RATE="0.1", NEXUS_PROFILE_TOKEN="")
+    assert result.returncode != 0
+    assert "NEXUS_PROFILE_TOKEN" in result.stderr
+
+
+def test_sampling_with_a_token_starts():
+    assert _import_main(NEXUS_PROFILE_SAMPLE_RATE="0.1", NEXUS_PROFILE_TOKEN="secret").returncode == 0
+
+
+def test_admin_endpoints_name_the_missing_setting(client, monkeypatch):
+    monkeypatch.setattr(main, "PROFILE_TOKEN", None)
+    r = client.get("/api/admin/profiles")
+    assert r.status_code == 403 and "NEXUS_PROFILE_TOKEN" in r.json()["detail"]
+
+
+def test_admin_endpoints_check_the_token(client, monkeypatch):
+    monkeypatch.setattr(main, "PROFILE_TOKEN", "secret")
+    r = client.get("/api/admin/profiles", headers={"X-Nexus-Admin-Token": "wrong"})
+    assert r.status_code == 403 and "X-Nexus-Admin-Token" in r.json()["detail"]
+    assert client.get("/api/admin/profiles", headers={"X-Nexus-Admin-Token": "secret"}).status_code == 200
+    assert client.get("/api/admin/profiles/nope", headers={"X-Nexus-Admin-Token": "secret"}).status_code == 404
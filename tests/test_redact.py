@@ -0,0 +1,83 @@
+import io
+import json
+import zipfile
+
+import pymupdf
+import pytest
+
+
+def _pdf(pages):
+    """One page per list of lines"""
+    from reportlab.pdfgen import canvas
+    buf = io.BytesIO()
+    can = canvas.Canvas(buf)
+    for lines in pages:
+        for n, line in enumerate(lines):
+            can.drawString(72, 720 - 20 * n, line)
+        can.showPage()
+    can.save()
+    return buf.getvalue()
+
+
+EMAIL = r"[\w.]+@[\w.]+"
+PAGES = [
+    ["Contact alice@example.com about the secret plan", "The Secret is safe"],
+    ["Nothing to see on this page"],
+    ["ACME Corp owes 1200 to bob@example.org", "secret secret"],
+]
+
+
+def _redact(client, **data):
+    return client.post("/api/redact-pdf", files={"file": ("a.pdf", _pdf(PAGES))}, data=data)
+
+
+def test_text_is_gone(client):
+    r = _redact(client, terms=json.dumps(["secret", "ACME Corp"]), patterns=json.dumps([EMAIL]))
+    assert r.status_code == 200
+    doc = pymupdf.open(stream=r.content)
+    assert doc.page_count == 3
+    text = " ".join(page.get_text() for page in doc)
+    for gone in ("secret", "Secret", "ACME", "alice@example.com", "bob@example.org"):
+        assert gone not in text
+    for kept in ("Contact", "about the", "plan", "Nothing to see on this page", "owes 1200 to"):
+        assert kept in text
+
+
+def test_single_pass_report_counts(client):
+    r = _redact(client, terms=json.dumps(["secret", "ACME Corp"]), patterns=json.dumps([EMAIL]), format="json")
+    report = r.json()
+    assert report["page_count"] == 3
+    assert report["pages_redacted"] == 2
+    assert report["terms"] == {"secret": 4, "ACME Corp": 1, EMAIL: 2}
+    assert report["hits"] == 7
+    assert [(p["page"], p["hits"], p["terms"]) for p in report["pages"]] == [
+        (1, 3, {"secret": 2, EMAIL: 1}),
+        (3, 4, {"secret": 2, "ACME Corp": 1, EMAIL: 1}),
+    ]
+
+
+def test_case_sensitive_and_zip(client):
+    r = _redact(client, terms="Secret", case_sensitive="true", format="zip")
+    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+        report = json.loads(zf.read("redactions.json"))
+        text = pymupdf.open(stream=zf.read("redacted.pdf"))[0].get_text()
+    assert report["terms"] == {"Secret": 1}
+    assert "Secret" not in text and "secret plan" in text
+
+
+@pytest.mark.parametrize("pattern", ["x*", "(foo)?", "a|"])
+def test_empty_matching_pattern_is_rejected(client, pattern):
+    r = _redact(client, patterns=json.dumps([pattern]))
+    assert r.status_code == 400
+    assert "matches empty text" in r.json()["detail"]
+
+
+def test_zero_width_matches_redact_nothing(client):
+    r = _redact(client, patterns=json.dumps([r"\b", "(?=secret)"]), format="json")
+    assert r.status_code == 200
+    assert r.json()["hits"] == 0
+
+
+def test_nothing_to_redact(client):
+    assert _redact(client).status_code == 400
+    assert _redact(client, patterns="(unclosed").status_code == 400
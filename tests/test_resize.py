@@ -0,0 +1,84 @@
+import io
+import zipfile
+
+import pytest
+from PIL import Image
+
+
+def _image(size=(1200, 800), format="JPEG", **options):
+    img = Image.new("RGB", size)
+    # Left half red, right half blue, so crops can be told apart
+    img.paste((200, 0, 0), (0, 0, size[0] // 2, size[1]))
+    img.paste((0, 0, 200), (size[0] // 2, 0, size[0], size[1]))
+    buf = io.BytesIO()
+    img.save(buf, format, **options)
+    return buf.getvalue()
+
+
+def _resize(client, data, name="a.jpg", **form):
+    return client.post("/api/resize-image", files={"file": (name, data)}, data=form)
+
+
+def _open(r):
+    assert r.status_code == 200, r.text[:200]
+    return Image.open(io.BytesIO(r.content))
+
+
+@pytest.mark.parametrize("mode, width, height, expected", [
+    ("fit", 300, 300, (300, 200)),
+    ("fit", 0, 100, (150, 100)),
+    ("fit", 2400, 2400, (2400, 1600)),
+    ("fill", 300, 300, (300, 300)),
+    ("fill", 100, 400, (100, 400)),
+    ("thumbnail", 300, 300, (300, 200)),
+    ("thumbnail", 2400, 2400, (1200, 800)),
+    ("exact", 300, 300, (300, 300)),
+    ("exact", 600, 0, (600, 400)),
+])
+def test_dimensions(client, mode, width, height, expected):
+    img = _open(_resize(client, _image(), mode=mode, width=str(width), height=str(height)))
+    assert img.size == expected
+
+
+def test_fill_crops_the_centre(client):
+    # A tall box over a wide image keeps the middle, where red meets blue
+    img = _open(_resize(client, _image(), mode="fill", width="100", height="400")).convert("RGB")
+    left, right = img.getpixel((5, 200)), img.getpixel((94, 200))
+    assert left[0] > 150 and left[2] < 50
+    assert right[2] > 150 and right[0] < 50
+
+
+def test_jpeg_stays_jpeg_in_exact_mode(client):
+    r = _resize(client, _image(), mode="exact", width="320", height="240")
+    assert r.headers["content-type"] == "image/jpeg"
+    img = _open(r)
+    assert img.format == "JPEG" and img.size == (320, 240)
+
+
+def test_format_follows_the_source_or_the_request(client):
+    assert _open(_resize(client, _image(format="PNG"), "a.png", width="100")).format == "PNG"
+    assert _open(_resize(client, _image(), width="100", format="webp")).format == "WEBP"
+
+
+def test_exif_orientation_is_applied(client):
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise on display
+    img = _open(_resize(client, _image(exif=exif.tobytes()), mode="fit", width="400", height="400"))
+    assert img.size == (267, 400)
+
+
+def test_sizes_from_one_decode(client):
+    r = _resize(client, _image(), sizes="600x400,300,x100", mode="fit")
+    assert r.headers["content-type"] == "application/zip"
+    with zipfile.ZipFile(io.BytesIO(r.content)) as zf:
+        names = sorted(zf.namelist())
+        sizes = {name: Image.open(io.BytesIO(zf.read(name))).size for name in names}
+    assert names == ["150x100.jpg", "300x200.jpg", "600x400.jpg"]
+    assert sizes == {"150x100.jpg": (150, 100), "300x200.jpg": (300, 200), "600x400.jpg": (600, 400)}
+
+
+@pytest.mark.parametrize("form", [{"width": "0"}, {"mode": "stretch", "width": "10"}, {"mode": "fill", "width": "10"},
+                                  {"width": "99999"}, {"width": "10", "quality": "0"}, {"width": "10", "format": "gif"},
+                                  {"sizes": "10x,abc"}])
+def test_bad_options(client, form):
+    assert _resize(client, _image(), **form).status_code == 400
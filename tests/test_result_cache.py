@@ -0,0 +1,102 @@
+import os
+import time
+
+import pytest
+
+import main
+from conftest import text_pdf
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+
+def _artifact(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    return str(path)
+
+
+def test_store_and_fetch(tmp_path, cache_dir):
+    cache = main.ResultCache(cache_dir, 10_000, 3600)
+    src = _artifact(tmp_path, "out.pdf", 100)
+    cache.store("k1", src)
+    dest = str(tmp_path / "dest.pdf")
+    assert cache.fetch("k1", dest)
+    assert open(dest, "rb").read() == open(src, "rb").read()
+    assert not cache.fetch("k2", str(tmp_path / "other.pdf"))
+    assert cache.stats["hits"] == 1 and cache.stats["misses"] == 1
+
+
+def test_expired_entries_miss(tmp_path, cache_dir):
+    cache = main.ResultCache(cache_dir, 10_000, 0)
+    cache.store("k1", _artifact(tmp_path, "out", 10))
+    time.sleep(0.01)
+    assert not cache.fetch("k1", str(tmp_path / "dest"))
+    assert not os.path.exists(os.path.join(cache_dir, "k1"))
+
+
+def test_least_recently_used_is_evicted(tmp_path, cache_dir):
+    cache = main.ResultCache(cache_dir, 350, 3600)
+    for key in ("a", "b", "c"):
+        cache.store(key, _artifact(tmp_path, key, 100))
+        time.sleep(0.01)
+    assert cache.fetch("a", str(tmp_path / "dest"))
+    time.sleep(0.01)
+    cache.store("d", _artifact(tmp_path, "d", 100))
+    assert sorted(os.listdir(cache_dir)) == ["a", "c", "d"]
+    assert cache.total <= 350
+
+
+def test_hits_across_processes(tmp_path, cache_dir):
+    first = main.ResultCache(cache_dir, 10_000, 3600)
+    second = main.ResultCache(cache_dir, 10_000, 3600)
+    second._index()
+    first.store("k1", _artifact(tmp_path, "out", 100))
+    assert second.fetch("k1", str(tmp_path / "dest"))
+
+
+def test_limit_holds_across_processes(tmp_path, cache_dir, monkeypatch):
+    monkeypatch.setattr(main, "CACHE_SCAN_INTERVAL", 0)
+    workers = [main.ResultCache(cache_dir, 1000, 3600) for _ in range(3)]
+    for worker in workers:
+        worker._index()
+    for n in range(12):
+        workers[n % 3].store(f"k{n}", _artifact(tmp_path, f"out{n}", 200))
+        time.sleep(0.01)
+    on_disk = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir))
+    assert on_disk <= 1000
+    assert "k11" in os.listdir(cache_dir)
+
+
+def test_rescan_sees_other_processes(tmp_path, cache_dir, monkeypatch):
+    first = main.ResultCache(cache_dir, 10_000, 3600)
+    second = main.ResultCache(cache_dir, 10_000, 3600)
+    second._index()
+    first.store("k1", _artifact(tmp_path, "out", 100))
+    assert second.total == 0
+    monkeypatch.setattr(main, "CACHE_SCAN_INTERVAL", 0)
+    second._index()
+    assert second.total == 100
+
+
+def test_scan_keeps_partials_in_progress(tmp_path, cache_dir):
+    os.makedirs(cache_dir)
+    fresh, stale = os.path.join(cache_dir, "k1.part"), os.path.join(cache_dir, "k2.part")
+    for path in (fresh, stale):
+        open(path, "wb").close()
+    old = time.time() - main.CACHE_PART_MAX_AGE - 1
+    os.utime(stale, (old, old))
+    cache = main.ResultCache(cache_dir, 10_000, 3600)
+    assert cache._index() == {}
+    assert os.path.exists(fresh) and not os.path.exists(stale)
+
+
+def test_endpoint_reports_hits(client):
+    pdf = text_pdf(2)
+    statuses = [client.post("/api/rotate-pdf", files={"file": ("a.pdf", pdf)}, data={"rotation": "90"}).headers[main.CACHE_HEADER]
+                for _ in range(2)]
+    assert statuses == ["MISS", "HIT"]
+    bypass = client.post("/api/rotate-pdf", files={"file": ("a.pdf", pdf)}, data={"rotation": "90"}, headers={main.CACHE_HEADER: "bypass"})
+    assert bypass.headers[main.CACHE_HEADER] == "BYPASS"
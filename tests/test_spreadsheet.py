@@ -0,0 +1,90 @@
+import csv
+import datetime
+import io
+import zipfile
+
+import main
+
+
+def _book(path, sheets):
+    book = main.XlsxBook(str(path))
+    for name, header, rows in sheets:
+        book.add_sheet(name, iter(rows), header)
+    book.close()
+    return str(path)
+
+
+def test_round_trip(tmp_path):
+    rows = [["plain", 1, 2.5, True, None, "=SUM(A1:A2)"],
+            ["<b>&amp;</b>", -7, 1e-9, False, "tab\there", "bell\x07gone"],
+            [],
+            ["wider", 1, 2, 3, 4, 5, 6]]
+    src = _book(tmp_path / "out.xlsx", [("Data & more", ["a", "b", "c", "d", "e", "f"], rows), ("Empty", None, [])])
+    assert main._sheet_names(src) == ["Data & more", "Empty"]
+    read = list(main._xlsx_rows(src, "Data & more"))
+    assert read[0] == ["a", "b", "c", "d", "e", "f"]
+    assert read[1] == ["plain", 1, 2.5, True, None, "=SUM(A1:A2)"]
+    assert read[2] == ["<b>&amp;</b>", -7, 1e-9, False, "tab\there", "bellgone"]
+    assert read[3] == []
+    assert read[4] == ["wider", 1, 2, 3, 4, 5, 6]
+    assert list(main._xlsx_rows(src, "Empty")) == []
+
+
+def test_written_book_opens_in_openpyxl(tmp_path):
+    from openpyxl import load_workbook
+    src = _book(tmp_path / "out.xlsx", [("S", ["name", "n"], [["x", 1], ["=1+1", 2.5]])])
+    sheet = load_workbook(src)["S"]
+    assert [[c.value for c in row] for row in sheet.iter_rows()] == [["name", "n"], ["x", 1], ["=1+1", 2.5]]
+    assert sheet["A1"].font.b and not sheet["A2"].font.b
+    assert sheet["A3"].data_type == "s"
+
+
+def test_reads_openpyxl_books(tmp_path):
+    from openpyxl import Workbook
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "First"
+    ws["A1"], ws["C1"] = "shared", 3
+    ws["B3"] = datetime.date(2024, 2, 29)
+    ws["C3"] = datetime.datetime(2024, 2, 29, 13, 30)
+    wb.create_sheet("Second")["A1"] = "other"
+    wb.save(tmp_path / "in.xlsx")
+    rows = list(main._sheet_rows(str(tmp_path / "in.xlsx")))
+    assert rows == [["shared", None, 3], [None, None, None],
+                    [None, datetime.date(2024, 2, 29), datetime.datetime(2024, 2, 29, 13, 30)]]
+    assert list(main._sheet_rows(str(tmp_path / "in.xlsx"), "Second")) == [["other"]]
+
+
+def test_csv_past_the_row_limit_continues_on_new_sheets(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "SHEET_MAX_ROWS", 4)
+    monkeypatch.setattr(main, "SHEET_CHUNK_ROWS", 2)
+    src = tmp_path / "in.csv"
+    src.write_text("id,name\n" + "".join(f"{i},row {i}\n" for i in range(7)))
+    out = str(tmp_path / "out.xlsx")
+    main._csv_to_excel(str(src), out)
+    assert main._sheet_names(out) == ["Sheet1", "Sheet2", "Sheet3"]
+    sheets = [list(main._xlsx_rows(out, name)) for name in main._sheet_names(out)]
+    assert all(sheet[0] == ["id", "name"] for sheet in sheets)
+    assert [row[0] for sheet in sheets for row in sheet[1:]] == list(range(7))
+
+
+def test_csv_excel_csv_endpoints(client):
+    data = b"id,name,amount\n1,alpha,2.5\n2,,3.25\n"
+    xlsx = client.post("/api/csv-to-excel", files={"file": ("a.csv", data)})
+    assert xlsx.status_code == 200
+    back = client.post("/api/excel-to-csv", files={"file": ("a.xlsx", xlsx.content)})
+    assert back.status_code == 200
+    assert list(csv.reader(io.StringIO(back.text))) == [["id", "name", "amount"], ["1", "alpha", "2.5"], ["2", "", "3.25"]]
+
+
+def test_excel_to_csv_sheets(client, tmp_path):
+    src = _book(tmp_path / "two.xlsx", [("One", None, [["a"]]), ("Two", None, [["b"]])])
+    with open(src, "rb") as f:
+        content = f.read()
+    assert client.post("/api/excel-to-csv", files={"file": ("t.xlsx", content)}, data={"sheet": "Two"}).text == "b\n"
+    missing = client.post("/api/excel-to-csv", files={"file": ("t.xlsx", content)}, data={"sheet": "Three"})
+    assert missing.status_code == 400
+    every = client.post("/api/excel-to-csv", files={"file": ("t.xlsx", content)}, data={"sheet": "*"})
+    with zipfile.ZipFile(io.BytesIO(every.content)) as zf:
+        assert len(zf.namelist()) == 2
+    assert client.post("/api/excel-to-csv", files={"file": ("t.xlsx", b"not a sheet")}).status_code == 400